@@ -0,0 +1,230 @@
+"""
+容量限制的批次指派 (Capacity-constrained batch allocation)
+select_winner 逐任務貪婪選最低分，便宜的 solver 可能同時得標數百個任務而大排長龍；
+這裡把一個時間窗內的開放任務、投標與各 solver 宣告的容量視為稀疏二分圖，
+以拍賣演算法 (Bertsekas auction，Jacobi 平行出價版) 求最小成本指派：
+
+- 每個 solver 有 capacity 個相同的名額；滿額時的價格為持有者中的最低出價，未滿額為 0
+- 每一輪所有未指派任務同時對「價值 - 價格」最高的 solver 出價，
+  加價幅度為最佳與次佳價值之差 + epsilon (次佳至少為不指派的 0)；
+  solver 保留出價最高的 capacity 個任務，其餘退回下一輪
+- 任務價值 = assignment_bonus - 成本，bonus 預設讓所有價值 >= 1 且大於任兩筆成本之差，
+  多指派一個任務永遠優於改派到較便宜的 solver (吞吐量優先，其次成本)
+- 每個得標任務與最佳解的差距不超過 epsilon
+- 剩下少於 SEQUENTIAL_BIDDERS 個未指派任務時改為逐一出價 (Gauss-Seidel) 收尾
+
+一萬個任務 × 一千個 solver (二十萬筆投標) 依供需鬆緊約 0.1-0.7 秒
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# 未指派任務少於此數時改為逐一出價
+SEQUENTIAL_BIDDERS = 32
+
+
+@dataclass
+class AllocationResult:
+    """assignment[t] 為任務 t 得標的投標 (edge) 索引，未指派為 -1"""
+    assignment: np.ndarray
+    total_cost: float
+    rounds: int
+    seconds: float
+
+    @property
+    def assigned(self) -> int:
+        return int(np.count_nonzero(self.assignment >= 0))
+
+
+def _validate(edge_task: np.ndarray, edge_solver: np.ndarray, edge_cost: np.ndarray,
+              num_tasks: int, capacities: np.ndarray):
+    if not (len(edge_task) == len(edge_solver) == len(edge_cost)):
+        raise ValueError("edge_task, edge_solver and edge_cost must have the same length")
+    if len(edge_task) and (edge_task.min() < 0 or edge_task.max() >= num_tasks):
+        raise ValueError("edge_task out of range")
+    if len(edge_solver) and (edge_solver.min() < 0 or edge_solver.max() >= len(capacities)):
+        raise ValueError("edge_solver out of range")
+    if len(capacities) and capacities.min() < 0:
+        raise ValueError("capacities must be non-negative")
+
+
+def _cheapest_pairs(edge_task: np.ndarray, edge_solver: np.ndarray, edge_cost: np.ndarray) -> np.ndarray:
+    """同一 (任務, solver) 的多筆投標只保留成本最低者；回傳依任務排序的 edge 索引"""
+    order = np.lexsort((edge_cost, edge_solver, edge_task))
+    task, solver = edge_task[order], edge_solver[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (task[1:] != task[:-1]) | (solver[1:] != solver[:-1])
+    return order[first]
+
+
+def _group_desc(groups: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """依 groups 遞增、組內 values 遞減排序 (比 np.lexsort 快數倍：兩次 argsort 取代多鍵排序)"""
+    rank = np.empty(values.size, dtype=np.int64)
+    rank[np.argsort(-values)] = np.arange(values.size)
+    return np.argsort(groups * values.size + rank)
+
+
+def _expand(offsets: np.ndarray, rows: np.ndarray):
+    """展開 rows 這些任務的投標：回傳 (edge 索引, 各任務在其中的起點, 各任務投標數)"""
+    lens = offsets[rows + 1] - offsets[rows]
+    seg = np.cumsum(lens) - lens
+    idx = np.arange(lens.sum()) - np.repeat(seg, lens) + np.repeat(offsets[rows], lens)
+    return idx, seg, lens
+
+
+def _bid_sequentially(queue: list, offsets: np.ndarray, solver: np.ndarray, benefit: np.ndarray,
+                      slot_offsets: np.ndarray, slot_task: np.ndarray, slot_amount: np.ndarray,
+                      price: np.ndarray, epsilon: float, max_steps: int) -> int:
+    """
+    收尾用的逐一出價 (Gauss-Seidel)：剩下少數任務時，每次出價立即更新價格，
+    省去整批向量運算的固定開銷；回傳出價次數
+    """
+    steps = 0
+    while queue and steps < max_steps:
+        t = queue.pop()
+        steps += 1
+        lo, hi = offsets[t], offsets[t + 1]
+        values = benefit[lo:hi] - price[solver[lo:hi]]
+        k = int(values.argmax())
+        best = values[k]
+        if best < 0:
+            continue
+        values[k] = -np.inf
+        second = max(float(values.max()), 0.0)
+        j = solver[lo + k]
+        amount = price[j] + best - second + epsilon
+
+        # 插入名額表 (依出價遞減)，擠掉最後一個名額
+        start, end = slot_offsets[j], slot_offsets[j + 1]
+        pos = start + int(np.searchsorted(-slot_amount[start:end], -amount, side="right"))
+        displaced = slot_task[end - 1]
+        slot_task[pos + 1:end] = slot_task[pos:end - 1]
+        slot_amount[pos + 1:end] = slot_amount[pos:end - 1]
+        slot_task[pos], slot_amount[pos] = t, amount
+        price[j] = max(slot_amount[end - 1], 0.0)
+        if displaced >= 0:
+            queue.append(displaced)
+    return steps
+
+
+def auction_assign(edge_task, edge_solver, edge_cost, num_tasks: int, capacities,
+                   assignment_bonus: Optional[float] = None, epsilon: float = 1e-2,
+                   max_rounds: int = 100_000) -> AllocationResult:
+    """
+    稀疏圖上的容量限制最小成本指派
+    edge_*: 每筆投標的任務索引、solver 索引與成本 (選標分數)；capacities[j] 為 solver j 可再接的任務數
+    每個得標任務與最佳解的差距不超過 epsilon；epsilon 越小越精確，但供需接近時輪數越多
+    """
+    start = time.perf_counter()
+    edge_task = np.asarray(edge_task, dtype=np.int64)
+    edge_solver = np.asarray(edge_solver, dtype=np.int64)
+    edge_cost = np.asarray(edge_cost, dtype=float)
+    capacities = np.asarray(capacities, dtype=np.int64)
+    _validate(edge_task, edge_solver, edge_cost, num_tasks, capacities)
+
+    assignment = np.full(num_tasks, -1, dtype=np.int64)
+    edges = _cheapest_pairs(edge_task, edge_solver, edge_cost)
+    edges = edges[capacities[edge_solver[edges]] > 0]
+    if edges.size == 0:
+        return AllocationResult(assignment, 0.0, 0, time.perf_counter() - start)
+
+    task, solver, cost = edge_task[edges], edge_solver[edges], edge_cost[edges]
+    if assignment_bonus is None:
+        assignment_bonus = float(cost.max()) - min(float(cost.min()), 0.0) + 1.0
+    benefit = assignment_bonus - cost
+    offsets = np.zeros(num_tasks + 1, dtype=np.int64)
+    np.cumsum(np.bincount(task, minlength=num_tasks), out=offsets[1:])
+
+    # 名額表：solver j 的名額為 slot_offsets[j]:slot_offsets[j + 1]，依出價遞減排列，空名額出價為 -inf
+    # (容量上限取投標數，無上限的 solver 不會配置用不到的名額)
+    num_solvers = len(capacities)
+    slots = np.minimum(capacities, np.bincount(solver, minlength=num_solvers))
+    slot_offsets = np.zeros(num_solvers + 1, dtype=np.int64)
+    np.cumsum(slots, out=slot_offsets[1:])
+    slot_task = np.full(slot_offsets[-1], -1, dtype=np.int64)
+    slot_amount = np.full(slot_offsets[-1], -np.inf)
+    price = np.zeros(num_solvers)  # 滿額時為最低的持有出價，未滿額為 0
+    bidders = np.flatnonzero(np.diff(offsets) > 0)
+    rounds = 0
+
+    while bidders.size and rounds < max_rounds:
+        if bidders.size <= SEQUENTIAL_BIDDERS:
+            rounds += _bid_sequentially(bidders.tolist(), offsets, solver, benefit, slot_offsets, slot_task,
+                                        slot_amount, price, epsilon, max_rounds - rounds)
+            break
+        rounds += 1
+
+        # 展開未指派任務的所有投標，分段求最佳 / 次佳價值
+        idx, seg, lens = _expand(offsets, bidders)
+        values = benefit[idx] - price[solver[idx]]
+        best = np.maximum.reduceat(values, seg)
+        hits = np.flatnonzero(values == np.repeat(best, lens))
+        hit_seg = np.repeat(np.arange(bidders.size), lens)[hits]
+        first = hits[np.r_[True, hit_seg[1:] != hit_seg[:-1]]]
+        values[first] = -np.inf
+        second = np.maximum(np.maximum.reduceat(values, seg), 0.0)
+
+        # 最佳價值已低於不指派 (價格只升不降)，永久放棄
+        keep = best >= 0
+        bidders, target = bidders[keep], solver[idx[first[keep]]]
+        if bidders.size == 0:
+            break
+        amount = price[target] + best[keep] - second[keep] + epsilon
+
+        # 被出價的 solver 在原持有者 (含空名額) 與新出價者中保留出價最高的 slots[j] 個，依序寫回名額表
+        touched = np.unique(target)
+        slot_idx, _, slot_lens = _expand(slot_offsets, touched)
+        cand_task = np.concatenate([slot_task[slot_idx], bidders])
+        cand_solver = np.concatenate([np.repeat(touched, slot_lens), target])
+        cand_amount = np.concatenate([slot_amount[slot_idx], amount])
+        order = _group_desc(cand_solver, cand_amount)
+        cand_task, cand_solver, cand_amount = cand_task[order], cand_solver[order], cand_amount[order]
+
+        boundary = np.r_[True, cand_solver[1:] != cand_solver[:-1]]
+        group_start = np.maximum.accumulate(np.where(boundary, np.arange(order.size), 0))
+        won = np.arange(order.size) - group_start < slots[cand_solver]
+        slot_task[slot_idx] = cand_task[won]
+        slot_amount[slot_idx] = cand_amount[won]
+        # 每個 solver 的最後一個名額即最低出價；仍有空名額 (-inf) 時價格為 0
+        price[touched] = np.maximum(slot_amount[slot_offsets[touched + 1] - 1], 0.0)
+
+        # 被擠掉的持有者與落敗的新出價者下一輪重新出價
+        bidders = cand_task[~won]
+        bidders = bidders[bidders >= 0]
+
+    owner = np.full(num_tasks, -1, dtype=np.int64)
+    filled = slot_task >= 0
+    owner[slot_task[filled]] = np.repeat(np.arange(num_solvers), slots)[filled]
+
+    # 任務持有的 solver 對應回原始 edge
+    edge_of_task = np.repeat(np.arange(num_tasks), np.diff(offsets))
+    match = np.flatnonzero(owner[edge_of_task] == solver)
+    assignment[edge_of_task[match]] = edges[match]
+    total = float(edge_cost[assignment[assignment >= 0]].sum())
+    return AllocationResult(assignment, total, rounds, time.perf_counter() - start)
+
+
+def greedy_assign(edge_task, edge_solver, edge_cost, num_tasks: int, capacities) -> AllocationResult:
+    """
+    比較基準：所有投標依成本遞增逐一檢查，任務未指派且 solver 仍有容量就成交
+    (相當於依容量截斷的逐任務最低價選標)
+    """
+    start = time.perf_counter()
+    edge_task = np.asarray(edge_task, dtype=np.int64)
+    edge_solver = np.asarray(edge_solver, dtype=np.int64)
+    edge_cost = np.asarray(edge_cost, dtype=float)
+    capacities = np.asarray(capacities, dtype=np.int64)
+    _validate(edge_task, edge_solver, edge_cost, num_tasks, capacities)
+
+    assignment = np.full(num_tasks, -1, dtype=np.int64)
+    remaining = capacities.copy()
+    total = 0.0
+    for e in np.argsort(edge_cost, kind="stable").tolist():
+        t, j = edge_task[e], edge_solver[e]
+        if assignment[t] < 0 and remaining[j] > 0:
+            assignment[t] = e
+            remaining[j] -= 1
+            total += edge_cost[e]
+    return AllocationResult(assignment, float(total), 1, time.perf_counter() - start)
@@ -3,14 +3,19 @@ AI Agent Hub Web API
 競爭式派工與 agent broker 展示頁
 支援多穩定幣 (USDC) 計價
 """
-from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, Field, conint, field_validator
+from typing import Dict, Optional, List
 from loguru import logger
 import uvicorn
 import asyncio
+from contextlib import asynccontextmanager
+import hmac
 import json
+import os
+import time
+import tracemalloc
 from datetime import datetime, timezone
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -25,10 +30,38 @@ limiter = Limiter(key_func=get_remote_address)
 from .hub_market import HubMarket, TaskStatus, market
 from .reputation import reputation_system
 from .solana_escrow import solana_escrow
-from .metrics import update_market_metrics, tasks_created, bids_submitted
+from .metrics import (
+    register_market_collector, register_instrumentation_collector, register_memory_collector,
+    observe_task_phase, tasks_created, bids_submitted, ws_connections, ws_queue_depth,
+    response_cache_hit_ratio,
+)
+from .diagnostics import LoopLagMonitor, ProfilerBusyError, RequestTimingMiddleware, SamplingProfiler
+from .instrumentation import instrumentation
+from .lifecycle import task_timeline
+from .log_config import configure_logging
+from .backtest import Backtester, MarketHistory, market_records
+from .bid_rules import StandingBidRule
+from .matching import SolverInterest
+from .memory import MemoryAccountant, TracemallocBusyError, register_market_subsystems, tracemalloc_snapshot
+from .realtime import ConnectionManager, SnapshotPublisher
+from .response_cache import VersionedResponseCache, encode_json
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
-app = FastAPI(title="AI Agent Hub", version="2.1.0")
+# === Prometheus 市場 collector (scrape 時讀取增量計數) ===
+register_market_collector(market, solana_escrow)
+register_instrumentation_collector(instrumentation)
+market.phase_observer = observe_task_phase
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # === 日誌設定 (LOG_LEVEL / LOG_JSON / LOG_ENQUEUE / LOG_BID_SAMPLE_EVERY) ===
+    # 伺服器啟動時才設定：單純 import 本模組 (測試、嵌入) 不會移除宿主程式的 loguru sink
+    configure_logging()
+    yield
+
+
+app = FastAPI(title="AI Agent Hub", version="2.1.0", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -43,30 +76,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# === WebSocket 連線管理器 ===
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+# === 請求計時與 event loop 延遲監控 (LOOP_LAG_INTERVAL / LOOP_LAG_THRESHOLD，秒) ===
+loop_monitor = LoopLagMonitor(
+    interval=float(os.getenv("LOOP_LAG_INTERVAL", "0.5")),
+    threshold=float(os.getenv("LOOP_LAG_THRESHOLD", "0.1")),
+)
+app.add_middleware(RequestTimingMiddleware, on_request=loop_monitor.ensure_running)
+
+# === WebSocket 連線管理器 (WS_MAX_QUEUE / WS_SLOW_CLIENT_POLICY / WS_REPLAY_SIZE / WS_COALESCE_MS) ===
+manager = ConnectionManager(
+    max_queue=int(os.getenv("WS_MAX_QUEUE", "100")),
+    slow_policy=os.getenv("WS_SLOW_CLIENT_POLICY", "drop_oldest"),
+    replay_size=int(os.getenv("WS_REPLAY_SIZE", "1000")),
+    coalesce_ms=float(os.getenv("WS_COALESCE_MS", "0")),
+)
+ws_connections.set_function(manager.connection_count)
+ws_queue_depth.labels(stat="total").set_function(manager.total_queue_depth)
+ws_queue_depth.labels(stat="max").set_function(manager.max_queue_depth)
+
+# === 記憶體統計 (MEMORY_TRACEMALLOC=1 時啟動即持續追蹤配置；MEMORY_TRACEMALLOC_FRAMES 為保留的堆疊深度) ===
+memory_accountant = register_market_subsystems(
+    MemoryAccountant(), market, reputation_system, solana_escrow, manager
+)
+register_memory_collector(memory_accountant)
+if os.getenv("MEMORY_TRACEMALLOC", "0") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start(int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1")))
+
+
+@instrumentation.timed("api.build_market_snapshot")
+def build_market_snapshot() -> dict:
+    """WebSocket market_update 快照 (最近 5 筆任務取自環形緩衝)"""
+    recent = market.get_recent_tasks(5)
+    return {
+        "type": "market_update",
+        "stats": market.get_market_stats(),
+        "recent_tasks": [
+            {"id": t.task_id, "desc": t.description, "budget": t.max_budget,
+             "status": t.status.value}
+            for t in recent
+        ],
+        "seq": manager.last_seq,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+def publish_task_event(event_type: str, task, payload: dict) -> int:
+    """發布與任務相關的增量事件 (附序號，依訂閱條件過濾)"""
+    return manager.publish(
+        event_type, payload,
+        task_id=task.task_id, domain=task.required_domain, requester=task.requester_id,
+    )
 
-    async def broadcast(self, message: dict):
-        dead = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                dead.append(connection)
-        for conn in dead:
-            self.disconnect(conn)
 
-manager = ConnectionManager()
+def publish_task_update(task, **changes) -> int:
+    """任務狀態增量：只送出變更的欄位"""
+    return publish_task_event("task_updated", task, {"task_id": task.task_id, "changes": changes})
+
+
+snapshot_publisher = SnapshotPublisher(
+    manager,
+    build_snapshot=build_market_snapshot,
+    get_version=lambda: market.version,
+    interval=float(os.getenv("WS_SNAPSHOT_INTERVAL", "2.0")),
+)
+
+# === 版本化回應快取 (RESPONSE_CACHE_MAX_STALE: max_stale 查詢參數上限秒數) ===
+response_cache = VersionedResponseCache()
+RESPONSE_CACHE_MAX_STALE = float(os.getenv("RESPONSE_CACHE_MAX_STALE", "5.0"))
+for _endpoint in ("stats", "dashboard", "health"):
+    response_cache_hit_ratio.labels(endpoint=_endpoint).set_function(
+        lambda endpoint=_endpoint: response_cache.hit_rate(endpoint)
+    )
+
+
+def current_state_version() -> tuple:
+    """市場與託管的變更版本；任一變更即讓快取失效"""
+    return (market.version, solana_escrow.version if solana_escrow else 0)
+
+
+def cached_json_response(endpoint: str, build, max_stale: float = 0.0) -> Response:
+    """兩次變更之間回傳同一份預先編碼的 bytes；max_stale > 0 允許短暫沿用舊資料"""
+    max_stale = min(max(max_stale, 0.0), RESPONSE_CACHE_MAX_STALE)
+    body = response_cache.get_or_build(
+        endpoint, current_state_version(), lambda: encode_json(build()), max_stale=max_stale
+    )
+    return Response(content=body, media_type="application/json")
 
 # === 數據模型 ===
 class CreateTaskRequest(BaseModel):
@@ -78,6 +172,7 @@ class CreateTaskRequest(BaseModel):
     requester_id: Optional[str] = "anonymous"
     routing_mode: Optional[str] = "internal"
     required_domain: Optional[str] = None
+    required_tools: List[str] = Field(default_factory=list)
     currency: Optional[str] = "USDC"  # legacy / external mode only
     
     @field_validator('description')
@@ -90,8 +185,13 @@ class CreateTaskRequest(BaseModel):
 # === API 端點 (JSON) ===
 
 @app.get("/api/stats")
-async def get_stats_json():
-    """獲取 broker 統計資料"""
+async def get_stats_json(max_stale: float = 0.0):
+    """獲取 broker 統計資料 (版本化快取；max_stale 秒內可沿用舊資料)"""
+    return cached_json_response("stats", build_stats_payload, max_stale)
+
+
+@instrumentation.timed("api.build_stats_payload")
+def build_stats_payload() -> dict:
     base_stats = market.get_market_stats()
     avg_sol = base_stats.get("avg_winning_bid", 0)
 
@@ -107,9 +207,39 @@ async def get_stats_json():
         "exchange_rate": {"SOL_USDC": SOL_PRICE_USDC}
     }
 
+@app.get("/api/price-distribution")
+async def get_price_distribution(domain: Optional[str] = None):
+    """各領域投標價格分布 (串流統計：count / mean / stddev / min / max / p10~p90)"""
+    distributions = market.get_price_distributions()
+    if domain is not None:
+        if domain not in distributions:
+            raise HTTPException(status_code=404, detail="No bids recorded for domain")
+        distributions = {domain: distributions[domain]}
+    return {"cost_unit": "internal_units", "domains": distributions}
+
+
+@app.get("/api/timeseries")
+async def get_timeseries(metric: str = "bids_per_sec", resolution: str = "second", points: int = 60):
+    """
+    市場活動時間序列 (rollup 桶，不掃描任務)
+    metric: bids_per_sec / tasks_per_sec / assignments_per_sec / fill_rate / avg_winning_cost / time_to_assign
+    resolution: second / minute / hour
+    """
+    try:
+        series = market.timeseries.query(metric, resolution, points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"metric": metric, "resolution": resolution, "points": series}
+
+
 @app.get("/api/dashboard-data")
-async def get_dashboard_data_json():
-    """專為前端儀表板設計的數據接口"""
+async def get_dashboard_data_json(max_stale: float = 0.0):
+    """專為前端儀表板設計的數據接口 (版本化快取；max_stale 秒內可沿用舊資料)"""
+    return cached_json_response("dashboard", build_dashboard_payload, max_stale)
+
+
+@instrumentation.timed("api.build_dashboard_payload")
+def build_dashboard_payload() -> dict:
     tasks = [
         {
             "id": t.task_id,
@@ -127,18 +257,29 @@ async def get_dashboard_data_json():
             "submitted_at": t.submitted_at.isoformat() if t.submitted_at else None,
             "verified_at": t.verified_at.isoformat() if t.verified_at else None,
         }
-        for t in market.tasks.values()
+        for t in market.get_recent_tasks(5)
+    ]
+    bids = [
+        {"task": b.task_id, "bidder": b.bidder_id, "price": b.bid_price, "estimated_cost": b.bid_price, "cost_unit": "internal_units", "currency": getattr(b, 'currency', 'USDC')}
+        for b in market.get_recent_bids(5)
+    ]
+    assignments = [
+        {"task": b.task_id, "assigned_to": b.bidder_id, "estimated_cost": b.bid_price, "cost_unit": "internal_units"}
+        for b in market.get_recent_assignments(5)
+    ]
+    verifications = [
+        {"task": t.task_id, "verification_status": t.verification_status,
+         "verified_at": t.verified_at.isoformat() if t.verified_at else None}
+        for t in market.get_recent_verifications(5)
     ]
-    bids = []
-    for tid, blist in market.bids.items():
-        for b in blist:
-            bids.append({"task": tid, "bidder": b.bidder_id, "price": b.bid_price, "estimated_cost": b.bid_price, "cost_unit": "internal_units", "currency": getattr(b, 'currency', 'USDC')})
 
     base_stats = market.get_market_stats()
 
     return {
-        "tasks": tasks[-5:],
-        "bids": bids[-5:],
+        "tasks": tasks,
+        "bids": bids,
+        "assignments": assignments,
+        "verifications": verifications,
         "stats": {
             "total_tasks": base_stats.get("total_tasks", 0),
             "total_bids": base_stats.get("total_bids", 0),
@@ -160,6 +301,36 @@ class BidRequest(BaseModel):
     trust_level: str = "standard"
     message: Optional[str] = ""
 
+class SolverRegistrationRequest(BaseModel):
+    solver_id: str = Field(min_length=1)
+    domains: List[str] = Field(default_factory=list)
+    min_budget: float = Field(default=0.0, ge=0)
+    max_expected_tokens: Optional[int] = Field(default=None, gt=0)
+    tools: List[str] = Field(default_factory=list)
+
+class BidRuleRequest(BaseModel):
+    strategy: str
+    cost_per_token: float = Field(gt=0)
+    domains: List[str] = Field(default_factory=list)
+    min_budget: float = Field(default=0.0, ge=0)
+    max_budget: Optional[float] = Field(default=None, gt=0)
+    capacity: Optional[int] = Field(default=None, ge=1)
+    model_name: str = "standing_rule"
+    trust_level: str = "standard"
+
+class BacktestRequest(BaseModel):
+    strategies: List[str] = Field(min_length=1)
+    cost_per_token: float = Field(gt=0)
+    subject: Optional[str] = None  # 替換該 bidder 的投標；未指定時以新進者身分回測
+    domains: List[str] = Field(default_factory=list)
+    trust_level: str = "standard"
+
+class AllocateRequest(BaseModel):
+    task_ids: Optional[List[str]] = None  # 未指定時為所有開放任務
+    capacities: Dict[str, conint(ge=0)] = Field(default_factory=dict)  # solver_id -> 本批可再接的任務數
+    default_capacity: Optional[int] = Field(default=None, ge=0)
+    epsilon: float = Field(default=1e-2, gt=0)
+
 class SubmitResultRequest(BaseModel):
     result: str = Field(min_length=1)
 
@@ -184,21 +355,31 @@ async def create_task_root(request: Request, task_request: CreateTaskRequest):
             requester_id=task_request.requester_id,
             routing_mode=task_request.routing_mode or "internal",
             required_domain=task_request.required_domain,
+            required_tools=task_request.required_tools,
         )
         tasks_created.labels(currency=task_request.currency).inc()
-        asyncio.create_task(manager.broadcast({
-            "type": "task_created",
+        publish_task_event("task_created", task, {
             "task_id": task.task_id,
             "description": task_request.description,
             "budget": resolved_budget,
             "budget_limit": resolved_budget,
             "routing_mode": task.routing_mode,
             "required_domain": task.required_domain,
+            "required_tools": task.required_tools,
             "currency": task_request.currency
-        }))
+        })
+        standing_bids = market.bids[task.task_id]
+        for bid in standing_bids:
+            publish_task_event("proposal_submitted", task, {
+                "task_id": task.task_id,
+                "bidder_id": bid.bidder_id,
+                "estimated_cost": bid.bid_price,
+                "cost_unit": "internal_units"
+            })
         return {
             "task_id": task.task_id,
             "status": "created",
+            "standing_bids": len(standing_bids),
             "budget_limit": resolved_budget,
             "routing_mode": task.routing_mode,
             "required_domain": task.required_domain,
@@ -369,18 +550,19 @@ async def submit_bid(task_id: str, bid_request: BidRequest):
             # Keep request flow resilient even if metric label configuration drifts.
             pass
 
-        asyncio.create_task(manager.broadcast({
-            "type": "proposal_submitted",
+        publish_task_event("proposal_submitted", market.tasks[task_id], {
             "task_id": task_id,
             "bidder_id": bid_request.bidder_id,
             "estimated_cost": resolved_cost,
             "cost_unit": "internal_units"
-        }))
+        })
 
         winner = None
         if len(market.bids[task_id]) >= 3:
             winner_bid = market.select_winner(task_id)
             if winner_bid:
+                publish_task_update(market.tasks[task_id], status=market.tasks[task_id].status.value,
+                                    assigned_to=winner_bid.bidder_id, winning_cost=winner_bid.bid_price)
                 winner = {
                     "bid_id": winner_bid.bid_id,
                     "bidder_id": winner_bid.bidder_id,
@@ -414,6 +596,8 @@ async def submit_task_result(task_id: str, request: SubmitResultRequest):
         raise HTTPException(status_code=404, detail="Task not found")
     try:
         market.submit_result(task_id, request.result)
+        task = market.tasks[task_id]
+        publish_task_update(task, status=task.status.value, submitted_at=task.submitted_at.isoformat())
         return {
             "task_id": task_id,
             "status": market.tasks[task_id].status.value,
@@ -429,6 +613,7 @@ async def verify_task_result(task_id: str, request: VerifyResultRequest):
     try:
         market.verify_result(task_id, request.approved, request.notes or "")
         task = market.tasks[task_id]
+        publish_task_update(task, status=task.status.value, verification_status=task.verification_status)
         return {
             "task_id": task_id,
             "status": task.status.value,
@@ -447,6 +632,8 @@ async def select_winner(task_id: str):
     winner = market.select_winner(task_id)
     if winner is None:
         raise HTTPException(status_code=404, detail="No valid bids found for winner selection")
+    publish_task_update(market.tasks[task_id], status=market.tasks[task_id].status.value,
+                        assigned_to=winner.bidder_id, winning_cost=winner.bid_price)
     return {
         "winner": {
             "bid_id": winner.bid_id,
@@ -462,6 +649,44 @@ async def select_winner(task_id: str):
     }
 
 
+@app.post("/tasks/allocate")
+async def allocate_tasks(request: AllocateRequest):
+    """容量限制的批次選商：一次指派多個開放任務，優先讓最多任務得標且不超過各 solver 容量"""
+    start = time.perf_counter()
+    # 在 event loop 上取出投標圖與寫回結果，只有求解 (純陣列運算) 交給背景執行緒，不阻塞其他請求
+    try:
+        problem = market.prepare_allocation(task_ids=request.task_ids, capacities=request.capacities,
+                                            default_capacity=request.default_capacity)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    result = await asyncio.to_thread(problem.solve, request.epsilon)
+    winners = market.apply_allocation(problem, result)
+    assignments = []
+    for task_id, winner in winners.items():
+        if winner is None:
+            continue
+        task = market.tasks[task_id]
+        publish_task_update(task, status=task.status.value, assigned_to=winner.bidder_id,
+                            winning_cost=winner.bid_price)
+        assignments.append({"task_id": task_id, "bid_id": winner.bid_id,
+                            "bidder_id": winner.bidder_id, "bid_price": winner.bid_price})
+    return {
+        "assigned": len(assignments),
+        "unassigned": [task_id for task_id, winner in winners.items() if winner is None],
+        "assignments": assignments,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+@app.get("/tasks/{task_id}/timeline")
+async def get_task_timeline(task_id: str):
+    """任務生命週期：各里程碑時間、階段耗時與耗時最長的階段"""
+    task = market.get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task_timeline(task)
+
+
 @app.get("/tasks/{task_id}/bids")
 async def get_task_bids(task_id: str):
     """返回指定任務的所有投標"""
@@ -485,10 +710,84 @@ async def get_task_bids(task_id: str):
     }
 
 
+# === 推送式媒合：solver 登記興趣後只需讀取自己的收件匣 ===
+@app.post("/solvers/register")
+async def register_solver(request: SolverRegistrationRequest):
+    """登記 (或更新) solver 興趣；目前開放且符合條件的任務會先補進收件匣"""
+    interest = market.register_solver(SolverInterest(
+        solver_id=request.solver_id,
+        domains=set(request.domains),
+        min_budget=request.min_budget,
+        max_expected_tokens=request.max_expected_tokens,
+        tools=set(request.tools),
+    ))
+    return {**interest.to_dict(), "pending": market.matching.pending(request.solver_id)}
+
+
+@app.get("/solvers/{solver_id}/inbox")
+async def get_solver_inbox(solver_id: str, max_items: int = 50):
+    """取出推送給 solver 的新任務 (讀取即移除)；已非開放狀態的任務略過"""
+    if solver_id not in market.matching.inboxes:
+        raise HTTPException(status_code=404, detail="Solver not registered")
+    tasks = market.pull_matched_tasks(solver_id, max_items=max(1, max_items))
+    return {
+        "solver_id": solver_id,
+        "tasks": [
+            {
+                "task_id": t.task_id,
+                "description": t.description,
+                "budget_limit": t.max_budget,
+                "expected_tokens": t.expected_tokens,
+                "routing_mode": t.routing_mode,
+                "required_domain": t.required_domain,
+                "required_tools": t.required_tools,
+                "created_at": t.created_at.isoformat(),
+            }
+            for t in tasks
+        ],
+        "remaining": market.matching.pending(solver_id),
+        "dropped": market.matching.dropped.get(solver_id, 0),
+    }
+
+
+@app.put("/solvers/{solver_id}/bid-rule")
+async def put_bid_rule(solver_id: str, request: BidRuleRequest):
+    """登記 / 更新常駐投標規則：之後建立的任務若符合條件，hub 會直接以該策略代為投標"""
+    try:
+        rule = market.register_bid_rule(StandingBidRule(
+            solver_id=solver_id,
+            strategy=request.strategy,
+            cost_per_token=request.cost_per_token,
+            domains=set(request.domains),
+            min_budget=request.min_budget,
+            max_budget=request.max_budget,
+            capacity=request.capacity,
+            model_name=request.model_name,
+            trust_level=request.trust_level,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return rule.to_dict()
+
+
+@app.delete("/solvers/{solver_id}/bid-rule")
+async def delete_bid_rule(solver_id: str):
+    if not market.bid_rules.unregister(solver_id):
+        raise HTTPException(status_code=404, detail="No bid rule registered")
+    return {"solver_id": solver_id, "status": "removed"}
+
+
+@app.delete("/solvers/{solver_id}")
+async def unregister_solver(solver_id: str):
+    if not market.matching.unregister(solver_id):
+        raise HTTPException(status_code=404, detail="Solver not registered")
+    return {"solver_id": solver_id, "status": "unregistered"}
+
+
 @app.get("/api/tasks")
 async def list_tasks_legacy():
     """列出最近 20 個任務，供客戶端輪詢任務狀態 (舊版相容接口)"""
-    recent = list(market.tasks.values())[-20:]
+    recent = market.get_recent_tasks(20)
     return {
         "tasks": [
             {
@@ -521,13 +820,12 @@ async def create_task(request: Request, task_request: CreateTaskRequest):
         # 追蹤 Prometheus 指標
         tasks_created.labels(currency=task_request.currency).inc()
 
-        asyncio.create_task(manager.broadcast({
-            "type": "task_created",
+        publish_task_event("task_created", task, {
             "task_id": task.task_id,
             "description": task_request.description,
             "budget": task_request.max_budget,
             "currency": task_request.currency
-        }))
+        })
 
         return {"task_id": task.task_id, "status": "created", "currency": task_request.currency}
     except Exception as e:
@@ -537,23 +835,15 @@ async def create_task(request: Request, task_request: CreateTaskRequest):
 @app.websocket("/ws/market")
 async def websocket_market(websocket: WebSocket):
     """Real-time market feed via WebSocket"""
-    await manager.connect(websocket)
+    client = await manager.connect(websocket)
+    # Latest shared snapshot right away; the publisher pushes new ones when the market changes
+    manager.send_text(client, snapshot_publisher.latest_frame(), snapshot=True)
+    snapshot_publisher.ensure_running()
     try:
-        while True:
-            # Send market snapshot every 2 seconds
-            stats = market.get_market_stats()
-            tasks_snapshot = [
-                {"id": t.task_id, "desc": t.description, "budget": t.max_budget,
-                 "status": t.status.value}
-                for t in list(market.tasks.values())[-5:]
-            ]
-            await websocket.send_json({
-                "type": "market_update",
-                "stats": stats,
-                "recent_tasks": tasks_snapshot,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
-            await asyncio.sleep(2)
+        while not client.closed:
+            # Control messages: subscribe / unsubscribe / resume (see ConnectionManager.handle_client_message)
+            if manager.handle_client_message(client, await websocket.receive_text()):
+                manager.send_text(client, snapshot_publisher.latest_frame(), snapshot=True)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception:
@@ -811,7 +1101,7 @@ async def landing_page(request: Request):
                             if (data.type === 'market_update') {
                                 this.stats = data.stats;
                                 if (data.recent_tasks) this.tasks = data.recent_tasks;
-                            } else if (data.type === 'task_created' || data.type === 'bid_submitted') {
+                            } else if (['task_created', 'proposal_submitted', 'proposals_summary', 'task_updated', 'batch'].includes(data.type)) {
                                 this.fetchData();
                             }
                         };
@@ -892,22 +1182,123 @@ async def landing_page(request: Request):
 @app.get("/metrics")
 async def metrics():
     """Prometheus 監控指標"""
-    update_market_metrics(market, solana_escrow)
     from fastapi.responses import Response
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
+# === 診斷端點 ===
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """管理端點驗證：需設定 ADMIN_TOKEN 並以 X-Admin-Token header 帶入；未設定時一律拒絕"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+profiler = SamplingProfiler(interval=float(os.getenv("PROFILE_INTERVAL", "0.005")))
+PROFILE_MAX_SECONDS = 60.0
+
+
+@app.get("/debug/loop", dependencies=[Depends(require_admin)])
+async def debug_loop():
+    """event loop 延遲統計與最近的阻塞堆疊"""
+    loop_monitor.ensure_running()
+    return loop_monitor.snapshot()
+
+
+@app.get("/debug/profile", response_model=None, dependencies=[Depends(require_admin)])
+async def debug_profile(seconds: float = 5.0, top: int = 20, format: str = "json"):
+    """
+    取樣 profiler：取樣期間 event loop 照常服務請求 (取樣在背景執行緒進行)
+    format=collapsed 直接回傳 flamegraph 用的 collapsed stacks 純文字
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if format not in ("json", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'collapsed'")
+    try:
+        result = await asyncio.to_thread(profiler.run, seconds)
+    except ProfilerBusyError:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    collapsed = profiler.collapsed(result["stacks"])
+    if format == "collapsed":
+        return PlainTextResponse(collapsed)
+    return {
+        "seconds": result["seconds"],
+        "samples": result["samples"],
+        "interval": profiler.interval,
+        "hotspots": profiler.hotspots(result["stacks"], top=top),
+        "collapsed": collapsed,
+    }
+
+@app.get("/debug/memory", dependencies=[Depends(require_admin)])
+async def debug_memory(snapshot: bool = False, seconds: float = 0.0, top: int = 20):
+    """
+    各子系統的記憶體估算；snapshot=true 時附上 tracemalloc 快照 (前 top 個配置位置)
+    未持續追蹤時會暫時啟用 tracemalloc seconds 秒 (必須 > 0)，只統計該期間的新配置
+    """
+    if not 0 <= seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in [0, {PROFILE_MAX_SECONDS:g}]")
+    if snapshot and seconds == 0 and not tracemalloc.is_tracing():
+        raise HTTPException(status_code=400,
+                            detail="seconds must be > 0 when tracemalloc is not already tracing")
+    estimates = memory_accountant.estimates()
+    body = {
+        "tracemalloc_enabled": tracemalloc.is_tracing(),
+        "estimated_total_bytes": sum(stats["estimated_bytes"] for stats in estimates.values()),
+        "subsystems": estimates,
+    }
+    if snapshot:
+        try:
+            body["tracemalloc"] = await asyncio.to_thread(tracemalloc_snapshot, top, seconds)
+        except TracemallocBusyError:
+            raise HTTPException(status_code=409, detail="A tracemalloc window is already running")
+    return body
+
+
+@app.post("/debug/backtest", dependencies=[Depends(require_admin)])
+async def debug_backtest(request: BacktestRequest):
+    """以目前市場的任務 / 投標紀錄回測替代策略 (欄式重播，在背景執行緒執行)"""
+    # 事件在 event loop 上取出：tasks / bids 仍會被其他請求修改，背景執行緒不能直接迭代
+    records = list(market_records(market))
+
+    def run():
+        backtester = Backtester(MarketHistory.from_records(records))
+        results = backtester.compare(request.strategies, request.cost_per_token, subject=request.subject,
+                                     domains=request.domains, trust_level=request.trust_level)
+        return backtester.history, results
+
+    try:
+        history, results = await asyncio.to_thread(run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "tasks": history.num_tasks,
+        "bids": history.num_bids,
+        "events": history.events,
+        "results": [result.to_dict() for result in results],
+    }
+
 # === 健康檢查端點 ===
 @app.get("/health")
 async def health_check():
-    """系統健康檢查"""
-    update_market_metrics(market, solana_escrow)
+    """系統健康檢查 (市場統計區塊依變更版本快取，timestamp 每次更新)"""
+    sections = response_cache.get_or_build("health", current_state_version(), build_health_sections)
     return {
         "status": "healthy",
         "version": "2.1.0",
         "timestamp": datetime.now(timezone.utc).isoformat(),
+        **sections,
+    }
+
+
+@instrumentation.timed("api.build_health_sections")
+def build_health_sections() -> dict:
+    return {
         "market": {
             "total_tasks": len(market.tasks),
-            "active_tasks": len([t for t in market.tasks.values() if t.status.value == "open"])
+            "active_tasks": market.counters.open_tasks
         },
         "solana": {
             "total_escrows": len(solana_escrow.escrows) if solana_escrow else 0,
@@ -0,0 +1,327 @@
+"""
+策略回測 (Strategy backtesting)
+把錄下的 task / bid / selection 事件轉成欄式陣列 (MarketHistory)，
+以替代策略重新出價後，用與 HubMarket._score_bid / select_winner 相同的規則向量化重新選商，
+比較勝率、利潤率與成交率相對於原始紀錄的變化
+基準為紀錄中實際的得標者 (selection 事件)；尚未選商的任務以同一選商規則推算
+
+兩種模式：
+- 替換 (subject=bidder_id)：該 bidder 的每筆投標改由替代策略出價，市場狀態為同任務中「在它之前」的投標
+- 新進者 (subject=None)：虛擬 bidder 對每個成本划算的任務追加一筆投標，市場狀態為該任務的全部投標
+其他 bidder 的出價維持紀錄值 (不模擬對手反應)
+
+事件格式 (dict / JSONL 一行一筆)：
+  {"type": "task", "task_id", "max_budget", "expected_tokens", "required_domain"}
+  {"type": "bid", "task_id", "bidder_id", "bid_price", "domains", "trust_level"}
+  {"type": "selection", "task_id", "bidder_id"}
+"""
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .hub_market import DOMAIN_BONUS, TRUST_BONUS
+from .strategies import STRATEGIES, MarketStateBatch
+
+EVENT_TYPES = ("task", "bid", "selection")
+
+
+@dataclass
+class MarketHistory:
+    """欄式市場紀錄；bid_* 陣列依事件順序排列"""
+    task_ids: List[str]
+    budget: np.ndarray
+    tokens: np.ndarray
+    task_domain: List[Optional[str]]
+    bid_task: np.ndarray  # 投標所屬任務的索引
+    bid_price: np.ndarray
+    bid_bidder: np.ndarray  # bidders 的索引
+    bid_domain_match: np.ndarray
+    bid_trust_bonus: np.ndarray
+    bidders: List[str]
+    recorded_winner: np.ndarray  # 每個任務紀錄中的得標 bidder 索引，未選商為 -1
+    events: int = 0
+
+    @property
+    def num_tasks(self) -> int:
+        return len(self.task_ids)
+
+    @property
+    def num_bids(self) -> int:
+        return len(self.bid_price)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "MarketHistory":
+        """事件缺欄位、或投標 / 選商指向尚未出現的任務時拋出 ValueError"""
+        task_index: Dict[str, int] = {}
+        bidder_index: Dict[str, int] = {}
+        task_ids, budgets, tokens, domains, winners = [], [], [], [], []
+        bid_task, bid_price, bid_bidder, bid_match, bid_trust = [], [], [], [], []
+        events = 0
+        for record in records:
+            events += 1
+            kind = record.get("type")
+            try:
+                if kind == "task":
+                    task_index[record["task_id"]] = len(task_ids)
+                    task_ids.append(record["task_id"])
+                    budgets.append(record["max_budget"])
+                    tokens.append(record["expected_tokens"])
+                    domains.append(record.get("required_domain"))
+                    winners.append(-1)
+                elif kind == "bid":
+                    t = task_index[record["task_id"]]
+                    bidder = bidder_index.setdefault(record["bidder_id"], len(bidder_index))
+                    bid_task.append(t)
+                    bid_price.append(record["bid_price"])
+                    bid_bidder.append(bidder)
+                    bid_match.append(bool(domains[t]) and domains[t] in (record.get("domains") or ()))
+                    bid_trust.append(TRUST_BONUS.get(record.get("trust_level", "standard"), 0.0))
+                elif kind == "selection":
+                    winners[task_index[record["task_id"]]] = bidder_index.setdefault(
+                        record["bidder_id"], len(bidder_index))
+                else:
+                    raise ValueError(f"Unknown event type: {kind}")
+            except KeyError as e:
+                raise ValueError(f"Malformed {kind} event #{events}: unknown or missing {e}") from None
+        return cls(
+            task_ids=task_ids,
+            budget=np.array(budgets, dtype=float),
+            tokens=np.array(tokens, dtype=float),
+            task_domain=domains,
+            bid_task=np.array(bid_task, dtype=np.int64),
+            bid_price=np.array(bid_price, dtype=float),
+            bid_bidder=np.array(bid_bidder, dtype=np.int64),
+            bid_domain_match=np.array(bid_match, dtype=bool),
+            bid_trust_bonus=np.array(bid_trust, dtype=float),
+            bidders=list(bidder_index),
+            recorded_winner=np.array(winners, dtype=np.int64),
+            events=events,
+        )
+
+    @classmethod
+    def from_market(cls, market) -> "MarketHistory":
+        return cls.from_records(market_records(market))
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "MarketHistory":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_records(json.loads(line) for line in f if line.strip())
+
+
+def market_records(market) -> Iterator[Dict]:
+    """由 HubMarket 現有的任務與投標產生事件 (任務依建立順序、投標依提交順序)"""
+    for task in market.tasks.values():
+        yield {"type": "task", "task_id": task.task_id, "max_budget": task.max_budget,
+               "expected_tokens": task.expected_tokens, "required_domain": task.required_domain}
+        for bid in market.bids.get(task.task_id, ()):
+            yield {"type": "bid", "task_id": task.task_id, "bidder_id": bid.bidder_id,
+                   "bid_price": bid.bid_price, "domains": list(bid.domains or ()),
+                   "trust_level": bid.trust_level}
+        if task.assigned_to:
+            yield {"type": "selection", "task_id": task.task_id, "bidder_id": task.assigned_to}
+
+
+def write_jsonl(records: Iterable[Dict], path: str) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def select_winners(bid_task: np.ndarray, score: np.ndarray, valid: np.ndarray, num_tasks: int) -> np.ndarray:
+    """
+    向量化 select_winner：每個任務取有效投標中分數最低者，同分取最早提交者 (同 min() 語意)
+    回傳每個任務的得標投標索引，無有效投標為 -1
+    """
+    candidates = np.flatnonzero(valid)
+    order = np.lexsort((candidates, score[candidates], bid_task[candidates]))
+    ranked = candidates[order]
+    tasks = bid_task[ranked]
+    first = np.ones(len(ranked), dtype=bool)
+    first[1:] = tasks[1:] != tasks[:-1]
+    winners = np.full(num_tasks, -1, dtype=np.int64)
+    winners[tasks[first]] = ranked[first]
+    return winners
+
+
+def _prior_states(bid_task: np.ndarray, price: np.ndarray) -> MarketStateBatch:
+    """每筆投標提交前，同任務已有投標的統計 (avg / min / max / count)，以分段累積運算求得"""
+    n = len(price)
+    order = np.argsort(bid_task, kind="stable")
+    tasks, prices = bid_task[order], price[order]
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = tasks[1:] != tasks[:-1]
+    group = np.cumsum(new_group) - 1
+    starts = np.flatnonzero(new_group)
+    position = np.arange(n) - starts[group]
+
+    running = np.cumsum(prices)
+    prior_sum = running - prices - (running[starts] - prices[starts])[group]
+    # 分段 min / max：以群組序號位移讓各群組的值域互不重疊，再做一次全域 accumulate
+    span = (prices.max() - prices.min() + 1.0) if n else 1.0
+    running_min = np.minimum.accumulate(prices - group * span) + group * span
+    running_max = np.maximum.accumulate(prices + group * span) - group * span
+    has_prior = position > 0
+    shifted_min = np.where(has_prior, np.roll(running_min, 1), 0.0)
+    shifted_max = np.where(has_prior, np.roll(running_max, 1), 0.0)
+
+    states = MarketStateBatch(
+        avg_price=np.empty(n), min_price=np.empty(n), max_price=np.empty(n),
+        total_bids=np.empty(n, dtype=np.int64), task_complexity=np.full(n, 0.5),
+    )
+    states.avg_price[order] = np.where(has_prior, prior_sum / np.maximum(position, 1), 0.0)
+    states.min_price[order] = shifted_min
+    states.max_price[order] = shifted_max
+    states.total_bids[order] = position
+    return states
+
+
+def _task_states(history: MarketHistory, tasks: np.ndarray) -> MarketStateBatch:
+    """指定任務的全部投標統計"""
+    count = np.bincount(history.bid_task, minlength=history.num_tasks)
+    total = np.bincount(history.bid_task, weights=history.bid_price, minlength=history.num_tasks)
+    low = np.full(history.num_tasks, np.inf)
+    high = np.full(history.num_tasks, -np.inf)
+    np.minimum.at(low, history.bid_task, history.bid_price)
+    np.maximum.at(high, history.bid_task, history.bid_price)
+    has_bids = count[tasks] > 0
+    return MarketStateBatch(
+        avg_price=np.where(has_bids, total[tasks] / np.maximum(count[tasks], 1), 0.0),
+        min_price=np.where(has_bids, low[tasks], 0.0),
+        max_price=np.where(has_bids, high[tasks], 0.0),
+        total_bids=count[tasks],
+        task_complexity=np.full(len(tasks), 0.5),
+    )
+
+
+@dataclass
+class BacktestResult:
+    strategy: str
+    subject: Optional[str]
+    bids: int
+    metrics: Dict[str, float]
+    baseline: Dict[str, float]
+    events: int
+    seconds: float
+    deltas: Dict[str, float] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.deltas = {k: self.metrics[k] - self.baseline[k] for k in self.metrics}
+
+    @property
+    def events_per_sec(self) -> float:
+        return self.events / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "strategy": self.strategy,
+            "subject": self.subject,
+            "bids": self.bids,
+            "metrics": self.metrics,
+            "baseline": self.baseline,
+            "deltas": self.deltas,
+            "events": self.events,
+            "seconds": self.seconds,
+            "events_per_sec": self.events_per_sec,
+        }
+
+
+class Backtester:
+    """對同一份 MarketHistory 重複回測多個策略"""
+
+    def __init__(self, history: MarketHistory):
+        self.history = history
+        self._prior: Optional[MarketStateBatch] = None
+        self._recorded: Optional[np.ndarray] = None
+
+    def recorded_winners(self) -> np.ndarray:
+        """紀錄中每個任務得標者的投標索引 (同一 bidder 多筆投標取分數最低者)，未選商為 -1"""
+        if self._recorded is None:
+            h = self.history
+            score = h.bid_price - np.where(h.bid_domain_match, DOMAIN_BONUS, 0.0) - h.bid_trust_bonus
+            own = h.bid_bidder == h.recorded_winner[h.bid_task]
+            self._recorded = select_winners(h.bid_task, score, own, h.num_tasks)
+        return self._recorded
+
+    def run(self, strategy: str, cost_per_token: float, subject: Optional[str] = None,
+            domains: Sequence[str] = (), trust_level: str = "standard",
+            rng: Optional[np.random.Generator] = None) -> BacktestResult:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        start = time.perf_counter()
+        rng = rng if rng is not None else np.random.default_rng(0)  # 未指定時固定種子，回測可重現
+        h = self.history
+        bid_task, price = h.bid_task, h.bid_price
+        domain_bonus = np.where(h.bid_domain_match, DOMAIN_BONUS, 0.0)
+        trust_bonus = h.bid_trust_bonus
+
+        if subject is not None:
+            if subject not in h.bidders:
+                raise ValueError(f"Bidder not found in history: {subject}")
+            mine = np.flatnonzero(h.bid_bidder == h.bidders.index(subject))
+            if self._prior is None:
+                self._prior = _prior_states(bid_task, price)
+            states = self._prior.take(mine)
+            baseline_price = price
+        else:
+            budgets = h.budget
+            eligible = np.flatnonzero(h.tokens * cost_per_token < budgets * 0.9)
+            states = _task_states(h, eligible)
+            mine = np.arange(h.num_bids, h.num_bids + len(eligible))
+            matches = np.array([bool(h.task_domain[t]) and h.task_domain[t] in domains for t in eligible.tolist()],
+                               dtype=bool)
+            bid_task = np.concatenate([bid_task, eligible])
+            domain_bonus = np.concatenate([domain_bonus, np.where(matches, DOMAIN_BONUS, 0.0)])
+            trust_bonus = np.concatenate([trust_bonus, np.full(len(eligible), TRUST_BONUS.get(trust_level, 0.0))])
+            baseline_price = np.concatenate([price, np.full(len(eligible), np.inf)])  # 基準：新進者不存在
+
+        tasks_of_mine = bid_task[mine]
+        budgets = h.budget[tasks_of_mine]
+        costs = h.tokens[tasks_of_mine] * cost_per_token
+        new_prices = STRATEGIES[strategy].calculate_bids(costs, states, budgets, rng=rng)
+        # 與 SolverAgent 相同：成本不划算或出價無效時不投標
+        new_prices = np.where((costs < budgets * 0.9) & (new_prices > 0) & (new_prices <= budgets),
+                              new_prices, np.inf)
+        replayed = baseline_price.copy()
+        replayed[mine] = new_prices
+
+        metrics = self._outcome(bid_task, replayed, domain_bonus, trust_bonus, mine, costs)
+        baseline = self._outcome(bid_task, baseline_price, domain_bonus, trust_bonus, mine, costs,
+                                 recorded=True)
+        return BacktestResult(
+            strategy=strategy, subject=subject, bids=int(np.isfinite(new_prices).sum()),
+            metrics=metrics, baseline=baseline, events=h.events, seconds=time.perf_counter() - start,
+        )
+
+    def _outcome(self, bid_task, prices, domain_bonus, trust_bonus, mine, costs,
+                 recorded: bool = False) -> Dict[str, float]:
+        """recorded=True 時已選商的任務採紀錄中的得標者，其餘任務依選商規則推算"""
+        h = self.history
+        valid = np.isfinite(prices) & (prices <= h.budget[bid_task])
+        winners = select_winners(bid_task, prices - domain_bonus - trust_bonus, valid, h.num_tasks)
+        if recorded:
+            actual = self.recorded_winners()
+            winners = np.where(actual >= 0, actual, winners)
+        filled = winners >= 0
+        won = np.zeros(len(prices), dtype=bool)
+        won[winners[filled]] = True
+        my_wins = won[mine]
+        my_valid = valid[mine]
+        won_prices = prices[mine][my_wins]
+        won_costs = costs[my_wins]
+        return {
+            "win_rate": float(my_wins.sum() / my_valid.sum()) if my_valid.any() else 0.0,
+            "wins": float(my_wins.sum()),
+            "margin": float(((won_prices - won_costs) / won_prices).mean()) if won_prices.size else 0.0,
+            "profit": float((won_prices - won_costs).sum()),
+            "fill_rate": float(filled.mean()) if h.num_tasks else 0.0,
+            "avg_winning_price": float(prices[winners[filled]].mean()) if filled.any() else 0.0,
+        }
+
+    def compare(self, strategies: Iterable[str], cost_per_token: float, **kwargs) -> List[BacktestResult]:
+        return [self.run(name, cost_per_token, **kwargs) for name in strategies]
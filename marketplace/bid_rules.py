@@ -0,0 +1,194 @@
+"""
+常駐投標規則 (Standing bid rules)
+solver 預先登記「策略 + 每 token 成本 + 領域 + 預算範圍 + 容量」，
+create_task 時以 NumPy 一次評估所有規則，符合者直接由 hub 代為投標，不需任何網路往返
+
+規則以 structure-of-arrays 保存 (每個欄位一個 ndarray)，評估成本為數個向量運算；
+同策略的規則共用一次 calculate_bids 呼叫
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .strategies import STRATEGIES, MarketState
+
+STRATEGY_NAMES: Tuple[str, ...] = tuple(STRATEGIES)
+_INITIAL_CAPACITY = 64
+
+
+@dataclass
+class StandingBidRule:
+    """常駐投標規則；capacity 為同時進行中 (已得標未交付) 的任務上限，None 表示不限"""
+    solver_id: str
+    strategy: str
+    cost_per_token: float
+    domains: Set[str] = field(default_factory=set)
+    min_budget: float = 0.0
+    max_budget: Optional[float] = None
+    capacity: Optional[int] = None
+    model_name: str = "standing_rule"
+    trust_level: str = "standard"
+
+    def __post_init__(self):
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {self.strategy}")
+        if self.cost_per_token <= 0:
+            raise ValueError("cost_per_token must be positive")
+        if self.capacity is not None and self.capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "solver_id": self.solver_id,
+            "strategy": self.strategy,
+            "cost_per_token": self.cost_per_token,
+            "domains": sorted(self.domains),
+            "min_budget": self.min_budget,
+            "max_budget": self.max_budget,
+            "capacity": self.capacity,
+            "model_name": self.model_name,
+            "trust_level": self.trust_level,
+        }
+
+
+class BidRuleEngine:
+    """以 solver_id 為鍵的規則表 (每個 solver 一條規則，重新登記即覆蓋)"""
+
+    # (欄位, 填充值, dtype)；空 slot 的填充值保證不會被評估選中
+    _COLUMNS = (
+        ("enabled", False, bool),
+        ("any_domain", False, bool),
+        ("cost_per_token", 0.0, float),
+        ("min_budget", 0.0, float),
+        ("max_budget", np.inf, float),
+        ("capacity", np.iinfo(np.int64).max, np.int64),
+        ("active", 0, np.int64),
+        ("strategy_code", -1, np.int16),
+    )
+
+    def __init__(self, rng: Optional[np.random.Generator] = None):
+        # 未指定時使用固定種子，同樣的規則與任務序列產生同樣的出價
+        self.rng = rng if rng is not None else np.random.default_rng(0)
+        self.rules: List[Optional[StandingBidRule]] = []
+        self.slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._allocated = _INITIAL_CAPACITY
+        for name, fill, dtype in self._COLUMNS:
+            setattr(self, name, np.full(self._allocated, fill, dtype=dtype))
+        # domain -> 布林遮罩；未限定領域的規則記在 any_domain
+        self._domain_masks: Dict[str, np.ndarray] = {}
+        # 重新登記時保留 solver 進行中的任務數
+        self._carried_active: Dict[str, int] = {}
+
+    def _grow(self):
+        capacity = self._allocated * 2
+        for name, fill, dtype in self._COLUMNS:
+            column = np.full(capacity, fill, dtype=dtype)
+            column[:self._allocated] = getattr(self, name)
+            setattr(self, name, column)
+        for domain, mask in self._domain_masks.items():
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:self._allocated] = mask
+            self._domain_masks[domain] = grown
+        self._allocated = capacity
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def register(self, rule: StandingBidRule) -> StandingBidRule:
+        if rule.solver_id in self.slots:
+            self.unregister(rule.solver_id, keep_active=True)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._size == self._allocated:
+                self._grow()
+            slot = self._size
+            self._size += 1
+            self.rules.append(None)
+        self.rules[slot] = rule
+        self.slots[rule.solver_id] = slot
+        self.enabled[slot] = True
+        self.any_domain[slot] = not rule.domains
+        for domain in rule.domains:
+            if domain not in self._domain_masks:
+                self._domain_masks[domain] = np.zeros(self._allocated, dtype=bool)
+            self._domain_masks[domain][slot] = True
+        self.cost_per_token[slot] = rule.cost_per_token
+        self.min_budget[slot] = rule.min_budget
+        self.max_budget[slot] = np.inf if rule.max_budget is None else rule.max_budget
+        self.capacity[slot] = np.iinfo(np.int64).max if rule.capacity is None else rule.capacity
+        self.active[slot] = self._carried_active.pop(rule.solver_id, 0)
+        self.strategy_code[slot] = STRATEGY_NAMES.index(rule.strategy)
+        return rule
+
+    def unregister(self, solver_id: str, keep_active: bool = False) -> bool:
+        slot = self.slots.pop(solver_id, None)
+        if slot is None:
+            return False
+        if keep_active:
+            self._carried_active[solver_id] = int(self.active[slot])
+        rule = self.rules[slot]
+        self.rules[slot] = None
+        self.enabled[slot] = False
+        self.any_domain[slot] = False
+        for domain in rule.domains:
+            self._domain_masks[domain][slot] = False
+        self.active[slot] = 0
+        self._free.append(slot)
+        return True
+
+    # --- 容量追蹤 (由 HubMarket 在任務進入 / 離開 in_progress 時呼叫) ---
+
+    def assignment_started(self, solver_id: Optional[str]):
+        slot = self.slots.get(solver_id)
+        if slot is not None:
+            self.active[slot] += 1
+
+    def assignment_finished(self, solver_id: Optional[str]):
+        slot = self.slots.get(solver_id)
+        if slot is not None and self.active[slot] > 0:
+            self.active[slot] -= 1
+
+    def remaining_capacity(self, solver_id: str) -> Optional[int]:
+        """規則宣告的容量扣掉進行中的任務數；沒有規則或未設上限時為 None"""
+        slot = self.slots.get(solver_id)
+        if slot is None or self.rules[slot].capacity is None:
+            return None
+        return max(int(self.capacity[slot] - self.active[slot]), 0)
+
+    # --- 評估 ---
+
+    def evaluate(self, task, state: Optional[MarketState] = None) -> List[Tuple[StandingBidRule, float]]:
+        """
+        回傳 [(規則, 出價)]：領域、預算範圍、容量、成本效益 (成本 < 預算 90%，同 SolverAgent.evaluate_task)
+        與出價 <= 預算皆以向量運算判斷
+        """
+        n = self._size
+        if not self.slots:
+            return []
+        budget = task.max_budget
+        mask = self.enabled[:n] & (self.active[:n] < self.capacity[:n])
+        mask &= (self.min_budget[:n] <= budget) & (self.max_budget[:n] >= budget)
+        if task.required_domain:
+            domain_mask = self._domain_masks.get(task.required_domain)
+            allowed = self.any_domain[:n] if domain_mask is None else self.any_domain[:n] | domain_mask[:n]
+            mask &= allowed
+        costs = task.expected_tokens * self.cost_per_token[:n]
+        mask &= costs < budget * 0.9
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        state = state or MarketState(avg_price=0, min_price=0, max_price=0, total_bids=0, task_complexity=0.5)
+        prices = np.empty(candidates.size, dtype=float)
+        codes = self.strategy_code[candidates]
+        for code in np.unique(codes):
+            group = codes == code
+            strategy = STRATEGIES[STRATEGY_NAMES[code]]
+            prices[group] = strategy.calculate_bids(costs[candidates[group]], state, budget, rng=self.rng)
+        accepted = (prices > 0) & (prices <= budget)
+        return [(self.rules[slot], float(price))
+                for slot, price in zip(candidates[accepted], prices[accepted])]
@@ -0,0 +1,261 @@
+"""
+執行期診斷 (Diagnostics)
+- RequestTimingMiddleware: 純 ASGI 中介層，依 route 樣板 / method / status 記錄延遲與進行中請求數
+- LoopLagMonitor: 量測 event loop 排程延遲；watchdog 執行緒在 loop 卡住超過門檻時記錄當下堆疊
+- SamplingProfiler: 以 sys._current_frames() 定期取樣所有執行緒堆疊，輸出 collapsed stacks 與熱點摘要
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from loguru import logger
+
+from .metrics import (
+    event_loop_lag, event_loop_stalls, http_request_duration, http_requests_in_flight,
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestTimingMiddleware:
+    """
+    以 route 樣板 (如 /tasks/{task_id}) 作為標籤，避免路徑參數造成高基數
+    未匹配任何路由的請求 (404) 統一記為 "unmatched"
+    """
+
+    def __init__(self, app, on_request=None):
+        self.app = app
+        self.on_request = on_request  # 每個請求開始時呼叫 (用於延遲啟動 LoopLagMonitor)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.on_request is not None:
+            self.on_request()
+
+        method = scope.get("method", "GET")
+        status_code = 500
+        in_flight = http_requests_in_flight.labels(method=method)
+        in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = scope.get("route")
+            http_request_duration.labels(
+                method=method,
+                route=getattr(route, "path", UNMATCHED_ROUTE),
+                status=str(status_code),
+            ).observe(time.perf_counter() - start)
+
+
+class LoopLagMonitor:
+    """
+    每 interval 秒排程一次 sleep，實際喚醒時間與預期的差即為 loop 延遲
+    另起 watchdog 執行緒：心跳超過 interval + threshold 未更新時，
+    透過 sys._current_frames() 取得 loop 執行緒堆疊 (即阻塞 loop 的程式碼) 並記錄
+    """
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1, history: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._task: Optional[asyncio.Task] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._stall_reported = False
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    # --- loop 端 ---
+
+    def ensure_running(self):
+        """在目前 event loop 上啟動量測 (重複呼叫安全；換 loop 時重新啟動)"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = loop.create_task(self._run())
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._stopped.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - expected)
+
+    def record(self, lag: float):
+        lag = max(0.0, lag)
+        self._heartbeat = time.monotonic()
+        self._stall_reported = False
+        self.samples += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        event_loop_lag.observe(lag)
+        if lag > self.threshold:
+            event_loop_stalls.inc()
+            if self.stalls and self.stalls[-1].get("lag") is None:
+                self.stalls[-1]["lag"] = round(lag, 6)
+
+    # --- watchdog 執行緒 ---
+
+    def _watch(self):
+        poll = max(self.threshold / 2, 0.01)
+        while not self._stopped.wait(poll):
+            if not self._loop_active():
+                continue
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for > self.threshold and not self._stall_reported:
+                self._stall_reported = True
+                self.capture_stall(blocked_for)
+
+    def _loop_active(self) -> bool:
+        task = self._task
+        return task is not None and not task.done() and task.get_loop().is_running()
+
+    def capture_stall(self, blocked_for: float) -> Dict[str, Any]:
+        """擷取 loop 執行緒目前的堆疊 (阻塞中的程式碼位置)"""
+        frame = sys._current_frames().get(self._loop_thread_id) if self._loop_thread_id else None
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        stall = {
+            "detected_at": time.time(),
+            "blocked_for": round(blocked_for, 6),
+            "lag": None,  # 由 loop 恢復後的下一次量測補上
+            "stack": stack,
+        }
+        self.stalls.append(stall)
+        logger.warning("🐢 [Loop] event loop 阻塞超過 {blocked_for:.3f}s\n{stack}",
+                       event="loop_blocked", blocked_for=blocked_for, stack=stack)
+        return stall
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "samples": self.samples,
+            "last_lag": round(self.last_lag, 6),
+            "max_lag": round(self.max_lag, 6),
+            "stalls": list(self.stalls),
+        }
+
+
+class ProfilerBusyError(RuntimeError):
+    """同一時間只允許一個取樣工作"""
+
+
+class SamplingProfiler:
+    """
+    行程內取樣 profiler：取樣執行緒每 interval 秒讀取一次所有執行緒的 frame，
+    不安裝 sys.setprofile hook，被取樣的程式碼不需付出額外成本
+    結果為 collapsed stack ("thread;module:func;... count")，可直接餵給 flamegraph.pl / speedscope
+    """
+
+    def __init__(self, interval: float = 0.005, package: str = "marketplace", max_depth: int = 128):
+        self.interval = interval
+        self.package = package
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+    def _stack(self, frame) -> List[str]:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            names.append(self._frame_name(frame))
+            frame = frame.f_back
+        names.reverse()
+        return names
+
+    def sample_once(self, stacks: Counter, exclude: set):
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude:
+                continue
+            stack = self._stack(frame)
+            stack.insert(0, thread_names.get(thread_id, f"thread-{thread_id}"))
+            stacks[tuple(stack)] += 1
+
+    def run(self, seconds: float) -> Dict[str, Any]:
+        """阻塞取樣 seconds 秒 (請在非 event loop 執行緒呼叫，例如 asyncio.to_thread)"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("profiler already running")
+        try:
+            stacks: Counter = Counter()
+            exclude = {threading.get_ident()}
+            samples = 0
+            start = time.perf_counter()
+            deadline = start + seconds
+            while time.perf_counter() < deadline:
+                self.sample_once(stacks, exclude)
+                samples += 1
+                time.sleep(self.interval)
+            return {"seconds": round(time.perf_counter() - start, 3), "samples": samples, "stacks": stacks}
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common())
+
+    def hotspots(self, stacks: Counter, top: int = 20) -> List[Dict[str, Any]]:
+        """
+        只看 package 內的函式：self = 該函式是堆疊中最深的 package frame，
+        inclusive = 該函式出現在堆疊中 (同一堆疊重複出現只算一次)
+        """
+        prefix = self.package + "."
+        self_counts: Counter = Counter()
+        inclusive_counts: Counter = Counter()
+        total = 0
+        for stack, count in stacks.items():
+            own = [name for name in stack[1:] if name.startswith(prefix)]
+            if not own:
+                continue
+            total += count
+            self_counts[own[-1]] += count
+            for name in set(own):
+                inclusive_counts[name] += count
+        ranked = sorted(inclusive_counts, key=lambda name: (-self_counts[name], -inclusive_counts[name], name))
+        return [
+            {
+                "function": name,
+                "self_samples": self_counts[name],
+                "inclusive_samples": inclusive_counts[name],
+                "self_pct": round(100.0 * self_counts[name] / total, 2) if total else 0.0,
+                "inclusive_pct": round(100.0 * inclusive_counts[name] / total, 2) if total else 0.0,
+            }
+            for name in ranked[:top]
+        ]
@@ -0,0 +1,229 @@
+"""
+離散事件模擬 (Discrete-event simulation)
+HubMarket 注入虛擬時鐘，事件佇列 (heapq) 依時間順序處理：
+任務到達 → 各 Agent 延遲投標 → 截標選商 → 執行完成 → 驗收，外加定期過期清理
+時間直接跳到下一個事件，不需 sleep，數天的市場活動可在數秒內跑完
+
+各階段的間隔 / 延遲由 Distribution 設定；報告含 time-to-assign 統計與
+MarketTimeSeries 的吞吐量曲線 (tasks/sec、assignments/sec、fill rate、time-to-assign)
+"""
+import heapq
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .hub_market import HubMarket, Task, TaskStatus
+from .log_config import quiet_logging
+from .simulation import build_agents
+from .solver_agents import SolverAgent
+from .streaming_stats import StreamingStats
+
+DEFAULT_START = 1_767_225_600.0  # 2026-01-01T00:00:00Z，固定起點讓結果可重現
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    抽樣分布
+    constant(a) | exponential(平均 a) | uniform(a, b) | lognormal(中位數 a, sigma b)
+    """
+    kind: str
+    a: float
+    b: float = 0.0
+
+    def __post_init__(self):
+        if self.kind not in ("constant", "exponential", "uniform", "lognormal"):
+            raise ValueError(f"Unknown distribution: {self.kind}")
+
+    def sample(self, rng: np.random.Generator) -> float:
+        if self.kind == "constant":
+            return self.a
+        if self.kind == "exponential":
+            return float(rng.exponential(self.a))
+        if self.kind == "uniform":
+            return float(rng.uniform(self.a, self.b))
+        return float(rng.lognormal(math.log(self.a), self.b))
+
+
+class VirtualClock:
+    """可呼叫的虛擬時鐘 (epoch 秒)，只能往前推進"""
+
+    def __init__(self, start: float = DEFAULT_START):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance_to(self, t: float):
+        if t > self.now:
+            self.now = t
+
+
+@dataclass
+class EventSimulationConfig:
+    duration_seconds: float = 3 * 86400
+    num_agents: int = 20
+    seed: int = 0
+    task_interarrival: Distribution = Distribution("exponential", 60.0)
+    budget: Distribution = Distribution("uniform", 1.0, 5.0)
+    expected_tokens: Distribution = Distribution("uniform", 10_000, 100_000)
+    bid_delay: Distribution = Distribution("exponential", 30.0)  # 任務發布到 Agent 投標
+    bid_probability: float = 0.8  # 每個 Agent 回應某任務的機率
+    bid_window: Distribution = Distribution("constant", 300.0)  # 發布到截標選商
+    execution_time: Distribution = Distribution("lognormal", 900.0, 0.5)
+    verification_delay: Distribution = Distribution("exponential", 600.0)
+    approval_rate: float = 0.95
+    expires_in_hours: int = 1
+    expiry_sweep_seconds: float = 300.0
+    quiet: bool = True
+
+
+@dataclass
+class EventSimulationReport:
+    simulated_seconds: float
+    wall_seconds: float
+    events: int
+    counts: Dict[str, int]
+    time_to_assign: Dict[str, float]
+    resolution: str
+    curves: Dict[str, List[Dict[str, float]]] = field(default_factory=dict)
+
+    @property
+    def speedup(self) -> float:
+        """模擬時間 / 實際耗時"""
+        return self.simulated_seconds / self.wall_seconds if self.wall_seconds else math.inf
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "simulated_seconds": self.simulated_seconds,
+            "wall_seconds": self.wall_seconds,
+            "speedup": self.speedup,
+            "events": self.events,
+            "counts": self.counts,
+            "time_to_assign": self.time_to_assign,
+            "resolution": self.resolution,
+            "curves": self.curves,
+        }
+
+
+class EventSimulation:
+    """離散事件模擬器；run() 可重複呼叫以延長模擬時間"""
+
+    CURVES = ("tasks_per_sec", "assignments_per_sec", "fill_rate", "time_to_assign")
+
+    def __init__(self, config: Optional[EventSimulationConfig] = None,
+                 agents: Optional[List[SolverAgent]] = None):
+        self.config = config or EventSimulationConfig()
+        self.rng = np.random.default_rng(self.config.seed)
+        self.clock = VirtualClock()
+        self.start = self.clock.now
+        self.market = HubMarket(clock=self.clock, seed=self.config.seed)
+        self.agents = agents if agents is not None else build_agents(self.config.num_agents)
+        # 逐筆出價的亂數 (RandomWalk) 由模擬種子衍生，不動用全域 random
+        for agent, child in zip(self.agents, np.random.SeedSequence(self.config.seed).spawn(len(self.agents))):
+            agent.rng = np.random.default_rng(child)
+        self._queue: List[Tuple[float, int, str, object]] = []
+        self._seq = 0
+        self.events = 0
+        self.counts: Dict[str, int] = dict.fromkeys(
+            ("tasks", "bids", "assigned", "unassigned", "completed", "rejected", "expired"), 0)
+        self.time_to_assign = StreamingStats(quantiles=(0.5, 0.9))
+        self.schedule(self.config.task_interarrival.sample(self.rng), "task_arrival")
+        self.schedule(self.config.expiry_sweep_seconds, "expiry_sweep")
+
+    def schedule(self, delay: float, kind: str, payload: object = None):
+        heapq.heappush(self._queue, (self.clock.now + max(0.0, delay), self._seq, kind, payload))
+        self._seq += 1
+
+    def run(self, duration_seconds: Optional[float] = None) -> EventSimulationReport:
+        duration = self.config.duration_seconds if duration_seconds is None else duration_seconds
+        end = self.clock.now + duration
+        wall_start = time.perf_counter()
+        with quiet_logging(self.config.quiet):
+            while self._queue and self._queue[0][0] <= end:
+                at, _, kind, payload = heapq.heappop(self._queue)
+                self.clock.advance_to(at)
+                getattr(self, f"_on_{kind}")(payload)
+                self.events += 1
+            self.clock.advance_to(end)
+        return self.report(time.perf_counter() - wall_start)
+
+    # --- 事件處理 ---
+
+    def _on_task_arrival(self, _):
+        config, rng = self.config, self.rng
+        task = self.market.create_task(
+            "Simulated task", "sim",
+            max_budget=round(config.budget.sample(rng), 4),
+            expected_tokens=int(config.expected_tokens.sample(rng)),
+            expires_in_hours=config.expires_in_hours,
+        )
+        self.counts["tasks"] += 1
+        for agent in self.agents:
+            if rng.random() < config.bid_probability and agent.evaluate_task(task):
+                self.schedule(config.bid_delay.sample(rng), "bid", (agent, task))
+        self.schedule(config.bid_window.sample(rng), "select", task)
+        self.schedule(config.task_interarrival.sample(rng), "task_arrival")
+
+    def _on_bid(self, payload: Tuple[SolverAgent, Task]):
+        agent, task = payload
+        if task.status != TaskStatus.OPEN:
+            return
+        price = agent.calculate_bid(task, self.market.get_market_state(task.task_id))
+        if price and price <= task.max_budget:
+            self.market.submit_bid(task.task_id, agent.config.agent_id, round(price, 6),
+                                   task.expected_tokens, agent.config.model_name)
+            self.counts["bids"] += 1
+
+    def _on_select(self, task: Task):
+        if task.status != TaskStatus.OPEN:
+            return
+        if self.market.select_winner(task.task_id) is None:
+            self.counts["unassigned"] += 1  # 留在 OPEN，之後由過期清理處理
+            return
+        self.counts["assigned"] += 1
+        self.time_to_assign.add((task.assigned_at - task.created_at).total_seconds())
+        self.schedule(self.config.execution_time.sample(self.rng), "complete", task)
+
+    def _on_complete(self, task: Task):
+        self.market.submit_result(task.task_id, "simulated result")
+        self.schedule(self.config.verification_delay.sample(self.rng), "verify", task)
+
+    def _on_verify(self, task: Task):
+        approved = bool(self.rng.random() < self.config.approval_rate)
+        self.market.verify_result(task.task_id, approved=approved)
+        self.counts["completed" if approved else "rejected"] += 1
+
+    def _on_expiry_sweep(self, _):
+        self.counts["expired"] += self.market.expire_old_tasks()
+        self.schedule(self.config.expiry_sweep_seconds, "expiry_sweep")
+
+    # --- 報告 ---
+
+    def report(self, wall_seconds: float = 0.0) -> EventSimulationReport:
+        simulated = self.clock.now - self.start
+        resolution = "minute" if simulated <= 86400 else "hour"
+        width, capacity = self.market.timeseries.resolutions[resolution]
+        points = max(1, min(capacity, int(simulated // width) + 1))
+        stats = self.time_to_assign
+        return EventSimulationReport(
+            simulated_seconds=simulated,
+            wall_seconds=wall_seconds,
+            events=self.events,
+            counts=dict(self.counts),
+            time_to_assign={
+                "count": stats.count,
+                "mean": stats.mean,
+                "p50": stats.quantile(0.5, 0.0),
+                "p90": stats.quantile(0.9, 0.0),
+                "max": stats.max if stats.count else 0.0,
+            },
+            resolution=resolution,
+            curves={
+                metric: self.market.timeseries.query(metric, resolution, points)
+                for metric in self.CURVES
+            },
+        )
@@ -0,0 +1,190 @@
+"""
+輕量 Solver 集群 (Flyweight solver fleet)
+大量模擬 Agent 以 structure-of-arrays 保存：每個 Agent 只有出價需要的數值欄位
+(每 token 成本、策略代碼、模型代碼、專長位元遮罩)，策略共用 STRATEGIES 單例，
+agent id 由索引推導，不建立 SolverAgent / AgentConfig 物件，也不逐一寫 log
+
+整個集群對一個任務的報價是一次向量運算 (同策略的 Agent 共用一次 calculate_bids)，
+十萬個 Agent 約佔 2 MB
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .strategies import STRATEGIES, MarketState
+from .solver_agents import AgentConfig, diverse_solver_configs
+
+STRATEGY_NAMES: Tuple[str, ...] = tuple(STRATEGIES)
+GENERAL_DOMAIN = "general"
+MAX_DOMAINS = 64
+_INITIAL_CAPACITY = 1024
+
+
+class SolverFleet:
+    """
+    Agent 集群；專長以 uint64 位元遮罩表示 (最多 64 個領域)
+    任務指定 required_domain 時，只有具備該領域或 general 專長的 Agent 會報價
+    """
+
+    # (欄位, 填充值, dtype)
+    _COLUMNS = (
+        ("cost_per_token", 0.0, np.float64),
+        ("strategy_code", -1, np.int8),
+        ("model_code", -1, np.int16),
+        ("specialization", 0, np.uint64),
+    )
+
+    def __init__(self, prefix: str = "fleet", rng: Optional[np.random.Generator] = None):
+        self.prefix = prefix
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.models: List[str] = []
+        self._model_codes: Dict[str, int] = {}
+        self.domain_bits: Dict[str, int] = {}
+        self._size = 0
+        self._allocated = _INITIAL_CAPACITY
+        for name, fill, dtype in self._COLUMNS:
+            setattr(self, name, np.full(self._allocated, fill, dtype=dtype))
+
+    @classmethod
+    def from_configs(cls, size: int, configs: Optional[Iterable[AgentConfig]] = None,
+                     prefix: str = "fleet", rng: Optional[np.random.Generator] = None,
+                     cost_jitter: float = 0.0) -> "SolverFleet":
+        """
+        輪流以 configs (預設 diverse_solver_configs) 為範本建立 size 個 Agent
+        cost_jitter > 0 時每個 Agent 的成本乘上 uniform(1 - j, 1 + j)，讓同範本的 Agent 報價有差異
+        """
+        fleet = cls(prefix=prefix, rng=rng)
+        templates = list(configs) if configs is not None else diverse_solver_configs()
+        if not templates:
+            raise ValueError("At least one agent config is required")
+        fleet._reserve(size)
+        picks = np.arange(size) % len(templates)
+        jitter = fleet.rng.uniform(1 - cost_jitter, 1 + cost_jitter, size) if cost_jitter else np.ones(size)
+        codes = [fleet._template_codes(cfg) for cfg in templates]
+        end = fleet._size + size
+        rows = slice(fleet._size, end)
+        fleet.cost_per_token[rows] = np.array([cfg.cost_per_token for cfg in templates])[picks] * jitter
+        fleet.strategy_code[rows] = np.array([c[0] for c in codes], dtype=np.int8)[picks]
+        fleet.model_code[rows] = np.array([c[1] for c in codes], dtype=np.int16)[picks]
+        fleet.specialization[rows] = np.array([c[2] for c in codes], dtype=np.uint64)[picks]
+        fleet._size = end
+        return fleet
+
+    # --- 建立 ---
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self._allocated:
+            return
+        capacity = self._allocated
+        while capacity < needed:
+            capacity *= 2
+        for name, fill, dtype in self._COLUMNS:
+            column = np.full(capacity, fill, dtype=dtype)
+            column[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, column)
+        self._allocated = capacity
+
+    def domain_bit(self, domain: str) -> int:
+        bit = self.domain_bits.get(domain)
+        if bit is None:
+            if len(self.domain_bits) == MAX_DOMAINS:
+                raise ValueError(f"Fleet supports at most {MAX_DOMAINS} domains")
+            bit = self.domain_bits[domain] = 1 << len(self.domain_bits)
+        return bit
+
+    def _specialization_mask(self, domains: Iterable[str]) -> int:
+        mask = 0
+        for domain in domains:
+            mask |= self.domain_bit(domain)
+        return mask
+
+    def _template_codes(self, config: AgentConfig) -> Tuple[int, int, int]:
+        if config.strategy_name not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {config.strategy_name}")
+        model_code = self._model_codes.get(config.model_name)
+        if model_code is None:
+            model_code = self._model_codes[config.model_name] = len(self.models)
+            self.models.append(config.model_name)
+        return (STRATEGY_NAMES.index(config.strategy_name), model_code,
+                self._specialization_mask(config.specialization))
+
+    def add(self, config: AgentConfig) -> int:
+        """加入單一 Agent (config.agent_id 不保存，id 由索引推導)，回傳索引"""
+        strategy_code, model_code, specialization = self._template_codes(config)
+        self._reserve(1)
+        i = self._size
+        self.cost_per_token[i] = config.cost_per_token
+        self.strategy_code[i] = strategy_code
+        self.model_code[i] = model_code
+        self.specialization[i] = specialization
+        self._size += 1
+        return i
+
+    # --- 查詢 ---
+
+    def __len__(self) -> int:
+        return self._size
+
+    def agent_id(self, index: int) -> str:
+        return f"{self.prefix}_{index:06d}"
+
+    def strategy_of(self, index: int) -> str:
+        return STRATEGY_NAMES[self.strategy_code[index]]
+
+    def memory_bytes(self) -> int:
+        """已使用列的欄位位元組數"""
+        return sum(getattr(self, name)[:self._size].nbytes for name, _, _ in self._COLUMNS)
+
+    # --- 報價 ---
+
+    def quote(self, task, state: Optional[MarketState] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        整個集群對單一任務報價，回傳 (Agent 索引, 價格)
+        篩選同 SolverAgent.evaluate_task (成本 < 預算 90%) 加上專長遮罩，出價須 > 0 且 <= 預算
+        """
+        n = self._size
+        budget = task.max_budget
+        costs = task.expected_tokens * self.cost_per_token[:n]
+        mask = costs < budget * 0.9
+        if task.required_domain:
+            allowed = np.uint64(self.domain_bits.get(task.required_domain, 0)
+                                | self.domain_bits.get(GENERAL_DOMAIN, 0))
+            mask &= (self.specialization[:n] & allowed) != 0
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return candidates, np.empty(0)
+
+        state = state or MarketState(avg_price=0, min_price=0, max_price=0, total_bids=0, task_complexity=0.5)
+        prices = np.empty(candidates.size)
+        codes = self.strategy_code[candidates]
+        for code in np.unique(codes):
+            group = codes == code
+            strategy = STRATEGIES[STRATEGY_NAMES[code]]
+            prices[group] = strategy.calculate_bids(costs[candidates[group]], state, budget, rng=self.rng)
+        accepted = (prices > 0) & (prices <= budget)
+        return candidates[accepted], prices[accepted]
+
+    def bid_on_tasks(self, market, tasks: Iterable, top_k: Optional[int] = None) -> List:
+        """
+        整個集群對多個任務投標；每個任務以投標前的市場狀態報價 (同一時間點)
+        top_k: 每個任務只送出最低的 k 筆報價 (大型集群避免數十萬筆投標灌進 HubMarket)；None 為全部
+        """
+        submitted = []
+        for task in tasks:
+            indices, prices = self.quote(task, market.get_market_state(task.task_id))
+            if top_k is not None and indices.size > top_k:
+                keep = np.argpartition(prices, top_k - 1)[:top_k]
+                keep = keep[np.argsort(prices[keep], kind="stable")]
+                indices, prices = indices[keep], prices[keep]
+            for index, price in zip(indices.tolist(), prices.tolist()):
+                strategy = STRATEGIES[STRATEGY_NAMES[self.strategy_code[index]]]
+                submitted.append(market.submit_bid(
+                    task_id=task.task_id,
+                    bidder_id=self.agent_id(index),
+                    bid_price=round(price, 6),
+                    estimated_tokens=task.expected_tokens,
+                    model_name=self.models[self.model_code[index]],
+                    message=f"[Fleet] {strategy.name} 策略投標",
+                ))
+        return submitted
@@ -3,13 +3,32 @@ AI Agent 任務競標市場 (Hub Market)
 核心邏輯：純算法规則，無外部依賴
 功能：發布任務、接收投標、自動媒合、結算
 """
+import time
 import uuid
-from typing import Dict, List, Optional
+from collections import deque
+from itertools import islice
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from loguru import logger
 from enum import Enum
 
+import numpy as np
+
+from .allocation import AllocationResult, auction_assign
+from .bid_rules import BidRuleEngine, StandingBidRule
+from .instrumentation import instrumentation
+from .lifecycle import MILESTONE_FIELDS, phase_duration
+from .log_config import bid_sampler
+from .matching import MatchingEngine, SolverInterest
+from .streaming_stats import DOMAIN_QUANTILES, StreamingStats
+from .strategies import MarketState, MarketStateBatch
+from .timeseries import MarketTimeSeries
+
+# 選標分數 = 出價 - 領域加分 - 信任加分 (越低越好)；_score_bid 與回測 (backtest) 共用
+TRUST_BONUS = {"simulated": 0.0, "standard": 0.1, "external": 0.05, "verified": 0.2}
+DOMAIN_BONUS = 0.25
+
 class TaskStatus(Enum):
     OPEN = "open"
     IN_PROGRESS = "in_progress"
@@ -29,12 +48,16 @@ class Task:
     expected_tokens: int
     routing_mode: str = "internal"
     required_domain: Optional[str] = None
+    required_tools: List[str] = field(default_factory=list)
     status: TaskStatus = TaskStatus.OPEN
     assigned_to: Optional[str] = None
     selection_reason: Optional[str] = None
     result: Optional[str] = None
+    first_bid_at: Optional[datetime] = None
+    assigned_at: Optional[datetime] = None
     submitted_at: Optional[datetime] = None
     verified_at: Optional[datetime] = None
+    settled_at: Optional[datetime] = None
     verification_status: Optional[str] = None
     verification_notes: Optional[str] = None
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
@@ -54,21 +77,123 @@ class Bid:
     tools: List[str] = field(default_factory=list)
     trust_level: str = "standard"
 
+@dataclass
+class AllocationProblem:
+    """
+    批次選商的投標圖快照 (HubMarket.prepare_allocation)
+    solve() 只使用陣列、不讀取市場狀態，可在背景執行緒執行
+    """
+    tasks: List[Task]
+    bids: List[Bid]  # edge 索引 -> 投標
+    edge_task: np.ndarray
+    edge_solver: np.ndarray
+    scores: np.ndarray
+    capacities: np.ndarray
+
+    def solve(self, epsilon: float = 1e-2) -> AllocationResult:
+        return auction_assign(self.edge_task, self.edge_solver, self.scores, len(self.tasks), self.capacities,
+                              epsilon=epsilon)
+
+class MarketCounters:
+    """
+    增量維護的市場計數：任務狀態 / 領域 / 路由模式、各信任等級的投標與得標
+    Prometheus collector 與健康檢查以 O(1) 讀取，不再於 scrape 時掃描全部任務
+    (狀態變更需經 HubMarket._set_status 才會同步)
+    """
+    def __init__(self):
+        self.tasks: Dict[tuple, int] = {}  # (status, domain, routing_mode) -> 數量
+        self.status_totals: Dict[TaskStatus, int] = {status: 0 for status in TaskStatus}
+        self.total_bids = 0
+        self.bids_by_trust: Dict[str, int] = {}
+        self.wins_by_trust: Dict[str, int] = {}
+        self.winning_cost_by_trust: Dict[str, float] = {}
+        self.winning_sum = 0.0
+        self.winning_count = 0
+        self._winners: Dict[str, Bid] = {}  # task_id -> 目前得標投標
+
+    @staticmethod
+    def _task_key(task: Task, status: TaskStatus) -> tuple:
+        return (status.value, task.required_domain or "none", task.routing_mode)
+
+    def _add_task(self, task: Task, status: TaskStatus, delta: int):
+        key = self._task_key(task, status)
+        self.tasks[key] = self.tasks.get(key, 0) + delta
+        self.status_totals[status] += delta
+
+    def task_added(self, task: Task):
+        self._add_task(task, task.status, 1)
+
+    def status_changed(self, task: Task, old_status: TaskStatus):
+        self._add_task(task, old_status, -1)
+        self._add_task(task, task.status, 1)
+
+    def bid_added(self, bid: Bid):
+        self.total_bids += 1
+        self.bids_by_trust[bid.trust_level] = self.bids_by_trust.get(bid.trust_level, 0) + 1
+
+    def winner_selected(self, task: Task, bid: Bid):
+        previous = self._winners.get(task.task_id)
+        if previous is not None:
+            self.winning_sum -= previous.bid_price
+            self.winning_count -= 1
+        self._winners[task.task_id] = bid
+        self.winning_sum += bid.bid_price
+        self.winning_count += 1
+        self.wins_by_trust[bid.trust_level] = self.wins_by_trust.get(bid.trust_level, 0) + 1
+        self.winning_cost_by_trust[bid.trust_level] = (
+            self.winning_cost_by_trust.get(bid.trust_level, 0.0) + bid.bid_price
+        )
+
+    @property
+    def open_tasks(self) -> int:
+        return self.status_totals[TaskStatus.OPEN]
+
+    @property
+    def avg_winning_bid(self) -> float:
+        return self.winning_sum / self.winning_count if self.winning_count else 0.0
+
+
 class HubMarket:
     """任務競標市場"""
-    def __init__(self):
+    def __init__(self, recent_capacity: int = 64, clock: Callable[[], float] = time.time, seed: int = 0):
+        # 時間來源 (epoch 秒)；離散事件模擬注入虛擬時鐘，任務時間戳、過期與 rollup 皆以此為準
+        self.clock = clock
         self.tasks: Dict[str, Task] = {}
         self.bids: Dict[str, List[Bid]] = {}
+        # 每次市場狀態變更遞增，供快照推播與回應快取判斷是否需要重建
+        self.version = 0
+        # 最近活動環形緩衝：儀表板 / 輪詢接口只需最近 N 筆，與市場規模無關
+        self.recent_tasks: Deque[Task] = deque(maxlen=recent_capacity)
+        self.recent_bids: Deque[Bid] = deque(maxlen=recent_capacity)
+        self.recent_assignments: Deque[Bid] = deque(maxlen=recent_capacity)
+        self.recent_verifications: Deque[Task] = deque(maxlen=recent_capacity)
+        self.counters = MarketCounters()
+        # 投標價格串流統計：每個任務 / 每個領域 (required_domain，未指定為 "none") 各一份，投標時 O(1) 更新
+        self.price_stats: Dict[str, StreamingStats] = {}
+        self.domain_price_stats: Dict[str, StreamingStats] = {}
+        # task_id -> (最佳選標分數, 投標)；submit_bid 時增量更新，select_winner 不必重新評分
+        self.best_bids: Dict[str, Tuple[float, Bid]] = {}
+        # 秒 / 分 / 時 rollup (bids、tasks、assignments、得標價、指派耗時)
+        self.timeseries = MarketTimeSeries(clock=clock)
+        # 推送式媒合：新任務依 solver 興趣索引推入收件匣
+        self.matching = MatchingEngine()
+        # 常駐投標規則：create_task 時向量化評估，符合者由 hub 直接代為投標 (random 策略的亂數由 seed 決定)
+        self.bid_rules = BidRuleEngine(np.random.default_rng(seed))
+        # 生命週期階段完成時呼叫 (task, phase, seconds)；由 API 層接上 Prometheus histogram
+        self.phase_observer: Optional[Callable[[Task, str, float], None]] = None
         logger.info("🏪 Hub Market 初始化完成 (純算法规則)")
 
+    @instrumentation.timed("market.create_task")
     def create_task(self, description: str, input_data: str, max_budget: float,
                     expected_tokens: int, requester_id: str = "buyer_001",
                     expires_in_hours: int = 24, routing_mode: str = "internal",
-                    required_domain: Optional[str] = None) -> Task:
+                    required_domain: Optional[str] = None,
+                    required_tools: Optional[List[str]] = None) -> Task:
         if not description or not description.strip():
             raise ValueError("Description cannot be empty")
         if max_budget <= 0:
             raise ValueError("Budget must be positive")
+        now = self.now()
         task = Task(
             task_id=str(uuid.uuid4())[:8],
             requester_id=requester_id,
@@ -78,13 +203,25 @@ class HubMarket:
             expected_tokens=expected_tokens,
             routing_mode=routing_mode,
             required_domain=required_domain,
-            expires_at=datetime.now(timezone.utc) + timedelta(hours=expires_in_hours)
+            required_tools=required_tools or [],
+            created_at=now,
+            expires_at=now + timedelta(hours=expires_in_hours)
         )
         self.tasks[task.task_id] = task
         self.bids[task.task_id] = []
-        logger.info(f"📢 [Broker] 新任務：{task.task_id} | 預算上限：{max_budget} units | 過期：{expires_in_hours}h")
+        self.price_stats[task.task_id] = StreamingStats()
+        self.recent_tasks.append(task)
+        self.counters.task_added(task)
+        self.timeseries.record("tasks")
+        self.matching.on_task_created(task)
+        self.version += 1
+        logger.info("📢 [Broker] 新任務：{task_id} | 預算上限：{max_budget} units | 過期：{expires_in_hours}h",
+                    event="task_created", task_id=task.task_id, max_budget=max_budget,
+                    expires_in_hours=expires_in_hours)
+        self._place_standing_bids(task)
         return task
 
+    @instrumentation.timed("market.submit_bid")
     def submit_bid(self, task_id: str, bidder_id: str, bid_price: float,
                    estimated_tokens: int, model_name: str, message: str = "",
                    domains: Optional[List[str]] = None, tools: Optional[List[str]] = None,
@@ -104,15 +241,137 @@ class HubMarket:
             trust_level=trust_level,
         )
         self.bids[task_id].append(bid)
-        logger.info(f"🧮 [Broker] 新提案：{bid.bid_id} by {bidder_id} @ {bid_price} cost units")
+        self.recent_bids.append(bid)
+        task = self.tasks[task_id]
+        self.price_stats[task_id].add(bid_price)
+        score = self._score_bid(task, bid)[0]
+        best = self.best_bids.get(task_id)
+        if best is None or score < best[0]:
+            self.best_bids[task_id] = (score, bid)
+        self._domain_stats(task.required_domain).add(bid_price)
+        if task.first_bid_at is None:
+            self._mark_milestone(task, "first_bid")
+        self.counters.bid_added(bid)
+        self.timeseries.record("bids")
+        self.version += 1
+        if bid_sampler.should_log():
+            logger.info("🧮 [Broker] 新提案：{bid_id} by {bidder_id} @ {bid_price} cost units",
+                        event="bid_submitted", bid_id=bid.bid_id, task_id=task_id,
+                        bidder_id=bidder_id, bid_price=bid_price)
         return bid
 
+    def _set_status(self, task: Task, status: TaskStatus):
+        """變更任務狀態並同步增量計數"""
+        old_status = task.status
+        if old_status is status:
+            return
+        task.status = status
+        self.counters.status_changed(task, old_status)
+        if status is TaskStatus.IN_PROGRESS:
+            self.bid_rules.assignment_started(task.assigned_to)
+        elif old_status is TaskStatus.IN_PROGRESS:
+            self.bid_rules.assignment_finished(task.assigned_to)
+
+    def register_bid_rule(self, rule: StandingBidRule) -> StandingBidRule:
+        """登記常駐投標規則 (每個 solver 一條，重複登記即更新)"""
+        return self.bid_rules.register(rule)
+
+    def _place_standing_bids(self, task: Task) -> List[Bid]:
+        """新任務建立後，一次評估所有常駐規則並直接寫入投標"""
+        if not len(self.bid_rules):
+            return []
+        with instrumentation.span("market.standing_bids"):
+            return [
+                self.submit_bid(
+                    task_id=task.task_id,
+                    bidder_id=rule.solver_id,
+                    bid_price=round(price, 6),
+                    estimated_tokens=task.expected_tokens,
+                    model_name=rule.model_name,
+                    message=f"[Rule] {rule.strategy} 常駐規則投標",
+                    domains=sorted(rule.domains),
+                    trust_level=rule.trust_level,
+                )
+                for rule, price in self.bid_rules.evaluate(task)
+            ]
+
+    def register_solver(self, interest: SolverInterest, callback=None) -> SolverInterest:
+        """登記 solver 興趣；目前仍開放且符合條件的任務會補進其收件匣"""
+        open_tasks = (t for t in self.tasks.values() if t.status == TaskStatus.OPEN)
+        return self.matching.register(interest, callback=callback, backfill=open_tasks)
+
+    def pull_matched_tasks(self, solver_id: str, max_items: Optional[int] = None) -> List[Task]:
+        """取出推送給 solver 的任務，已非開放狀態的任務略過"""
+        return self.matching.pull(solver_id, max_items, still_open=lambda t: t.status == TaskStatus.OPEN)
+
+    def _domain_stats(self, domain: Optional[str]) -> StreamingStats:
+        key = domain or "none"
+        stats = self.domain_price_stats.get(key)
+        if stats is None:
+            stats = self.domain_price_stats[key] = StreamingStats(DOMAIN_QUANTILES)
+        return stats
+
+    def get_market_state(self, task_id: str, task_complexity: float = 0.5) -> MarketState:
+        """由串流統計建立 MarketState，O(1)，不走訪投標清單"""
+        stats = self.price_stats.get(task_id)
+        if stats is None or not stats.count:
+            return MarketState(avg_price=0, min_price=0, max_price=0, total_bids=0,
+                               task_complexity=task_complexity)
+        return MarketState(
+            avg_price=stats.mean,
+            min_price=stats.min,
+            max_price=stats.max,
+            total_bids=stats.count,
+            task_complexity=task_complexity,
+            total_price=stats.total,
+            best_score=self.best_bids[task_id][0] if task_id in self.best_bids else None,
+            price_stddev=stats.stddev,
+            p25_price=stats.quantile(0.25),
+            median_price=stats.quantile(0.5),
+            p75_price=stats.quantile(0.75),
+        )
+
+    def get_market_states(self, task_ids: List[str], task_complexity: float = 0.5) -> MarketStateBatch:
+        """多個任務的市場狀態 (批次出價用)，欄位直接取自串流統計"""
+        stats = [self.price_stats.get(task_id) for task_id in task_ids]
+        counts = np.array([s.count if s else 0 for s in stats], dtype=np.int64)
+        has_bids = counts > 0
+        return MarketStateBatch(
+            avg_price=np.array([s.mean if s else 0.0 for s in stats], dtype=float),
+            min_price=np.where(has_bids, [s.min if s else 0.0 for s in stats], 0.0),
+            max_price=np.where(has_bids, [s.max if s else 0.0 for s in stats], 0.0),
+            total_bids=counts,
+            task_complexity=np.full(len(stats), task_complexity),
+        )
+
+    def get_price_distributions(self) -> Dict[str, Dict]:
+        """各領域投標價格分布 (count / mean / stddev / min / max / 分位數)"""
+        return {domain: stats.to_dict() for domain, stats in sorted(self.domain_price_stats.items())}
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), timezone.utc)
+
+    def _mark_milestone(self, task: Task, phase: str):
+        """記錄生命週期里程碑時間，並回報該階段耗時"""
+        setattr(task, MILESTONE_FIELDS[phase], self.now())
+        if self.phase_observer is not None:
+            self.phase_observer(task, phase, phase_duration(task, phase))
+
+    def mark_settled(self, task_id: str):
+        """託管放款完成後呼叫，記錄 settled 里程碑"""
+        if task_id not in self.tasks:
+            raise ValueError("Task not found")
+        task = self.tasks[task_id]
+        self._mark_milestone(task, "settled")
+        self.version += 1
+        logger.info("💸 [Market] 任務 {task_id} 已結算", event="task_settled", task_id=task_id)
+
     def _score_bid(self, task: Task, bid: Bid) -> tuple[float, str]:
-        trust_bonus = {"simulated": 0.0, "standard": 0.1, "external": 0.05, "verified": 0.2}.get(bid.trust_level, 0.0)
+        trust_bonus = TRUST_BONUS.get(bid.trust_level, 0.0)
         domain_bonus = 0.0
         reason_bits = []
         if task.required_domain and task.required_domain in (bid.domains or []):
-            domain_bonus = 0.25
+            domain_bonus = DOMAIN_BONUS
             reason_bits.append(f"matched required domain '{task.required_domain}'")
         if bid.trust_level:
             reason_bits.append(f"trust={bid.trust_level}")
@@ -121,48 +380,170 @@ class HubMarket:
             reason_bits.append("cost-first selection")
         return score, ", ".join(reason_bits)
 
+    @instrumentation.timed("market.select_winner")
     def select_winner(self, task_id: str) -> Optional[Bid]:
         if task_id not in self.bids or not self.bids[task_id]:
             return None
         task = self.tasks[task_id]
         valid_bids = [b for b in self.bids[task_id] if b.bid_price <= task.max_budget]
         if not valid_bids:
-            logger.warning(f"⚠️ 無有效提案 (預算上限：{task.max_budget})")
+            logger.warning("⚠️ 無有效提案 (預算上限：{max_budget})",
+                           event="no_valid_bids", task_id=task_id, max_budget=task.max_budget)
             return None
-        scored_bids = [(b, *self._score_bid(task, b)) for b in valid_bids]
-        winner, winner_score, winner_reason = min(scored_bids, key=lambda item: item[1])
+        best = self.best_bids.get(task_id)
+        if best is not None and best[1].bid_price <= task.max_budget:
+            winner = best[1]
+            winner_score, winner_reason = self._score_bid(task, winner)
+        else:
+            # 最佳分數的投標超出預算時才重新評分所有有效投標
+            with instrumentation.span("market.score_bids"):
+                scored_bids = [(b, *self._score_bid(task, b)) for b in valid_bids]
+                winner, winner_score, winner_reason = min(scored_bids, key=lambda item: item[1])
+        return self._assign_winner(task, winner, winner_score, winner_reason)
+
+    def _assign_winner(self, task: Task, winner: Bid, winner_score: float, winner_reason: str) -> Bid:
+        previous = task.assigned_to if task.status is TaskStatus.IN_PROGRESS else None
         task.assigned_to = winner.bidder_id
-        task.status = TaskStatus.IN_PROGRESS
+        if previous is not None and previous != winner.bidder_id:
+            # 進行中的任務重新選商：狀態不變 (_set_status 不會處理)，容量由原得標者轉給新得標者
+            self.bid_rules.assignment_finished(previous)
+            self.bid_rules.assignment_started(winner.bidder_id)
+        self._set_status(task, TaskStatus.IN_PROGRESS)
+        self._mark_milestone(task, "assigned")
+        self.recent_assignments.append(winner)
+        self.counters.winner_selected(task, winner)
+        now = self.timeseries.clock()
+        self.timeseries.record("assignments", now=now)
+        self.timeseries.record("winning_cost", winner.bid_price, now=now)
+        self.timeseries.record("time_to_assign", (task.assigned_at - task.created_at).total_seconds(), now=now)
+        self.version += 1
         task.selection_reason = (
             f"Selected {winner.bidder_id} with estimated cost {winner.bid_price}; "
             f"decision factors: {winner_reason}; final score={winner_score:.3f}"
         )
-        logger.info(f"🏆 [Broker] 任務 {task_id} 指派給 {winner.bidder_id} @ estimated cost {winner.bid_price}")
+        logger.info("🏆 [Broker] 任務 {task_id} 指派給 {bidder_id} @ estimated cost {bid_price}",
+                    event="winner_selected", task_id=task.task_id, bidder_id=winner.bidder_id,
+                    bid_price=winner.bid_price)
         return winner
 
+    @instrumentation.timed("market.allocate_open_tasks")
+    def allocate_open_tasks(self, task_ids: Optional[List[str]] = None,
+                            capacities: Optional[Dict[str, int]] = None,
+                            default_capacity: Optional[int] = None,
+                            epsilon: float = 1e-2) -> Dict[str, Optional[Bid]]:
+        """
+        容量限制的批次選商：一次為多個開放任務求最小總選標分數的指派 (見 allocation.auction_assign)
+        優先讓最多任務得標，每個 solver 得標數不超過其容量；參數見 prepare_allocation
+        回傳 {task_id: 得標投標}，未得標的任務為 None 並維持 OPEN
+        """
+        problem = self.prepare_allocation(task_ids, capacities, default_capacity)
+        return self.apply_allocation(problem, problem.solve(epsilon))
+
+    def prepare_allocation(self, task_ids: Optional[List[str]] = None,
+                           capacities: Optional[Dict[str, int]] = None,
+                           default_capacity: Optional[int] = None) -> AllocationProblem:
+        """
+        取出批次選商的投標圖 (未指定 task_ids 時為所有開放任務)
+        capacities: solver_id -> 本批可再接的任務數；未列出者取常駐規則的 capacity 扣掉進行中任務數，
+        再其次為 default_capacity (None 為不限)
+        """
+        if task_ids is None:
+            tasks = [t for t in self.tasks.values() if t.status is TaskStatus.OPEN]
+        else:
+            missing = [task_id for task_id in task_ids if task_id not in self.tasks]
+            if missing:
+                raise ValueError(f"Task not found: {missing}")
+            tasks = [self.tasks[task_id] for task_id in dict.fromkeys(task_ids)
+                     if self.tasks[task_id].status is TaskStatus.OPEN]
+        capacities = capacities or {}
+        if any(c < 0 for c in capacities.values()) or (default_capacity is not None and default_capacity < 0):
+            raise ValueError("capacities must be non-negative")
+
+        bids: List[Bid] = []
+        edge_task: List[int] = []
+        edge_solver: List[int] = []
+        solver_index: Dict[str, int] = {}
+        for t, task in enumerate(tasks):
+            for bid in self.bids.get(task.task_id, ()):
+                if bid.bid_price <= task.max_budget:
+                    bids.append(bid)
+                    edge_task.append(t)
+                    edge_solver.append(solver_index.setdefault(bid.bidder_id, len(solver_index)))
+
+        solver_caps = []
+        for solver_id in solver_index:
+            cap = capacities.get(solver_id)
+            if cap is None:
+                cap = self.bid_rules.remaining_capacity(solver_id)
+            if cap is None:
+                cap = default_capacity if default_capacity is not None else len(tasks)
+            solver_caps.append(cap)
+
+        # 選標分數同 _score_bid，以向量運算計算
+        domain_match = [bool(tasks[t].required_domain) and tasks[t].required_domain in (bid.domains or [])
+                        for bid, t in zip(bids, edge_task)]
+        scores = (np.array([bid.bid_price for bid in bids], dtype=float)
+                  - DOMAIN_BONUS * np.array(domain_match, dtype=float)
+                  - np.array([TRUST_BONUS.get(bid.trust_level, 0.0) for bid in bids], dtype=float))
+        return AllocationProblem(tasks, bids, np.array(edge_task, dtype=np.int64),
+                                 np.array(edge_solver, dtype=np.int64), scores,
+                                 np.array(solver_caps, dtype=np.int64))
+
+    def apply_allocation(self, problem: AllocationProblem, result: AllocationResult) -> Dict[str, Optional[Bid]]:
+        """
+        寫回 solve() 的指派；求解期間已不再是 OPEN 的任務 (例如被 select_winner 指派) 略過並回傳 None，
+        solver 的容量也在寫回時重新檢查 (本批容量與常駐規則目前的剩餘容量)，求解期間被用掉時同樣略過
+        """
+        winners: Dict[str, Optional[Bid]] = {}
+        used = np.zeros(len(problem.capacities), dtype=np.int64)
+        for task, edge in zip(problem.tasks, result.assignment.tolist()):
+            if edge < 0 or task.status is not TaskStatus.OPEN:
+                winners[task.task_id] = None
+                continue
+            winner = problem.bids[edge]
+            solver = problem.edge_solver[edge]
+            remaining = self.bid_rules.remaining_capacity(winner.bidder_id)
+            if used[solver] >= problem.capacities[solver] or remaining == 0:
+                winners[task.task_id] = None
+                continue
+            used[solver] += 1
+            _, reason = self._score_bid(task, winner)
+            winners[task.task_id] = self._assign_winner(
+                task, winner, float(problem.scores[edge]), f"{reason}, capacity-constrained batch allocation")
+        assigned = sum(winner is not None for winner in winners.values())
+        logger.info("📦 [Broker] 批次選商：{assigned}/{total} 個任務得標 ({seconds:.3f}s)",
+                    event="batch_allocation", assigned=assigned, total=len(problem.tasks),
+                    seconds=result.seconds)
+        return winners
+
+    @instrumentation.timed("market.submit_result")
     def submit_result(self, task_id: str, result: str):
         if task_id not in self.tasks:
             raise ValueError("Task not found")
         task = self.tasks[task_id]
         task.result = result
-        task.status = TaskStatus.SUBMITTED
-        task.submitted_at = datetime.now(timezone.utc)
-        logger.info(f"📨 [Market] 任務 {task_id} 已提交結果")
+        self._set_status(task, TaskStatus.SUBMITTED)
+        self._mark_milestone(task, "submitted")
+        self.version += 1
+        logger.info("📨 [Market] 任務 {task_id} 已提交結果", event="result_submitted", task_id=task_id)
 
+    @instrumentation.timed("market.verify_result")
     def verify_result(self, task_id: str, approved: bool, notes: str = ""):
         if task_id not in self.tasks:
             raise ValueError("Task not found")
         task = self.tasks[task_id]
-        task.verified_at = datetime.now(timezone.utc)
+        self._mark_milestone(task, "verified")
         task.verification_notes = notes
+        self.recent_verifications.append(task)
+        self.version += 1
         if approved:
             task.verification_status = "approved"
-            task.status = TaskStatus.COMPLETED
-            logger.info(f"✅ [Market] 任務 {task_id} 驗證通過")
+            self._set_status(task, TaskStatus.COMPLETED)
+            logger.info("✅ [Market] 任務 {task_id} 驗證通過", event="result_verified", task_id=task_id, approved=True)
         else:
             task.verification_status = "rejected"
-            task.status = TaskStatus.FAILED
-            logger.info(f"❌ [Market] 任務 {task_id} 驗證失敗")
+            self._set_status(task, TaskStatus.FAILED)
+            logger.info("❌ [Market] 任務 {task_id} 驗證失敗", event="result_verified", task_id=task_id, approved=False)
 
         if task.assigned_to:
             from .reputation import reputation_system
@@ -180,19 +561,21 @@ class HubMarket:
             raise ValueError("Task not found")
         task = self.tasks[task_id]
         task.result = result
-        task.status = TaskStatus.COMPLETED
-        logger.info(f"✅ [Market] 任務 {task_id} 已完成")
+        self._set_status(task, TaskStatus.COMPLETED)
+        self.version += 1
+        logger.info("✅ [Market] 任務 {task_id} 已完成", event="task_completed", task_id=task_id)
 
     def expire_old_tasks(self):
         """自動過期超時任務"""
-        now = datetime.now(timezone.utc)
+        now = self.now()
         expired_count = 0
         for task in self.tasks.values():
             if task.status == TaskStatus.OPEN and task.expires_at and now > task.expires_at:
-                task.status = TaskStatus.FAILED
+                self._set_status(task, TaskStatus.FAILED)
                 expired_count += 1
         if expired_count > 0:
-            logger.info(f"🧹 [Market] 已過期 {expired_count} 個任務")
+            self.version += 1
+            logger.info("🧹 [Market] 已過期 {expired_count} 個任務", event="tasks_expired", expired_count=expired_count)
         return expired_count
 
     def get_task(self, task_id: str) -> Optional[Task]:
@@ -203,18 +586,32 @@ class HubMarket:
         """Return all bids submitted for a given task."""
         return self.bids.get(task_id, [])
 
-    def get_market_stats(self) -> Dict:
-        total_tasks = len(self.tasks)
-        total_bids = sum(len(b) for b in self.bids.values())
-        winning_bids = [b.bid_price for t in self.tasks.values() if t.assigned_to for b in self.bids.get(t.task_id, []) if b.bidder_id == t.assigned_to]
-        avg_winning_bid = sum(winning_bids) / len(winning_bids) if winning_bids else 0
+    @staticmethod
+    def _tail(buffer: Deque, n: int) -> list:
+        """環形緩衝最後 n 筆 (舊 → 新)，只走訪 n 個元素"""
+        return list(islice(reversed(buffer), max(0, n)))[::-1]
+
+    def get_recent_tasks(self, n: int = 5) -> List[Task]:
+        return self._tail(self.recent_tasks, n)
+
+    def get_recent_bids(self, n: int = 5) -> List[Bid]:
+        return self._tail(self.recent_bids, n)
 
+    def get_recent_assignments(self, n: int = 5) -> List[Bid]:
+        return self._tail(self.recent_assignments, n)
+
+    def get_recent_verifications(self, n: int = 5) -> List[Task]:
+        return self._tail(self.recent_verifications, n)
+
+    def get_market_stats(self) -> Dict:
+        """由增量計數讀取，與任務 / 投標數量無關"""
+        counters = self.counters
         return {
-            "total_tasks": total_tasks,
-            "total_bids": total_bids,
-            "avg_winning_bid": avg_winning_bid,
-            "active_tasks": len([t for t in self.tasks.values() if t.status == TaskStatus.OPEN]),
-            "expired_tasks": len([t for t in self.tasks.values() if t.status == TaskStatus.FAILED])
+            "total_tasks": len(self.tasks),
+            "total_bids": counters.total_bids,
+            "avg_winning_bid": counters.avg_winning_bid,
+            "active_tasks": counters.open_tasks,
+            "expired_tasks": counters.status_totals[TaskStatus.FAILED],
         }
 
 market = HubMarket()
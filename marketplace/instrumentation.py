@@ -0,0 +1,159 @@
+"""
+熱路徑延遲量測 (Instrumentation)
+以 perf_counter_ns 記錄各操作的延遲直方圖與次數，純 Python 實作、不依賴 prometheus_client，
+由 metrics.InstrumentationCollector 在 scrape 時轉成 Prometheus histogram
+
+停用時 timed() 包裝只多一次屬性判斷；span() 回傳共用的空 context manager
+環境變數 MARKET_INSTRUMENTATION=0 可在啟動時關閉
+"""
+import asyncio
+import os
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+# 直方圖桶上界 (奈秒)：1µs ~ 1s，約每個數量級 3 個桶
+DEFAULT_BUCKETS_NS: Tuple[int, ...] = (
+    1_000, 2_500, 5_000,
+    10_000, 25_000, 50_000,
+    100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000,
+    10_000_000, 25_000_000, 50_000_000,
+    100_000_000, 250_000_000, 1_000_000_000,
+)
+
+
+class LatencyHistogram:
+    """單一操作的固定桶直方圖 (counts 最後一格為 +Inf)"""
+    __slots__ = ("bounds", "counts", "count", "total_ns", "max_ns")
+
+    def __init__(self, bounds: Tuple[int, ...] = DEFAULT_BUCKETS_NS):
+        self.bounds = bounds
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def observe(self, elapsed_ns: int):
+        self.counts[bisect_left(self.bounds, elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def quantile(self, q: float) -> float:
+        """以桶上界估計分位數 (奈秒)，落在 +Inf 桶時回傳觀測最大值"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return float(self.bounds[i]) if i < len(self.bounds) else float(self.max_ns)
+        return float(self.max_ns)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1000 if self.count else 0.0,
+            "p50_us": self.quantile(0.5) / 1000,
+            "p99_us": self.quantile(0.99) / 1000,
+            "max_us": self.max_ns / 1000,
+        }
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter_ns() - self.start)
+        return False
+
+
+class Instrumentation:
+    """操作名稱 -> LatencyHistogram 的登錄表，可於執行期開關"""
+
+    def __init__(self, enabled: bool = True, bounds: Tuple[int, ...] = DEFAULT_BUCKETS_NS):
+        self.enabled = enabled
+        self.bounds = bounds
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def histogram(self, operation: str) -> LatencyHistogram:
+        histogram = self.histograms.get(operation)
+        if histogram is None:
+            histogram = self.histograms[operation] = LatencyHistogram(self.bounds)
+        return histogram
+
+    def observe(self, operation: str, elapsed_ns: int):
+        if self.enabled:
+            self.histogram(operation).observe(elapsed_ns)
+
+    def span(self, operation: str):
+        """量測一段程式區塊：with instrumentation.span("market.score_bids"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.histogram(operation))
+
+    def timed(self, operation: str):
+        """量測函式 (同步或 async) 的執行時間，例外也會記錄"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    start = perf_counter_ns()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.histogram(operation).observe(perf_counter_ns() - start)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.histogram(operation).observe(perf_counter_ns() - start)
+            return wrapper
+        return decorator
+
+    def summary(self, operation: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        names = [operation] if operation else sorted(self.histograms)
+        return {name: self.histograms[name].summary() for name in names if name in self.histograms}
+
+    def reset(self):
+        self.histograms.clear()
+
+
+def _env_enabled() -> bool:
+    return os.getenv("MARKET_INSTRUMENTATION", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+# 全域量測實例 (HubMarket / realtime / api 共用)
+instrumentation = Instrumentation(enabled=_env_enabled())
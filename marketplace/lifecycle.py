@@ -0,0 +1,70 @@
+"""
+任務生命週期追蹤 (Lifecycle tracing)
+里程碑：posted → first_bid → assigned → submitted → verified → settled
+每個階段以「到達該里程碑」命名，起點為前一個已發生的里程碑 (略過的階段不影響後續計算)
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# (階段名稱, Task 時間欄位)；第一個為起點
+MILESTONES: Tuple[Tuple[str, str], ...] = (
+    ("posted", "created_at"),
+    ("first_bid", "first_bid_at"),
+    ("assigned", "assigned_at"),
+    ("submitted", "submitted_at"),
+    ("verified", "verified_at"),
+    ("settled", "settled_at"),
+)
+PHASES: Tuple[str, ...] = tuple(name for name, _ in MILESTONES[1:])
+MILESTONE_FIELDS: Dict[str, str] = dict(MILESTONES)
+_MILESTONE_INDEX = {name: i for i, (name, _) in enumerate(MILESTONES)}
+
+
+def _phase_start(task, index: int) -> Optional[datetime]:
+    for _, attr in reversed(MILESTONES[:index]):
+        at = getattr(task, attr, None)
+        if at is not None:
+            return at
+    return None
+
+
+def phase_duration(task, phase: str) -> Optional[float]:
+    """階段耗時 (秒)；里程碑尚未發生時為 None"""
+    index = _MILESTONE_INDEX[phase]
+    end = getattr(task, MILESTONES[index][1], None)
+    start = _phase_start(task, index)
+    if end is None or start is None:
+        return None
+    return max(0.0, (end - start).total_seconds())
+
+
+def task_timeline(task) -> Dict[str, Any]:
+    """/tasks/{id}/timeline 回應：里程碑時間、各階段耗時與耗時最長的階段"""
+    events = [
+        {"event": name, "at": getattr(task, attr).isoformat() if getattr(task, attr, None) else None}
+        for name, attr in MILESTONES
+    ]
+    phases: List[Dict[str, Any]] = []
+    for phase in PHASES:
+        index = _MILESTONE_INDEX[phase]
+        start = _phase_start(task, index)
+        end = getattr(task, MILESTONES[index][1], None)
+        phases.append({
+            "phase": phase,
+            "start": start.isoformat() if start and end else None,
+            "end": end.isoformat() if end else None,
+            "duration_seconds": phase_duration(task, phase),
+        })
+    completed = [p for p in phases if p["duration_seconds"] is not None]
+    last = max((getattr(task, attr) for _, attr in MILESTONES if getattr(task, attr, None)), default=None)
+    return {
+        "task_id": task.task_id,
+        "status": task.status.value,
+        "routing_mode": task.routing_mode,
+        "required_domain": task.required_domain,
+        "assigned_to": task.assigned_to,
+        "events": events,
+        "phases": phases,
+        "elapsed_seconds": (last - task.created_at).total_seconds() if last else 0.0,
+        "dominant_phase": max(completed, key=lambda p: p["duration_seconds"])["phase"] if completed else None,
+    }
@@ -0,0 +1,196 @@
+"""
+市場日誌子系統 (Logging)
+延遲格式化、模組分級、高頻事件取樣、背景佇列輸出與 JSON 結構化日誌
+
+環境變數:
+- LOG_LEVEL: 全域最低等級 (預設 INFO)
+- LOG_MODULE_LEVELS: 模組分級，如 "marketplace.reputation=WARNING,marketplace.hub_market=OFF"
+- LOG_JSON: "1" 時輸出 JSON (每行一筆 record，含 extra 結構化欄位)
+- LOG_ENQUEUE: "1" 時由背景執行緒寫出，請求執行緒只負責入列 (預設開啟，見 BackgroundSink)
+- LOG_BID_SAMPLE_EVERY: 投標日誌取樣，每 N 筆輸出 1 筆；0 表示完全略過
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+OFF = "OFF"
+
+# configure_logging 最後套用的模組啟用狀態 [(module, enabled)]，quiet_logging 結束時依序重新套用
+_activation: List[Tuple[str, bool]] = [("marketplace", True)]
+_quiet_depth = 0
+_quiet_lock = threading.Lock()
+
+
+class LogSampler:
+    """高頻事件取樣器：每 N 次呼叫放行 1 次 (N=1 全部放行, N=0 全部略過)"""
+
+    def __init__(self, every: int = 1):
+        self.set_every(every)
+
+    def set_every(self, every: int):
+        self.every = max(0, int(every))
+        # itertools.count 的 next() 在 CPython 下為原子操作，不需額外加鎖
+        self._counter = itertools.count()
+
+    def should_log(self) -> bool:
+        if self.every == 1:
+            return True
+        if self.every == 0:
+            return False
+        return next(self._counter) % self.every == 0
+
+
+# 投標事件取樣器 (submit_bid 熱路徑使用)
+bid_sampler = LogSampler()
+
+
+class BackgroundSink:
+    """
+    背景寫出 sink：請求執行緒只做 deque.append，由 daemon 執行緒批次寫入 stream
+    (loguru 內建 enqueue 會 pickle 整筆 record，熱路徑成本反而更高)
+    佇列滿時丟棄最舊的訊息，避免寫出端落後時吃光記憶體
+    """
+
+    def __init__(self, stream, max_pending: int = 100_000, poll_interval: float = 0.05):
+        self.stream = stream
+        self.poll_interval = poll_interval
+        self._pending = deque(maxlen=max_pending)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._drain, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str):
+        self._pending.append(message)
+
+    def _flush_pending(self):
+        pending = self._pending
+        if not pending:
+            return
+        chunks = []
+        while pending:
+            try:
+                chunks.append(pending.popleft())
+            except IndexError:
+                break
+        self.stream.write("".join(chunks))
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def _drain(self):
+        while not self._stopped.is_set():
+            if self._pending:
+                self._flush_pending()
+            else:
+                time.sleep(self.poll_interval)
+        self._flush_pending()
+
+    def stop(self):
+        """由 logger.remove() 呼叫：寫完剩餘訊息後結束背景執行緒"""
+        self._stopped.set()
+        self._thread.join()
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def parse_module_levels(spec: str) -> Dict[str, str]:
+    """解析 "module=LEVEL,module2=LEVEL" 格式的模組分級設定"""
+    levels: Dict[str, str] = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        module, level = item.split("=", 1)
+        if module.strip() and level.strip():
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    module_levels: Optional[Dict[str, str]] = None,
+    json_output: Optional[bool] = None,
+    enqueue: Optional[bool] = None,
+    bid_sample_every: Optional[int] = None,
+    sink=None,
+) -> int:
+    """
+    重新設定 loguru handler，回傳 handler id
+    未指定的參數由環境變數補齊；level=OFF 時整個 marketplace 停用日誌
+    """
+    global _activation
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if module_levels is None:
+        module_levels = parse_module_levels(os.getenv("LOG_MODULE_LEVELS", ""))
+    if json_output is None:
+        json_output = _env_flag("LOG_JSON", False)
+    if enqueue is None:
+        enqueue = _env_flag("LOG_ENQUEUE", True)
+    if bid_sample_every is None:
+        bid_sample_every = int(os.getenv("LOG_BID_SAMPLE_EVERY", "1"))
+
+    bid_sampler.set_every(bid_sample_every)
+    logger.remove()
+
+    # 停用的模組在 loguru 取得 frame 後立即返回，不會建立 record 或格式化訊息
+    _activation = [("marketplace", level != OFF)]
+    _activation += [(module, module_level != OFF) for module, module_level in module_levels.items()]
+    with _quiet_lock:
+        if not _quiet_depth:
+            _apply_activation()
+
+    active_levels = [lvl for lvl in [level, *module_levels.values()] if lvl != OFF]
+    if not active_levels:
+        return -1
+    handler_level = min(logger.level(lvl).no for lvl in active_levels)
+    level_filter = {"": level if level != OFF else False}
+    level_filter.update({m: lvl for m, lvl in module_levels.items() if lvl != OFF})
+
+    stream = sink if sink is not None else sys.stderr
+    return logger.add(
+        BackgroundSink(stream) if enqueue else stream,
+        level=handler_level,
+        filter=level_filter,
+        serialize=json_output,
+        colorize=False if enqueue else None,
+    )
+
+
+def _apply_activation():
+    for module, enabled in _activation:
+        if enabled:
+            logger.enable(module)
+        else:
+            logger.disable(module)
+
+
+@contextmanager
+def quiet_logging(enabled: bool = True) -> Iterator[None]:
+    """
+    暫時停用 marketplace 日誌 (模擬器在目前行程內執行時使用)，可巢狀
+    離開最外層時還原 configure_logging 的 OFF / 模組分級設定，而不是無條件重新啟用
+    """
+    global _quiet_depth
+    if not enabled:
+        yield
+        return
+    with _quiet_lock:
+        _quiet_depth += 1
+        logger.disable("marketplace")
+    try:
+        yield
+    finally:
+        with _quiet_lock:
+            _quiet_depth -= 1
+            if not _quiet_depth:
+                _apply_activation()
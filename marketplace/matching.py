@@ -0,0 +1,160 @@
+"""
+推送式任務媒合 (Push-based matching)
+solver 登記興趣 (領域、預算下限、expected_tokens 上限、具備的工具)，
+任務建立時透過索引找出感興趣的 solver 並推入各自的收件匣，solver 不必掃描全部任務
+
+索引：
+- 領域：domain -> solver 集合；未指定領域的 solver 放在萬用集合
+- 工具：tool -> 具備該工具的 solver 集合 (任務所需工具取交集)
+- 預算下限：排序陣列 + bisect (tokens 上限於驗證候選時檢查)
+候選集合取最小者後逐一驗證其餘條件，成本與候選數成正比，而非 solver 總數 × 任務數
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+DEFAULT_INBOX_SIZE = 1000
+_MAX_ID = chr(0x10FFFF)  # 排序用哨兵：大於任何 solver id
+
+
+@dataclass
+class SolverInterest:
+    """solver 興趣；空集合 / None 表示不限"""
+    solver_id: str
+    domains: Set[str] = field(default_factory=set)
+    min_budget: float = 0.0
+    max_expected_tokens: Optional[int] = None
+    tools: Set[str] = field(default_factory=set)
+
+    def accepts(self, task) -> bool:
+        if self.domains and task.required_domain and task.required_domain not in self.domains:
+            return False
+        if task.max_budget < self.min_budget:
+            return False
+        if self.max_expected_tokens is not None and task.expected_tokens > self.max_expected_tokens:
+            return False
+        required_tools = getattr(task, "required_tools", None)
+        if required_tools and not self.tools.issuperset(required_tools):
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "solver_id": self.solver_id,
+            "domains": sorted(self.domains),
+            "min_budget": self.min_budget,
+            "max_expected_tokens": self.max_expected_tokens,
+            "tools": sorted(self.tools),
+        }
+
+
+class MatchingEngine:
+    """solver 興趣索引與收件匣"""
+
+    def __init__(self, inbox_size: int = DEFAULT_INBOX_SIZE):
+        self.inbox_size = inbox_size
+        self.interests: Dict[str, SolverInterest] = {}
+        self.inboxes: Dict[str, Deque] = {}
+        self.dropped: Dict[str, int] = {}
+        self.callbacks: Dict[str, Callable] = {}
+        self._by_domain: Dict[str, Set[str]] = {}
+        self._any_domain: Set[str] = set()
+        self._by_tool: Dict[str, Set[str]] = {}
+        self._budget_floors: List[tuple] = []  # (min_budget, solver_id)
+
+    # --- 登記 ---
+
+    def register(self, interest: SolverInterest, callback: Optional[Callable] = None,
+                 backfill: Iterable = ()) -> SolverInterest:
+        """
+        登記 (或更新) solver 興趣；callback(task) 在推送時同步呼叫
+        backfill: 登記前已存在、仍開放的任務，符合條件者一次性補進收件匣
+        """
+        if interest.solver_id in self.interests:
+            self.unregister(interest.solver_id, keep_inbox=True)
+        solver_id = interest.solver_id
+        self.interests[solver_id] = interest
+        self.inboxes.setdefault(solver_id, deque(maxlen=self.inbox_size))
+        self.dropped.setdefault(solver_id, 0)
+        if callback is not None:
+            self.callbacks[solver_id] = callback
+        if interest.domains:
+            for domain in interest.domains:
+                self._by_domain.setdefault(domain, set()).add(solver_id)
+        else:
+            self._any_domain.add(solver_id)
+        for tool in interest.tools:
+            self._by_tool.setdefault(tool, set()).add(solver_id)
+        insort(self._budget_floors, (interest.min_budget, solver_id))
+        for task in backfill:
+            if interest.accepts(task):
+                self._push(solver_id, task)
+        return interest
+
+    def unregister(self, solver_id: str, keep_inbox: bool = False) -> bool:
+        interest = self.interests.pop(solver_id, None)
+        if interest is None:
+            return False
+        for domain in interest.domains:
+            self._by_domain.get(domain, set()).discard(solver_id)
+        self._any_domain.discard(solver_id)
+        for tool in interest.tools:
+            self._by_tool.get(tool, set()).discard(solver_id)
+        entry = (interest.min_budget, solver_id)
+        index = bisect_left(self._budget_floors, entry)
+        if index < len(self._budget_floors) and self._budget_floors[index] == entry:
+            del self._budget_floors[index]
+        if not keep_inbox:
+            self.inboxes.pop(solver_id, None)
+            self.dropped.pop(solver_id, None)
+            self.callbacks.pop(solver_id, None)
+        return True
+
+    # --- 媒合 ---
+
+    def _candidates(self, task) -> Iterable[str]:
+        """由索引取出最小的候選集合 (仍需逐一驗證其餘條件)"""
+        options = []
+        if task.required_domain:
+            options.append(self._by_domain.get(task.required_domain, set()) | self._any_domain)
+        for tool in getattr(task, "required_tools", None) or ():
+            options.append(self._by_tool.get(tool, set()))
+        budget_count = bisect_right(self._budget_floors, (task.max_budget, _MAX_ID))
+        if not options or budget_count < min(len(o) for o in options):
+            return [solver_id for _, solver_id in self._budget_floors[:budget_count]]
+        return min(options, key=len)
+
+    def match(self, task) -> List[str]:
+        return sorted(s for s in self._candidates(task) if self.interests[s].accepts(task))
+
+    def on_task_created(self, task) -> List[str]:
+        """推送新任務給所有符合的 solver，回傳 solver id 清單"""
+        matched = self.match(task)
+        for solver_id in matched:
+            self._push(solver_id, task)
+        return matched
+
+    def _push(self, solver_id: str, task):
+        inbox = self.inboxes[solver_id]
+        if len(inbox) == inbox.maxlen:
+            self.dropped[solver_id] += 1
+        inbox.append(task)
+        callback = self.callbacks.get(solver_id)
+        if callback is not None:
+            callback(task)
+
+    def pull(self, solver_id: str, max_items: Optional[int] = None, still_open: Optional[Callable] = None) -> List:
+        """取出收件匣中的任務 (先進先出)；still_open(task) 為 False 的任務直接丟棄"""
+        inbox = self.inboxes.get(solver_id)
+        if inbox is None:
+            raise KeyError(solver_id)
+        tasks = []
+        while inbox and (max_items is None or len(tasks) < max_items):
+            task = inbox.popleft()
+            if still_open is None or still_open(task):
+                tasks.append(task)
+        return tasks
+
+    def pending(self, solver_id: str) -> int:
+        return len(self.inboxes.get(solver_id, ()))
@@ -0,0 +1,167 @@
+"""
+記憶體用量統計 (Memory accounting)
+- 常駐估算：各子系統抽樣少量物件計算深層大小，乘上物件數量；成本與市場規模無關
+- tracemalloc 快照：按需啟用，回報前 N 個配置位置與各模組的配置總量
+"""
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 每個子系統抽樣的物件數
+DEFAULT_SAMPLE_SIZE = 16
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    估算物件與其擁有的子物件總大小 (bytes)
+    dataclass / __dict__ 走訪欄位，容器走訪元素；Enum 與已計算過的物件不重複計入
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (Enum, type)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    if is_dataclass(obj):
+        return size + sum(deep_sizeof(getattr(obj, f.name), seen) for f in fields(obj))
+    if hasattr(obj, "__dict__"):
+        return size + deep_sizeof(vars(obj), seen)
+    return size
+
+
+def estimate_bytes(items: Iterable[Any], count: int, sample_size: int = DEFAULT_SAMPLE_SIZE) -> Tuple[int, float]:
+    """抽樣 sample_size 個物件求平均深層大小，回傳 (估計總 bytes, 每物件 bytes)"""
+    sample = list(islice(items, sample_size))
+    if not sample or count <= 0:
+        return 0, 0.0
+    per_object = sum(deep_sizeof(item) for item in sample) / len(sample)
+    return int(per_object * count), per_object
+
+
+class MemoryAccountant:
+    """
+    子系統註冊表：name -> (取得抽樣物件, 取得物件數)
+    物件數必須是 O(1) (len() 或增量計數)，抽樣只走訪前 sample_size 個
+    """
+
+    def __init__(self, sample_size: int = DEFAULT_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.subsystems: Dict[str, Tuple[Callable[[], Iterable[Any]], Callable[[], int]]] = {}
+
+    def register(self, name: str, items: Callable[[], Iterable[Any]], count: Callable[[], int]):
+        self.subsystems[name] = (items, count)
+
+    def estimates(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, (items, count) in self.subsystems.items():
+            objects = count()
+            total, per_object = estimate_bytes(items(), objects, self.sample_size)
+            result[name] = {
+                "objects": objects,
+                "bytes_per_object": round(per_object, 1),
+                "estimated_bytes": total,
+            }
+        return result
+
+
+def _queued_frames(manager) -> Iterable[str]:
+    for client in list(manager.clients.values()):
+        yield from list(client.queue._queue)
+
+
+def _ws_buffer_frames(manager) -> Iterable[Any]:
+    """WebSocket 緩衝：client 佇列中的 frame 與重播紀錄 (最新的在前，抽樣較具代表性)"""
+    yield from _queued_frames(manager)
+    yield from reversed(manager.replay_log)
+
+
+def register_market_subsystems(accountant: MemoryAccountant, market, reputation_system=None,
+                               solana_escrow=None, connection_manager=None) -> MemoryAccountant:
+    """登錄 Task / Bid / AgentReputation / EscrowAccount / WebSocket 緩衝"""
+    accountant.register("tasks", lambda: reversed(market.recent_tasks), lambda: len(market.tasks))
+    accountant.register("bids", lambda: reversed(market.recent_bids), lambda: market.counters.total_bids)
+    if reputation_system is not None:
+        accountant.register("reputation", lambda: reputation_system.reputations.values(),
+                            lambda: len(reputation_system.reputations))
+    if solana_escrow is not None:
+        accountant.register("escrow", lambda: solana_escrow.escrows.values(), lambda: len(solana_escrow.escrows))
+    if connection_manager is not None:
+        accountant.register(
+            "ws_buffers",
+            lambda: _ws_buffer_frames(connection_manager),
+            lambda: connection_manager.total_queue_depth() + len(connection_manager.replay_log),
+        )
+    return accountant
+
+
+class TracemallocBusyError(RuntimeError):
+    """同一時間只允許一個暫時啟用的 tracemalloc 時間窗"""
+
+
+# 時間窗期間持有；另一個請求在窗內 stop / take_snapshot 會讓這個窗提早結束或失敗
+_window_lock = threading.Lock()
+
+
+def tracemalloc_snapshot(top: int = 20, seconds: float = 0.0, package: str = "marketplace",
+                         frames: int = 1) -> Dict[str, Any]:
+    """
+    取得 tracemalloc 快照：前 top 個配置位置 (檔名:行號) 與 package 內各模組的配置量
+    若 tracemalloc 尚未啟用 (MEMORY_TRACEMALLOC=0)，暫時啟用 seconds 秒後停用，
+    此時只統計這段期間的新配置；已有時間窗進行中時拋出 TracemallocBusyError
+    """
+    if not _window_lock.acquire(blocking=False):
+        raise TracemallocBusyError("a tracemalloc window is already running")
+    started_here = not tracemalloc.is_tracing()
+    if not started_here:
+        _window_lock.release()
+    else:
+        tracemalloc.start(frames)
+        if seconds > 0:
+            time.sleep(seconds)
+    try:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+            _window_lock.release()
+
+    top_sites: List[Dict[str, Any]] = []
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        top_sites.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+        })
+
+    by_module: Dict[str, int] = {}
+    marker = f"/{package}/"
+    for stat in snapshot.statistics("filename"):
+        filename = stat.traceback[0].filename.replace("\\", "/")
+        if marker in filename:
+            module = package + "." + filename.rsplit(marker, 1)[1].removesuffix(".py").replace("/", ".")
+            by_module[module] = by_module.get(module, 0) + stat.size
+
+    return {
+        "mode": "window" if started_here else "continuous",
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top_sites": top_sites,
+        "by_module": dict(sorted(by_module.items(), key=lambda item: -item[1])),
+    }
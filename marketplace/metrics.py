@@ -2,9 +2,8 @@
 Prometheus 監控指標
 用於追蹤市場效能和健康狀態
 """
-from prometheus_client import Counter, Histogram, Gauge, Info
-from functools import wraps
-import time
+from prometheus_client import Counter, Histogram, Gauge, Info, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
 
 # 市場指標
 tasks_created = Counter(
@@ -24,43 +23,99 @@ bids_submitted = Counter(
     'Total number of bids submitted'
 )
 
-active_tasks = Gauge(
-    'market_active_tasks',
-    'Number of currently active tasks'
+# Solana 指標
+escrows_created = Counter(
+    'solana_escrows_created_total',
+    'Total number of escrows created'
 )
 
-avg_bid_price = Gauge(
-    'market_avg_bid_price',
-    'Average bid price in SOL'
+escrows_completed = Counter(
+    'solana_escrows_completed_total',
+    'Total number of escrows completed'
 )
 
-# 效能指標
-bid_processing_duration = Histogram(
-    'market_bid_processing_duration_seconds',
-    'Time spent processing bids',
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+# WebSocket 推播指標
+ws_connections = Gauge(
+    'ws_connections',
+    'Number of connected WebSocket clients'
 )
 
-task_creation_duration = Histogram(
-    'market_task_creation_duration_seconds',
-    'Time spent creating tasks',
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1]
+ws_queue_depth = Gauge(
+    'ws_queue_depth',
+    'Outbound frames waiting in WebSocket client queues',
+    ['stat']
 )
 
-# Solana 指標
-escrows_created = Counter(
-    'solana_escrows_created_total',
-    'Total number of escrows created'
+ws_frames_sent = Counter(
+    'ws_frames_sent_total',
+    'WebSocket frames written to clients'
 )
 
-escrows_completed = Counter(
-    'solana_escrows_completed_total',
-    'Total number of escrows completed'
+ws_frames_dropped = Counter(
+    'ws_frames_dropped_total',
+    'WebSocket frames dropped because a client queue was full',
+    ['policy']
+)
+
+ws_slow_clients = Counter(
+    'ws_slow_clients_total',
+    'Slow WebSocket clients handled by the overflow policy',
+    ['action']
+)
+
+# 回應快取指標
+response_cache_requests = Counter(
+    'response_cache_requests_total',
+    'Versioned response cache lookups',
+    ['endpoint', 'result']
+)
+
+response_cache_hit_ratio = Gauge(
+    'response_cache_hit_ratio',
+    'Hit ratio of the versioned response cache (hits incl. stale / lookups)',
+    ['endpoint']
+)
+
+# HTTP 與 event loop 指標
+http_request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route template, method and status',
+    ['method', 'route', 'status'],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+http_requests_in_flight = Gauge(
+    'http_requests_in_flight',
+    'HTTP requests currently being handled',
+    ['method']
+)
+
+event_loop_lag = Histogram(
+    'event_loop_lag_seconds',
+    'Scheduling delay of the asyncio event loop',
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
 )
 
-total_value_locked = Gauge(
-    'solana_total_value_locked_sol',
-    'Total value locked in escrows (SOL)'
+event_loop_stalls = Counter(
+    'event_loop_stalls_total',
+    'Event loop lag samples above the blocking threshold'
+)
+
+# 任務生命週期指標 (posted → first_bid → assigned → submitted → verified → settled)
+LIFECYCLE_BUCKETS = [0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 24 * 3600]
+
+task_phase_duration = Histogram(
+    'task_phase_duration_seconds',
+    'Time to reach each task lifecycle milestone from the previous one',
+    ['phase', 'routing_mode', 'domain'],
+    buckets=LIFECYCLE_BUCKETS
+)
+
+task_solver_phase_duration = Histogram(
+    'task_solver_phase_duration_seconds',
+    'Post-assignment lifecycle phase durations per assigned solver',
+    ['phase', 'solver'],
+    buckets=LIFECYCLE_BUCKETS
 )
 
 # 系統資訊
@@ -69,41 +124,134 @@ app_info = Info(
     'Application information'
 )
 
-def track_timing(metric):
-    """追蹤函數執行時間的裝飾器"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            start = time.time()
-            try:
-                return func(*args, **kwargs)
-            finally:
-                metric.observe(time.time() - start)
-        return wrapper
-    return decorator
-
-def update_market_metrics(market, solana_escrow):
-    """更新市場指標"""
-    from .hub_market import TaskStatus
-    
-    # 更新活躍任務數
-    active_count = len([t for t in market.tasks.values() if t.status == TaskStatus.OPEN])
-    active_tasks.set(active_count)
-    
-    # 更新平均投標價格
-    winning_bids = [
-        b.bid_price 
-        for t in market.tasks.values() 
-        if t.assigned_to 
-        for b in market.bids.get(t.task_id, []) 
-        if b.bidder_id == t.assigned_to
-    ]
-    if winning_bids:
-        avg_bid_price.set(sum(winning_bids) / len(winning_bids))
-    
-    # 更新 TVL
-    if solana_escrow:
-        total_value_locked.set(solana_escrow.total_value_locked)
+def observe_task_phase(task, phase: str, seconds):
+    """HubMarket.phase_observer：依路由模式 / 領域記錄，指派後的階段另依 solver 記錄"""
+    if seconds is None:
+        return
+    task_phase_duration.labels(
+        phase=phase, routing_mode=task.routing_mode, domain=task.required_domain or "none"
+    ).observe(seconds)
+    if task.assigned_to and phase != "assigned":
+        task_solver_phase_duration.labels(phase=phase, solver=task.assigned_to).observe(seconds)
+
+class MarketCollector:
+    """
+    市場指標 collector：scrape 時只讀取 HubMarket.counters 的增量計數，
+    成本與任務 / 投標數量無關，不阻塞 event loop
+    """
+    def __init__(self, market, solana_escrow=None):
+        self.market = market
+        self.solana_escrow = solana_escrow
+
+    def collect(self):
+        counters = self.market.counters
+
+        yield GaugeMetricFamily('market_active_tasks', 'Number of currently active tasks',
+                                value=counters.open_tasks)
+        yield GaugeMetricFamily('market_avg_bid_price', 'Average winning bid price',
+                                value=counters.avg_winning_bid)
+
+        tasks = GaugeMetricFamily('market_tasks', 'Tasks by status, required domain and routing mode',
+                                  labels=['status', 'domain', 'routing_mode'])
+        for (status, domain, routing_mode), count in list(counters.tasks.items()):
+            tasks.add_metric([status, domain, routing_mode], count)
+        yield tasks
+
+        bids = CounterMetricFamily('market_bids_by_trust', 'Bids submitted by trust level',
+                                   labels=['trust_level'])
+        for trust_level, count in list(counters.bids_by_trust.items()):
+            bids.add_metric([trust_level], count)
+        yield bids
+
+        wins = CounterMetricFamily('market_wins_by_trust', 'Winner selections by trust level',
+                                   labels=['trust_level'])
+        for trust_level, count in list(counters.wins_by_trust.items()):
+            wins.add_metric([trust_level], count)
+        yield wins
+
+        winning_cost = CounterMetricFamily('market_winning_cost_by_trust',
+                                           'Sum of winning bid prices by trust level',
+                                           labels=['trust_level'])
+        for trust_level, total in list(counters.winning_cost_by_trust.items()):
+            winning_cost.add_metric([trust_level], total)
+        yield winning_cost
+
+        if self.solana_escrow is not None:
+            yield GaugeMetricFamily('solana_total_value_locked_sol', 'Total value locked in escrows (SOL)',
+                                    value=self.solana_escrow.total_value_locked)
+
+
+def register_market_collector(market, solana_escrow=None, registry=REGISTRY) -> MarketCollector:
+    """註冊市場 collector (取代舊的 scrape 時全量掃描 update_market_metrics)"""
+    collector = MarketCollector(market, solana_escrow)
+    registry.register(collector)
+    return collector
+
+class InstrumentationCollector:
+    """把 instrumentation.Instrumentation 的延遲直方圖轉成 Prometheus histogram (單位：秒)"""
+    def __init__(self, instrumentation):
+        self.instrumentation = instrumentation
+
+    def collect(self):
+        family = HistogramMetricFamily('market_operation_duration_seconds',
+                                       'Latency of broker hot-path operations',
+                                       labels=['operation'])
+        calls = CounterMetricFamily('market_operation_calls', 'Instrumented operation calls',
+                                    labels=['operation'])
+        for operation, histogram in sorted(list(self.instrumentation.histograms.items())):
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                buckets.append((repr(bound / 1e9), cumulative))
+            buckets.append(('+Inf', histogram.count))
+            family.add_metric([operation], buckets, histogram.total_ns / 1e9)
+            calls.add_metric([operation], histogram.count)
+        yield family
+        yield calls
+
+
+def register_instrumentation_collector(instrumentation, registry=REGISTRY) -> InstrumentationCollector:
+    """註冊熱路徑延遲 collector"""
+    collector = InstrumentationCollector(instrumentation)
+    registry.register(collector)
+    return collector
+
+class MemoryCollector:
+    """子系統記憶體估算 (memory.MemoryAccountant)；tracemalloc 啟用時一併輸出追蹤量"""
+    def __init__(self, accountant):
+        self.accountant = accountant
+
+    def collect(self):
+        import tracemalloc
+
+        estimated = GaugeMetricFamily('memory_estimated_bytes', 'Estimated memory held per subsystem',
+                                      labels=['subsystem'])
+        objects = GaugeMetricFamily('memory_objects', 'Objects held per subsystem', labels=['subsystem'])
+        per_object = GaugeMetricFamily('memory_bytes_per_object', 'Sampled average size of one object',
+                                       labels=['subsystem'])
+        for subsystem, stats in self.accountant.estimates().items():
+            estimated.add_metric([subsystem], stats['estimated_bytes'])
+            objects.add_metric([subsystem], stats['objects'])
+            per_object.add_metric([subsystem], stats['bytes_per_object'])
+        yield estimated
+        yield objects
+        yield per_object
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            traced = GaugeMetricFamily('memory_tracemalloc_bytes', 'Memory traced by tracemalloc',
+                                       labels=['stat'])
+            traced.add_metric(['current'], current)
+            traced.add_metric(['peak'], peak)
+            yield traced
+
+
+def register_memory_collector(accountant, registry=REGISTRY) -> MemoryCollector:
+    """註冊子系統記憶體估算 collector"""
+    collector = MemoryCollector(accountant)
+    registry.register(collector)
+    return collector
 
 # 初始化應用資訊
 app_info.info({'version': '2.1.0', 'environment': 'production'})
@@ -0,0 +1,429 @@
+"""
+WebSocket 即時推播 (Realtime fan-out)
+每個連線一條有界佇列 + 專屬 writer task；broadcast 只負責編碼一次並 put_nowait，
+成本與客戶端速度無關，慢速客戶端依設定策略處理
+"""
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from fastapi import WebSocket
+from loguru import logger
+
+from .instrumentation import instrumentation
+from .metrics import ws_frames_sent, ws_frames_dropped, ws_slow_clients
+
+# 慢速客戶端策略：佇列滿時
+# - drop_oldest: 丟棄最舊的 frame，保留最新事件
+# - disconnect: 以 1013 (Try Again Later) 關閉連線
+# - downgrade: 清空佇列，之後只推送市場快照 (snapshot frame)，不再推送逐筆事件
+SLOW_CLIENT_POLICIES = ("drop_oldest", "disconnect", "downgrade")
+
+_CLOSE = object()  # writer 收到後關閉連線並結束
+
+
+class EventMeta(NamedTuple):
+    """事件路由資訊 (不送給客戶端，僅用於訂閱過濾)"""
+    event_type: str
+    task_id: Optional[str] = None
+    domain: Optional[str] = None
+    requester: Optional[str] = None
+    market_wide: bool = False  # 全市場事件 (快照) 不屬於任何任務，只依 event_types 過濾
+
+
+SNAPSHOT_META = EventMeta("market_update", market_wide=True)
+
+
+class PendingEvent(NamedTuple):
+    """合併視窗內等待送出的事件"""
+    seq: int
+    meta: EventMeta
+    text: str
+    payload: Dict[str, Any]
+
+
+@dataclass
+class Subscription:
+    """
+    客戶端訂閱條件
+    event_types 為 AND 條件；task_ids / domains / requesters 任一命中即可 (OR)，
+    三者皆空時不限制任務範圍
+    """
+    task_ids: Set[str] = field(default_factory=set)
+    domains: Set[str] = field(default_factory=set)
+    requesters: Set[str] = field(default_factory=set)
+    event_types: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_message(cls, message: Dict[str, Any]) -> "Subscription":
+        def as_set(key: str) -> Set[str]:
+            value = message.get(key) or []
+            if isinstance(value, str) or not isinstance(value, (list, tuple, set)):
+                raise ValueError(f"'{key}' must be a list of strings")
+            return {str(v) for v in value}
+
+        return cls(
+            task_ids=as_set("task_ids"),
+            domains=as_set("domains"),
+            requesters=as_set("requesters"),
+            event_types=as_set("event_types"),
+        )
+
+    def matches(self, meta: EventMeta) -> bool:
+        if self.event_types and meta.event_type not in self.event_types:
+            return False
+        if meta.market_wide or not (self.task_ids or self.domains or self.requesters):
+            return True
+        return (
+            meta.task_id in self.task_ids
+            or meta.domain in self.domains
+            or meta.requester in self.requesters
+        )
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {
+            "task_ids": sorted(self.task_ids),
+            "domains": sorted(self.domains),
+            "requesters": sorted(self.requesters),
+            "event_types": sorted(self.event_types),
+        }
+
+
+class ClientConnection:
+    """單一 WebSocket 客戶端：有界 outbound 佇列與 writer task"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.downgraded = False
+        self.closed = False
+        self.dropped = 0
+        self.subscription: Optional[Subscription] = None  # None = 接收全部事件
+        self.collapse = False  # 合併視窗內同一任務的提案摘要為 proposals_summary
+
+
+class ConnectionManager:
+    def __init__(self, max_queue: int = 100, slow_policy: str = "drop_oldest", replay_size: int = 1000,
+                 coalesce_ms: float = 0.0):
+        if slow_policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy: {slow_policy}")
+        self.max_queue = max_queue
+        self.slow_policy = slow_policy
+        # 以 id(websocket) 為鍵，disconnect 為 O(1)
+        self.clients: Dict[int, ClientConnection] = {}
+        # 事件序號與重播紀錄 (seq, meta, 已編碼 frame)，供斷線重連後續傳
+        self.last_seq = 0
+        self.delivered_seq = 0  # 已送出 (不在合併視窗內) 的最大序號
+        self.replay_log: deque = deque(maxlen=replay_size)
+        # 合併視窗：> 0 時事件先累積，視窗結束後每個客戶端只收一個 batch frame
+        self.coalesce_seconds = max(0.0, coalesce_ms) / 1000.0
+        self._pending: List[PendingEvent] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return [c.websocket for c in self.clients.values()]
+
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
+        await websocket.accept()
+        client = ClientConnection(websocket, self.max_queue)
+        client.writer_task = asyncio.create_task(self._writer(client))
+        self.clients[id(websocket)] = client
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(id(websocket), None)
+        if client is None:
+            return
+        client.closed = True
+        if client.writer_task and client.writer_task is not asyncio.current_task():
+            client.writer_task.cancel()
+
+    def broadcast(self, message: dict, meta: Optional[EventMeta] = None) -> int:
+        """
+        編碼一次後推入訂閱條件相符的客戶端佇列，回傳成功入列的客戶端數
+        未指定 meta 時由訊息的 type / task_id / required_domain (或 domain) / requester_id 推得
+        """
+        if meta is None:
+            meta = EventMeta(
+                message.get("type", "message"),
+                message.get("task_id"),
+                message.get("required_domain", message.get("domain")),
+                message.get("requester_id"),
+            )
+        return self.broadcast_text(json.dumps(message), meta=meta)
+
+    @instrumentation.timed("ws.broadcast")
+    def broadcast_text(self, text: str, snapshot: bool = False, meta: Optional[EventMeta] = None) -> int:
+        delivered = 0
+        for client in list(self.clients.values()):
+            subscription = client.subscription
+            if subscription is not None and meta is not None and not subscription.matches(meta):
+                continue
+            if self.send_text(client, text, snapshot=snapshot):
+                delivered += 1
+        return delivered
+
+    @instrumentation.timed("ws.publish")
+    def publish(self, event_type: str, payload: Dict[str, Any], task_id: Optional[str] = None,
+                domain: Optional[str] = None, requester: Optional[str] = None) -> int:
+        """
+        發布增量事件：配發序號、編碼一次、寫入重播紀錄，只推給訂閱條件相符的客戶端
+        回傳事件序號
+        """
+        self.last_seq += 1
+        seq = self.last_seq
+        meta = EventMeta(event_type, task_id, domain, requester)
+        text = json.dumps({"type": event_type, "seq": seq, **payload})
+        self.replay_log.append((seq, meta, text))
+        if self.coalesce_seconds > 0:
+            self._pending.append(PendingEvent(seq, meta, text, payload))
+            self._schedule_flush()
+        else:
+            self.delivered_seq = seq
+            self.broadcast_text(text, meta=meta)
+        return seq
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.coalesce_seconds, self.flush)
+
+    @instrumentation.timed("ws.flush")
+    def flush(self) -> int:
+        """送出合併視窗內累積的事件，每個客戶端最多一個 frame；回傳送出的 frame 數"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        self.delivered_seq = pending[-1].seq
+
+        # 相同 (collapse, 事件集合) 的客戶端共用同一份 frame，事件本身不重新編碼
+        frames: Dict[tuple, str] = {}
+        sent = 0
+        for client in list(self.clients.values()):
+            subscription = client.subscription
+            events = pending if subscription is None else [e for e in pending if subscription.matches(e.meta)]
+            if not events:
+                continue
+            key = (client.collapse, tuple(e.seq for e in events))
+            text = frames.get(key)
+            if text is None:
+                texts = self._collapse(events) if client.collapse else [e.text for e in events]
+                text = texts[0] if len(texts) == 1 else (
+                    '{"type": "batch", "seq": %d, "events": [%s]}' % (events[-1].seq, ", ".join(texts))
+                )
+                frames[key] = text
+            if self.send_text(client, text):
+                sent += 1
+        return sent
+
+    @staticmethod
+    def _collapse(events: List[PendingEvent]) -> List[str]:
+        """把同一任務的多筆 proposal_submitted 合併為一筆摘要 (放在該任務最後一筆提案的位置)"""
+        groups: Dict[Optional[str], List[PendingEvent]] = {}
+        for e in events:
+            if e.meta.event_type == "proposal_submitted":
+                groups.setdefault(e.meta.task_id, []).append(e)
+
+        texts = []
+        for e in events:
+            group = groups.get(e.meta.task_id) if e.meta.event_type == "proposal_submitted" else None
+            if group is None or len(group) == 1:
+                texts.append(e.text)
+            elif e is group[-1]:
+                costs = [g.payload.get("estimated_cost") for g in group
+                         if isinstance(g.payload.get("estimated_cost"), (int, float))]
+                texts.append(json.dumps({
+                    "type": "proposals_summary",
+                    "seq": e.seq,
+                    "first_seq": group[0].seq,
+                    "task_id": e.meta.task_id,
+                    "count": len(group),
+                    "best_cost": min(costs) if costs else None,
+                }))
+        return texts
+
+    def can_resume(self, resume_from: int) -> bool:
+        """重播紀錄是否仍涵蓋 resume_from 之後的所有事件"""
+        if resume_from >= self.last_seq:
+            return True
+        oldest = self.replay_log[0][0] if self.replay_log else self.last_seq + 1
+        return resume_from >= oldest - 1
+
+    def replay(self, client: ClientConnection, resume_from: int) -> int:
+        """重送 resume_from 之後且符合訂閱的事件，回傳重送筆數"""
+        subscription = client.subscription
+        sent = 0
+        # 仍在合併視窗內的事件會隨下一個 batch 送出，不在此重送
+        for seq, meta, text in self.replay_log:
+            if resume_from < seq <= self.delivered_seq and (subscription is None or subscription.matches(meta)):
+                if self.send_text(client, text):
+                    sent += 1
+        return sent
+
+    def handle_client_message(self, client: ClientConnection, raw: str) -> bool:
+        """
+        處理客戶端控制訊息：
+        {"action": "subscribe", "task_ids": [...], "domains": [...], "requesters": [...],
+         "event_types": [...], "collapse": true, "resume_from": 42}
+        {"action": "unsubscribe"} / {"action": "resume", "resume_from": 42} / {"action": "ping"}
+        回傳 True 表示無法續傳，呼叫端應補送完整快照
+        """
+        try:
+            message = json.loads(raw)
+            if not isinstance(message, dict):
+                raise ValueError("message must be a JSON object")
+            action = message.get("action")
+            resume_from = message.get("resume_from")
+            if resume_from is not None and (isinstance(resume_from, bool) or not isinstance(resume_from, int)):
+                raise ValueError("'resume_from' must be an integer sequence number")
+            if action == "subscribe":
+                client.subscription = Subscription.from_message(message)
+                client.collapse = bool(message.get("collapse", False))
+            elif action == "unsubscribe":
+                client.subscription = None
+                client.collapse = False
+            elif action == "ping":
+                self.send_text(client, json.dumps({"type": "pong", "seq": self.last_seq}))
+                return False
+            elif action != "resume":
+                raise ValueError(f"Unknown action: {action}")
+        except ValueError as e:
+            self.send_text(client, json.dumps({"type": "error", "detail": str(e)}))
+            return False
+
+        resumable = resume_from is None or self.can_resume(resume_from)
+        self.send_text(client, json.dumps({
+            "type": "subscribed",
+            "seq": self.last_seq,
+            "filters": client.subscription.to_dict() if client.subscription else None,
+            "resumed": resume_from is not None and resumable,
+        }))
+        if resume_from is None:
+            return False
+        if not resumable:
+            self.send_text(client, json.dumps({"type": "resync_required", "seq": self.last_seq}))
+            return True
+        self.replay(client, resume_from)
+        return False
+
+    def send_text(self, client: ClientConnection, text: str, snapshot: bool = False) -> bool:
+        """推入單一客戶端佇列；snapshot frame 仍會送給已降級的客戶端"""
+        if client.closed or (client.downgraded and not snapshot):
+            return False
+        try:
+            client.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return self._handle_overflow(client, text, snapshot)
+
+    def _handle_overflow(self, client: ClientConnection, text: str, snapshot: bool) -> bool:
+        client.dropped += 1
+        ws_frames_dropped.labels(policy=self.slow_policy).inc()
+        if self.slow_policy == "drop_oldest":
+            client.queue.get_nowait()
+            client.queue.put_nowait(text)
+            return True
+
+        self._clear_queue(client)
+        if self.slow_policy == "disconnect":
+            ws_slow_clients.labels(action="disconnect").inc()
+            logger.warning("🐢 WebSocket 客戶端過慢，中斷連線", event="ws_slow_disconnect")
+            client.closed = True
+            self.clients.pop(id(client.websocket), None)
+            client.queue.put_nowait(_CLOSE)
+            return False
+
+        if not client.downgraded:
+            ws_slow_clients.labels(action="downgrade").inc()
+            logger.warning("🐢 WebSocket 客戶端過慢，降級為快照模式", event="ws_slow_downgrade")
+            client.downgraded = True
+            client.queue.put_nowait(json.dumps({"type": "downgraded", "mode": "snapshot_only"}))
+        if snapshot and not client.queue.full():
+            client.queue.put_nowait(text)
+            return True
+        return False
+
+    @staticmethod
+    def _clear_queue(client: ClientConnection):
+        while not client.queue.empty():
+            client.queue.get_nowait()
+
+    async def _writer(self, client: ClientConnection):
+        websocket = client.websocket
+        try:
+            while True:
+                text = await client.queue.get()
+                if text is _CLOSE:
+                    await websocket.close(code=1013)
+                    return
+                await websocket.send_text(text)
+                ws_frames_sent.inc()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(websocket)
+
+    def connection_count(self) -> int:
+        return len(self.clients)
+
+    def total_queue_depth(self) -> int:
+        return sum(c.queue.qsize() for c in self.clients.values())
+
+    def max_queue_depth(self) -> int:
+        return max((c.queue.qsize() for c in self.clients.values()), default=0)
+
+
+class SnapshotPublisher:
+    """
+    共用市場快照推播：每個 tick 只在市場版本變更時建立並編碼一次快照，
+    所有訂閱者收到同一份預先編碼的 frame；沒有客戶端時自動停止
+    """
+
+    def __init__(self, manager: ConnectionManager, build_snapshot: Callable[[], dict],
+                 get_version: Callable[[], int], interval: float = 2.0):
+        self.manager = manager
+        self.build_snapshot = build_snapshot
+        self.get_version = get_version
+        self.interval = interval
+        self.builds = 0
+        self._frame: Optional[str] = None
+        self._frame_version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def latest_frame(self) -> str:
+        """回傳目前版本的快照 frame，僅在版本變更時重建"""
+        version = self.get_version()
+        if self._frame is None or version != self._frame_version:
+            self._frame = json.dumps(self.build_snapshot())
+            self._frame_version = version
+            self.builds += 1
+        return self._frame
+
+    def publish_once(self) -> bool:
+        """市場有變更時推播新快照，回傳是否有推播"""
+        if self._frame is not None and self.get_version() == self._frame_version:
+            return False
+        self.manager.broadcast_text(self.latest_frame(), snapshot=True, meta=SNAPSHOT_META)
+        return True
+
+    def ensure_running(self):
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.manager.connection_count():
+            await asyncio.sleep(self.interval)
+            self.publish_once()
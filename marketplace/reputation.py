@@ -94,9 +94,16 @@ class AgentReputation:
             self.avg_budget_score = sum(self.recent_budget_scores) / len(self.recent_budget_scores)
 
         logger.info(
-            f"📊 {self.agent_id} 信譽更新：總任務={self.total_tasks}, "
-            f"成功率={self.success_rate:.1%}, 評分={self.avg_rating:.1f}, "
-            f"驗證通過={self.verification_passes}, 驗證失敗={self.verification_failures}"
+            "📊 {agent_id} 信譽更新：總任務={total_tasks}, "
+            "成功率={success_rate:.1%}, 評分={avg_rating:.1f}, "
+            "驗證通過={verification_passes}, 驗證失敗={verification_failures}",
+            event="reputation_updated",
+            agent_id=self.agent_id,
+            total_tasks=self.total_tasks,
+            success_rate=self.success_rate,
+            avg_rating=self.avg_rating,
+            verification_passes=self.verification_passes,
+            verification_failures=self.verification_failures,
         )
 
 class ReputationSystem:
@@ -109,7 +116,7 @@ class ReputationSystem:
         """獲取或建立信譽記錄"""
         if agent_id not in self.reputations:
             self.reputations[agent_id] = AgentReputation(agent_id=agent_id)
-            logger.info(f"🆕 為 {agent_id} 建立信譽記錄")
+            logger.info("🆕 為 {agent_id} 建立信譽記錄", event="reputation_created", agent_id=agent_id)
         return self.reputations[agent_id]
     
     def update_reputation(
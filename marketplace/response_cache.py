@@ -0,0 +1,78 @@
+"""
+版本化回應快取 (Response Cache)
+以市場變更版本為鍵：兩次變更之間的相同請求直接回傳預先編碼的 bytes；
+可選的短 TTL 模式允許儀表板在版本變更後仍短暫沿用舊資料
+"""
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable
+
+from .metrics import response_cache_requests
+
+
+def encode_json(payload: Any) -> bytes:
+    """與 FastAPI JSONResponse 相同的編碼設定"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass
+class CacheEntry:
+    version: Hashable
+    built_at: float
+    value: Any
+
+
+class VersionedResponseCache:
+    """依 (endpoint, version) 快取回應，記錄命中率"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.entries: Dict[Hashable, CacheEntry] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def get_or_build(self, endpoint: str, version: Hashable, build: Callable[[], Any],
+                     max_stale: float = 0.0, key: Hashable = None) -> Any:
+        """
+        回傳快取值；版本相同即命中，max_stale > 0 時在該秒數內即使版本已變也沿用舊值
+        key 用於區分同一 endpoint 的不同查詢參數
+        """
+        cache_key = (endpoint, key)
+        entry = self.entries.get(cache_key)
+        now = self.clock()
+        if entry is not None:
+            if entry.version == version:
+                self._record(endpoint, "hit")
+                return entry.value
+            if max_stale > 0 and now - entry.built_at <= max_stale:
+                self._record(endpoint, "stale_hit")
+                return entry.value
+        value = build()
+        self.entries[cache_key] = CacheEntry(version=version, built_at=now, value=value)
+        self._record(endpoint, "miss")
+        return value
+
+    def _record(self, endpoint: str, result: str):
+        counts = self.misses if result == "miss" else self.hits
+        counts[endpoint] = counts.get(endpoint, 0) + 1
+        response_cache_requests.labels(endpoint=endpoint, result=result).inc()
+
+    def hit_rate(self, endpoint: str) -> float:
+        hits = self.hits.get(endpoint, 0)
+        total = hits + self.misses.get(endpoint, 0)
+        return hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        endpoints = set(self.hits) | set(self.misses)
+        return {
+            endpoint: {
+                "hits": self.hits.get(endpoint, 0),
+                "misses": self.misses.get(endpoint, 0),
+                "hit_rate": self.hit_rate(endpoint),
+            }
+            for endpoint in sorted(endpoints)
+        }
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,184 @@
+"""
+平行市場模擬 (Parallel market simulation)
+任務依 shard 切分到 process pool，每個 worker 以自己的 HubMarket 與完整 Agent 集群跑完該 shard，
+最後合併統計與各階段耗時
+
+- 可重現：每個 shard 由 SeedSequence(seed).spawn() 取得獨立種子 (任務參數與 random 策略)，
+  結果與 worker 數量無關
+- 記憶體有上限：shard 內以 batch 為單位建立新的 HubMarket，跑完即丟棄，
+  只保留累計統計，因此百萬任務規模不會累積投標清單
+"""
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .hub_market import HubMarket
+from .log_config import quiet_logging
+from .solver_agents import SolverAgent, diverse_solver_configs
+
+PHASES = ("create_tasks", "bidding", "selection")
+
+
+@dataclass
+class SimulationConfig:
+    """模擬參數；每個 shard 都有完整的 num_agents 個 Agent"""
+    num_tasks: int = 1000
+    num_agents: int = 20
+    shards: int = 4
+    seed: int = 0
+    batch_size: int = 1000
+    min_budget: float = 1.0
+    max_budget: float = 5.0
+    min_tokens: int = 10_000
+    max_tokens: int = 100_000
+    quiet: bool = True  # 停用 marketplace 的 loguru 輸出
+
+    def shard_tasks(self, shard: int) -> int:
+        base, remainder = divmod(self.num_tasks, self.shards)
+        return base + (1 if shard < remainder else 0)
+
+
+@dataclass
+class ShardResult:
+    """單一 shard 的累計結果；phase_seconds 為該 worker 各階段耗時"""
+    shard: int
+    tasks: int = 0
+    bids: int = 0
+    assigned: int = 0
+    winning_cost: float = 0.0
+    wins_by_strategy: Dict[str, int] = field(default_factory=dict)
+    phase_seconds: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+
+
+@dataclass
+class SimulationResult:
+    config: SimulationConfig
+    shards: List[ShardResult]
+    workers: int
+    wall_seconds: float
+
+    @property
+    def totals(self) -> Dict[str, object]:
+        wins: Counter = Counter()
+        for shard in self.shards:
+            wins.update(shard.wins_by_strategy)
+        assigned = sum(s.assigned for s in self.shards)
+        winning_cost = sum(s.winning_cost for s in self.shards)
+        return {
+            "tasks": sum(s.tasks for s in self.shards),
+            "bids": sum(s.bids for s in self.shards),
+            "assigned": assigned,
+            "avg_winning_bid": winning_cost / assigned if assigned else 0.0,
+            "wins_by_strategy": dict(sorted(wins.items())),
+        }
+
+    @property
+    def phase_seconds(self) -> Dict[str, Dict[str, float]]:
+        """各階段：total 為所有 worker 合計 (CPU 時間)，max 為最慢 shard (關鍵路徑)"""
+        return {
+            phase: {
+                "total": sum(s.phase_seconds[phase] for s in self.shards),
+                "max": max((s.phase_seconds[phase] for s in self.shards), default=0.0),
+            }
+            for phase in PHASES
+        }
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "config": asdict(self.config),
+            "workers": self.workers,
+            "wall_seconds": self.wall_seconds,
+            "totals": self.totals,
+            "phase_seconds": self.phase_seconds,
+            "shards": [asdict(s) for s in self.shards],
+        }
+
+
+def shard_seeds(seed: int, shards: int) -> List[int]:
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(shards)]
+
+
+def build_agents(num_agents: int) -> List[SolverAgent]:
+    """以 diverse_solver_configs 為範本輪流複製出 num_agents 個 Agent"""
+    templates = diverse_solver_configs()
+    return [
+        SolverAgent(replace(templates[i % len(templates)], agent_id=f"algo_agent_{i:05d}"))
+        for i in range(num_agents)
+    ]
+
+
+def run_shard(config: SimulationConfig, shard: int) -> ShardResult:
+    """worker 進入點 (需為模組層級函式才能被 pickle)"""
+    with quiet_logging(config.quiet):
+        return _run_shard(config, shard)
+
+
+def _run_shard(config: SimulationConfig, shard: int) -> ShardResult:
+    seed = shard_seeds(config.seed, config.shards)[shard]
+    rng = np.random.default_rng(seed)
+    agents = build_agents(config.num_agents)
+    for agent, child in zip(agents, np.random.SeedSequence(seed).spawn(len(agents))):
+        agent.rng = np.random.default_rng(child)
+    strategy_of = {agent.config.agent_id: agent.config.strategy_name for agent in agents}
+    result = ShardResult(shard=shard)
+    wins: Counter = Counter()
+    timings = result.phase_seconds
+    remaining = config.shard_tasks(shard)
+
+    while remaining > 0:
+        size = min(config.batch_size, remaining)
+        remaining -= size
+        budgets = rng.uniform(config.min_budget, config.max_budget, size)
+        tokens = rng.integers(config.min_tokens, config.max_tokens, size, endpoint=True)
+
+        market = HubMarket()
+        for agent in agents:
+            agent.subscribe(market)
+
+        start = time.perf_counter()
+        tasks = [
+            market.create_task(f"shard {shard} task", "sim", round(float(budget), 4), int(expected),
+                               requester_id=f"buyer_{shard}")
+            for budget, expected in zip(budgets, tokens)
+        ]
+        bidding_start = time.perf_counter()
+        for agent in agents:
+            agent.scan_and_bid(market)
+        selection_start = time.perf_counter()
+        for task in tasks:
+            winner = market.select_winner(task.task_id)
+            if winner is not None:
+                result.assigned += 1
+                result.winning_cost += winner.bid_price
+                wins[strategy_of[winner.bidder_id]] += 1
+        end = time.perf_counter()
+
+        timings["create_tasks"] += bidding_start - start
+        timings["bidding"] += selection_start - bidding_start
+        timings["selection"] += end - selection_start
+        result.tasks += size
+        result.bids += market.counters.total_bids
+
+    result.wins_by_strategy = dict(wins)
+    return result
+
+
+def run_parallel_simulation(config: SimulationConfig, workers: Optional[int] = None) -> SimulationResult:
+    """
+    以 process pool 平行執行所有 shard；workers=1 時在目前行程內依序執行 (方便除錯與測試)
+    workers 預設為 min(shards, CPU 數)
+    """
+    workers = workers or min(config.shards, os.cpu_count() or 1)
+    start = time.perf_counter()
+    if workers == 1:
+        shards = [run_shard(config, shard) for shard in range(config.shards)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(run_shard, [config] * config.shards, range(config.shards)))
+    return SimulationResult(config=config, shards=shards, workers=workers,
+                            wall_seconds=time.perf_counter() - start)
@@ -37,6 +37,8 @@ class SolanaEscrowSimulator:
     def __init__(self):
         self.escrows: Dict[str, EscrowAccount] = {}
         self.total_value_locked = 0.0
+        # 每次託管狀態變更遞增，供回應快取判斷
+        self.version = 0
         logger.info("⛓️ Solana Escrow 模擬器已啟動")
     
     def create_escrow(self, task_id: str, buyer_id: str, seller_id: str, amount: float) -> str:
@@ -53,6 +55,7 @@ class SolanaEscrowSimulator:
             amount=amount
         )
         self.escrows[escrow_id] = escrow
+        self.version += 1
         logger.info(f"⛓️ [Solana] 建立託管：{escrow_id} | 金額：{amount} SOL")
         return escrow_id
     
@@ -67,6 +70,7 @@ class SolanaEscrowSimulator:
         escrow = self.escrows[escrow_id]
         escrow.status = EscrowStatus.FUNDED
         self.total_value_locked += escrow.amount
+        self.version += 1
         
         logger.info(f"💰 [Solana] 託管 {escrow_id} 已注資 {escrow.amount} SOL")
         return True
@@ -80,7 +84,8 @@ class SolanaEscrowSimulator:
             raise ValueError("Escrow not found")
         
         escrow = self.escrows[escrow_id]
-        
+        self.version += 1
+
         if approved:
             escrow.status = EscrowStatus.COMPLETED
             escrow.completed_at = datetime.now(timezone.utc)
@@ -2,11 +2,15 @@
 純演算法 Solver Agents (No-LLM)
 基於策略模式自動競標
 """
-import random
+import zlib
 from typing import Dict, List, Optional
 from loguru import logger
 from dataclasses import dataclass
+
+import numpy as np
+
 from .hub_market import Task, Bid, market, TaskStatus
+from .matching import SolverInterest
 from .strategies import BiddingStrategy, get_strategy, MarketState
 
 @dataclass
@@ -18,6 +22,7 @@ class AgentConfig:
     success_rate: float
     specialization: List[str]
     strategy_name: str = "aggressive"
+    seed: Optional[int] = None  # 出價亂數種子；None 時由 agent_id 推導
 
 class SolverAgent:
     """
@@ -29,8 +34,12 @@ class SolverAgent:
         self.wallet_balance = 10.0
         self.completed_tasks = 0
         self.strategy = get_strategy(config.strategy_name)
-        logger.info(f"🤖 [Algo] Agent 啟動：{config.agent_id} "
-                    f"(策略：{self.strategy.name}, 成本：{config.cost_per_token*1e6:.2f} SOL/M tokens)")
+        # 出價的亂數來源 (RandomWalk)，逐筆與批次出價共用；模擬器可換成由自身種子衍生的 Generator
+        seed = config.seed if config.seed is not None else zlib.crc32(config.agent_id.encode())
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        logger.info("🤖 [Algo] Agent 啟動：{agent_id} (策略：{strategy}, 成本：{cost_per_m:.2f} SOL/M tokens)",
+                    event="solver_started", agent_id=config.agent_id, strategy=self.strategy.name,
+                    cost_per_m=config.cost_per_token * 1e6)
 
     def evaluate_task(self, task: Task) -> bool:
         """評估是否投標：僅考慮成本效益"""
@@ -39,49 +48,64 @@ class SolverAgent:
         return expected_cost < task.max_budget * 0.9
 
     def calculate_bid(self, task: Task, market_state: MarketState) -> Optional[float]:
-        """使用策略計算投標價格"""
+        """使用策略計算投標價格 (與 bid_on_tasks 同走 calculate_bids 與 self.rng)"""
         base_cost = task.expected_tokens * self.config.cost_per_token
-        return self.strategy.calculate_bid(base_cost, market_state, task.max_budget)
+        return float(self.strategy.calculate_bids(np.array([base_cost]), market_state, task.max_budget,
+                                                  rng=self.rng)[0])
+
+    def interest(self) -> SolverInterest:
+        """向媒合引擎登記的興趣 (不限領域；成本是否划算仍由 evaluate_task 判斷)"""
+        return SolverInterest(solver_id=self.config.agent_id)
+
+    def subscribe(self, market_instance) -> SolverInterest:
+        """登記到市場的媒合引擎；之後 scan_and_bid 只處理推送進收件匣的新任務"""
+        return market_instance.register_solver(self.interest())
 
     def scan_and_bid(self, market_instance) -> List[Bid]:
-        """掃描市場並投標"""
+        """
+        處理可投標的任務並投標
+        已 subscribe 時只取收件匣中的任務 (O(推送數))；否則退回掃描全部開放任務
+        """
+        if self.config.agent_id in market_instance.matching.interests:
+            tasks = market_instance.pull_matched_tasks(self.config.agent_id)
+        else:
+            tasks = [t for t in market_instance.tasks.values() if t.status == TaskStatus.OPEN]
+
+        return self.bid_on_tasks(market_instance, tasks)
+
+    def bid_on_tasks(self, market_instance, tasks: List[Task]) -> List[Bid]:
+        """
+        一次對多個任務出價：成本、成本效益篩選與策略出價皆為 NumPy 向量運算
+        (等同逐筆 evaluate_task + calculate_bid)，市場狀態取自串流統計
+        """
+        if not tasks:
+            return []
+        budgets = np.fromiter((t.max_budget for t in tasks), dtype=float, count=len(tasks))
+        costs = np.fromiter((t.expected_tokens for t in tasks), dtype=float, count=len(tasks)) \
+            * self.config.cost_per_token
+        candidates = np.flatnonzero(costs < budgets * 0.9)
+        if candidates.size == 0:
+            return []
+        selected = [tasks[i] for i in candidates]
+        states = market_instance.get_market_states([t.task_id for t in selected], task_complexity=0.5)
+        prices = self.strategy.calculate_bids(costs[candidates], states, budgets[candidates], rng=self.rng)
+
         submitted_bids = []
-        
-        for task_id, task in market_instance.tasks.items():
-            if task.status != TaskStatus.OPEN:
-                continue
-            
-            if self.evaluate_task(task):
-                # 建立市場狀態快照
-                all_bids = market_instance.bids.get(task_id, [])
-                prices = [b.bid_price for b in all_bids]
-                
-                market_state = MarketState(
-                    avg_price=sum(prices)/len(prices) if prices else 0,
-                    min_price=min(prices) if prices else 0,
-                    max_price=max(prices) if prices else 0,
-                    total_bids=len(all_bids),
-                    task_complexity=0.5
-                )
-                
-                bid_price = self.calculate_bid(task, market_state)
-                
-                if bid_price and bid_price <= task.max_budget:
-                    bid = market_instance.submit_bid(
-                        task_id=task_id,
-                        bidder_id=self.config.agent_id,
-                        bid_price=round(bid_price, 6),
-                        estimated_tokens=task.expected_tokens,
-                        model_name=self.config.model_name,
-                        message=f"[Algo] {self.strategy.name} 策略投標"
-                    )
-                    submitted_bids.append(bid)
-        
+        for task, bid_price in zip(selected, prices.tolist()):
+            if bid_price and bid_price <= task.max_budget:
+                submitted_bids.append(market_instance.submit_bid(
+                    task_id=task.task_id,
+                    bidder_id=self.config.agent_id,
+                    bid_price=round(bid_price, 6),
+                    estimated_tokens=task.expected_tokens,
+                    model_name=self.config.model_name,
+                    message=f"[Algo] {self.strategy.name} 策略投標"
+                ))
         return submitted_bids
 
-def create_diverse_solvers():
-    """建立多樣化的演算法 Agent 集群"""
-    configs = [
+def diverse_solver_configs() -> List[AgentConfig]:
+    """多樣化 Agent 集群的配置範本 (SolverFleet 與模擬器共用)"""
+    return [
         # 低成本、激進策略
         AgentConfig("algo_sniper_01", "Qwen-1.5B-Int4", 0.0000001, 0.85, ["general"], "sniper"),
         
@@ -94,5 +118,7 @@ def create_diverse_solvers():
         # 隨機策略 (模擬散戶)
         AgentConfig("algo_random_01", "TinyLlama-1.1B", 0.00000005, 0.70, ["general"], "random"),
     ]
-    
-    return [SolverAgent(cfg) for cfg in configs]
+
+def create_diverse_solvers():
+    """建立多樣化的演算法 Agent 集群"""
+    return [SolverAgent(cfg) for cfg in diverse_solver_configs()]
@@ -4,18 +4,70 @@
 """
 import random
 import math
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+from dataclasses import asdict, dataclass
 from loguru import logger
+import numpy as np
 
 @dataclass
 class MarketState:
-    """市場狀態快照"""
+    """市場狀態快照 (分布欄位由 HubMarket 的串流統計提供，手動建立時可省略)"""
     avg_price: float
     min_price: float
     max_price: float
     total_bids: int
     task_complexity: float  # 0-1
+    price_stddev: float = 0.0
+    p25_price: float = 0.0
+    median_price: float = 0.0
+    p75_price: float = 0.0
+    total_price: float = 0.0
+    best_score: Optional[float] = None  # 目前最佳 (最低) 選標分數；尚無投標為 None
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+@dataclass
+class MarketStateBatch:
+    """多個任務的市場狀態 (每個欄位一個 ndarray)，供 calculate_bids 逐元素使用"""
+    avg_price: np.ndarray
+    min_price: np.ndarray
+    max_price: np.ndarray
+    total_bids: np.ndarray
+    task_complexity: np.ndarray
+
+    @classmethod
+    def from_states(cls, states: List[MarketState]) -> "MarketStateBatch":
+        return cls(
+            avg_price=np.array([s.avg_price for s in states], dtype=float),
+            min_price=np.array([s.min_price for s in states], dtype=float),
+            max_price=np.array([s.max_price for s in states], dtype=float),
+            total_bids=np.array([s.total_bids for s in states], dtype=np.int64),
+            task_complexity=np.array([s.task_complexity for s in states], dtype=float),
+        )
+
+    def __len__(self) -> int:
+        return len(self.avg_price)
+
+    def take(self, indices: np.ndarray) -> "MarketStateBatch":
+        return MarketStateBatch(
+            avg_price=self.avg_price[indices],
+            min_price=self.min_price[indices],
+            max_price=self.max_price[indices],
+            total_bids=self.total_bids[indices],
+            task_complexity=self.task_complexity[indices],
+        )
+
+    def __getitem__(self, i: int) -> MarketState:
+        return MarketState(
+            avg_price=float(self.avg_price[i]),
+            min_price=float(self.min_price[i]),
+            max_price=float(self.max_price[i]),
+            total_bids=int(self.total_bids[i]),
+            task_complexity=float(self.task_complexity[i]),
+        )
+
+States = Union[MarketState, MarketStateBatch]
 
 class BiddingStrategy:
     """競標策略基類"""
@@ -24,6 +76,21 @@ class BiddingStrategy:
     def calculate_bid(self, cost: float, state: MarketState, max_budget: float) -> float:
         raise NotImplementedError
 
+    def calculate_bids(self, costs: np.ndarray, states: States, max_budgets: np.ndarray,
+                       rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        批次版本：states 為單一 MarketState (所有成本共用) 或與 costs 等長的 MarketStateBatch
+        子類別以 NumPy 覆寫；預設逐筆呼叫 calculate_bid
+        """
+        costs = np.asarray(costs, dtype=float)
+        max_budgets = np.broadcast_to(np.asarray(max_budgets, dtype=float), costs.shape)
+        per_task = isinstance(states, MarketStateBatch)
+        return np.fromiter(
+            (self.calculate_bid(c, states[i] if per_task else states, b)
+             for i, (c, b) in enumerate(zip(costs, max_budgets))),
+            dtype=float, count=costs.size,
+        )
+
 class AggressiveStrategy(BiddingStrategy):
     """
     激進策略：低價搶單
@@ -37,6 +104,9 @@ class AggressiveStrategy(BiddingStrategy):
         # 確保不超過預算
         return min(bid, max_budget * 0.99)
 
+    def calculate_bids(self, costs, states, max_budgets, rng=None):
+        return np.minimum(np.asarray(costs, dtype=float) * 1.05, np.asarray(max_budgets, dtype=float) * 0.99)
+
 class ConservativeStrategy(BiddingStrategy):
     """
     保守策略：高利潤導向
@@ -49,6 +119,9 @@ class ConservativeStrategy(BiddingStrategy):
         bid = cost * 1.50
         return min(bid, max_budget * 0.99)
 
+    def calculate_bids(self, costs, states, max_budgets, rng=None):
+        return np.minimum(np.asarray(costs, dtype=float) * 1.50, np.asarray(max_budgets, dtype=float) * 0.99)
+
 class MarketFollowStrategy(BiddingStrategy):
     """
     跟隨策略：參考市價
@@ -63,6 +136,11 @@ class MarketFollowStrategy(BiddingStrategy):
             return cost * 1.10
         return state.avg_price * 0.98
 
+    def calculate_bids(self, costs, states, max_budgets, rng=None):
+        costs = np.asarray(costs, dtype=float)
+        avg_price = np.asarray(states.avg_price, dtype=float)
+        return np.where(avg_price < costs, costs * 1.10, avg_price * 0.98)
+
 class SniperStrategy(BiddingStrategy):
     """
     狙擊策略：精準計算
@@ -81,6 +159,11 @@ class SniperStrategy(BiddingStrategy):
             # 激烈競爭，壓低利潤
             return cost * 1.02
 
+    def calculate_bids(self, costs, states, max_budgets, rng=None):
+        total_bids = np.asarray(states.total_bids)
+        markup = np.select([total_bids < 3, total_bids < 10], [1.40, 1.15], 1.02)
+        return np.asarray(costs, dtype=float) * markup
+
 class RandomWalkStrategy(BiddingStrategy):
     """
     隨機漫步策略：模擬無 intelligence 代理
@@ -88,10 +171,19 @@ class RandomWalkStrategy(BiddingStrategy):
     """
     name = "Random Walk"
     
-    def calculate_bid(self, cost: float, state: MarketState, max_budget: float) -> float:
-        variance = random.uniform(0.9, 1.1)
+    def calculate_bid(self, cost: float, state: MarketState, max_budget: float,
+                      rng: Optional[np.random.Generator] = None) -> float:
+        # 指定 Generator 時與 calculate_bids 取同一亂數序列 (逐筆 == 批次)
+        variance = random.uniform(0.9, 1.1) if rng is None else rng.uniform(0.9, 1.1)
         return cost * variance
 
+    def calculate_bids(self, costs, states, max_budgets, rng=None):
+        # 批次出價必須指定 Generator，結果才能以種子重現
+        if rng is None:
+            raise ValueError("RandomWalkStrategy.calculate_bids requires an np.random.Generator")
+        costs = np.asarray(costs, dtype=float)
+        return costs * rng.uniform(0.9, 1.1, size=costs.shape)
+
 # 策略工廠
 STRATEGIES = {
     "aggressive": AggressiveStrategy(),
@@ -0,0 +1,139 @@
+"""
+串流統計 (Streaming statistics)
+每筆投標 O(1) 更新：Welford 平均 / 變異數、最小 / 最大值，
+以及 P² 演算法 (Jain & Chlamtac, 1985) 的分位數估計，不保存原始價格
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TASK_QUANTILES: Tuple[float, ...] = (0.25, 0.5, 0.75)
+DOMAIN_QUANTILES: Tuple[float, ...] = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class P2Quantile:
+    """
+    P² 分位數估計：只維護 5 個標記 (marker) 的高度與位置
+    前 5 筆觀測直接排序；之後以拋物線 (必要時線性) 內插調整標記
+    """
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError("quantile must be in (0, 1)")
+        self.p = p
+        self.heights: List[float] = []
+        self.positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.desired = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(x)
+            if len(heights) == 5:
+                heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    candidate = self._linear(i, step)
+                heights[i] = candidate
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+
+    def value(self) -> float:
+        heights = self.heights
+        if not heights:
+            return 0.0
+        if len(heights) < 5:
+            ordered = sorted(heights)
+            return ordered[min(len(ordered) - 1, int(round(self.p * (len(ordered) - 1))))]
+        return heights[2]
+
+
+class StreamingStats:
+    """count / sum / mean / variance (Welford) / min / max 與一組 P² 分位數"""
+    __slots__ = ("count", "mean", "_m2", "_sum", "min", "max", "quantiles")
+
+    def __init__(self, quantiles: Iterable[float] = TASK_QUANTILES):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._sum = 0.0  # 獨立累加，不由 mean * count 反推 (避免 Welford 平均的捨入誤差)
+        self.min = math.inf
+        self.max = -math.inf
+        self.quantiles: Dict[float, P2Quantile] = {q: P2Quantile(q) for q in quantiles}
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        self._sum += x
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        for estimator in self.quantiles.values():
+            estimator.add(x)
+
+    @property
+    def total(self) -> float:
+        return self._sum
+
+    @property
+    def variance(self) -> float:
+        """樣本變異數 (n-1)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def quantile(self, q: float, default: Optional[float] = None) -> float:
+        estimator = self.quantiles.get(q)
+        if estimator is None or not self.count:
+            return self.mean if default is None else default
+        return estimator.value()
+
+    def to_dict(self) -> Dict[str, object]:
+        empty = self.count == 0
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "stddev": self.stddev,
+            "min": 0.0 if empty else self.min,
+            "max": 0.0 if empty else self.max,
+            "quantiles": {f"p{int(q * 100)}": estimator.value() for q, estimator in self.quantiles.items()},
+        }
@@ -0,0 +1,105 @@
+"""
+市場活動時間序列 (Time-series rollups)
+事件寫入時同步累加到秒 / 分 / 時三種解析度的固定長度環形陣列 (array('d'))，
+粗解析度即細解析度的降採樣，但保留更長的歷史；查詢只讀取最近 N 個桶，與任務數無關
+"""
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 解析度 -> (桶寬秒數, 桶數)：10 分鐘的秒級、24 小時的分級、30 天的時級
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "second": (1, 600),
+    "minute": (60, 1440),
+    "hour": (3600, 720),
+}
+
+# 原始事件序列
+EVENTS = ("bids", "tasks", "assignments", "winning_cost", "time_to_assign")
+
+# 查詢指標 -> (計算方式, 分子事件, 分母事件)
+#   rate: 每秒次數；mean: 事件值平均；ratio: 分子次數 / 分母次數
+METRICS: Dict[str, Tuple[str, str, Optional[str]]] = {
+    "bids_per_sec": ("rate", "bids", None),
+    "tasks_per_sec": ("rate", "tasks", None),
+    "assignments_per_sec": ("rate", "assignments", None),
+    "fill_rate": ("ratio", "assignments", "tasks"),
+    "avg_winning_cost": ("mean", "winning_cost", None),
+    "time_to_assign": ("mean", "time_to_assign", None),
+}
+
+
+class RollupRing:
+    """單一事件、單一解析度的環形桶：每桶記錄 (桶序號, 次數, 總和)"""
+    __slots__ = ("width", "capacity", "stamps", "counts", "sums")
+
+    def __init__(self, width: int, capacity: int):
+        self.width = width
+        self.capacity = capacity
+        self.stamps = array("q", [-1]) * capacity
+        self.counts = array("d", [0.0]) * capacity
+        self.sums = array("d", [0.0]) * capacity
+
+    def add(self, value: float, now: float):
+        index = int(now // self.width)
+        slot = index % self.capacity
+        if self.stamps[slot] != index:
+            self.stamps[slot] = index
+            self.counts[slot] = 0.0
+            self.sums[slot] = 0.0
+        self.counts[slot] += 1.0
+        self.sums[slot] += value
+
+    def window(self, points: int, now: float) -> List[Tuple[int, float, float]]:
+        """最近 points 個桶 (含目前桶)，由舊到新：(桶起始時間, 次數, 總和)；過期桶視為 0"""
+        points = max(1, min(points, self.capacity))
+        last = int(now // self.width)
+        result = []
+        for index in range(last - points + 1, last + 1):
+            slot = index % self.capacity
+            if self.stamps[slot] == index:
+                result.append((index * self.width, self.counts[slot], self.sums[slot]))
+            else:
+                result.append((index * self.width, 0.0, 0.0))
+        return result
+
+
+class MarketTimeSeries:
+    """市場事件 rollup 引擎"""
+
+    def __init__(self, clock: Callable[[], float] = time.time,
+                 resolutions: Optional[Dict[str, Tuple[int, int]]] = None):
+        self.clock = clock
+        self.resolutions = resolutions or RESOLUTIONS
+        self.rings: Dict[str, Tuple[RollupRing, ...]] = {
+            event: tuple(RollupRing(width, capacity) for width, capacity in self.resolutions.values())
+            for event in EVENTS
+        }
+        self._resolution_index = {name: i for i, name in enumerate(self.resolutions)}
+
+    def record(self, event: str, value: float = 1.0, now: Optional[float] = None):
+        now = self.clock() if now is None else now
+        for ring in self.rings[event]:
+            ring.add(value, now)
+
+    def query(self, metric: str, resolution: str = "second", points: int = 60,
+              now: Optional[float] = None) -> List[Dict[str, float]]:
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if resolution not in self._resolution_index:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        now = self.clock() if now is None else now
+        kind, numerator, denominator = METRICS[metric]
+        i = self._resolution_index[resolution]
+        ring = self.rings[numerator][i]
+        window = ring.window(points, now)
+
+        if kind == "rate":
+            return [{"t": start, "value": count / ring.width} for start, count, _ in window]
+        if kind == "mean":
+            return [{"t": start, "value": total / count if count else 0.0} for start, count, total in window]
+        base = self.rings[denominator][i].window(points, now)
+        return [
+            {"t": start, "value": count / base_count if base_count else 0.0}
+            for (start, count, _), (_, base_count, _) in zip(window, base)
+        ]
@@ -0,0 +1,206 @@
+"""
+策略錦標賽 (Strategy tournament)
+STRATEGIES 的每種組合 × 市場規模 × 每策略 Agent 數 × 多個 seed 各跑一場比賽，
+以 process pool 平行執行，彙總各策略勝率與每任務利潤的 95% 信賴區間
+
+每場比賽的結果以設定雜湊 (含 MATCH_VERSION) 快取成 JSON，重跑時只計算新增 / 變更的設定
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .hub_market import HubMarket
+from .log_config import quiet_logging
+from .solver_agents import AgentConfig, SolverAgent
+from .strategies import STRATEGIES
+
+# 比賽規則變更時遞增，讓舊快取失效
+MATCH_VERSION = 1
+Z_95 = 1.96
+
+
+@dataclass(frozen=True)
+class MatchConfig:
+    """單場比賽；每個策略派出 agents_per_strategy 個成本相近的 Agent"""
+    strategies: Tuple[str, ...]
+    num_tasks: int = 200
+    agents_per_strategy: int = 2
+    seed: int = 0
+    cost_per_token: float = 0.00002
+    cost_jitter: float = 0.2
+    min_budget: float = 1.0
+    max_budget: float = 5.0
+    min_tokens: int = 10_000
+    max_tokens: int = 100_000
+
+    def __post_init__(self):
+        unknown = [name for name in self.strategies if name not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown strategies: {unknown}")
+
+    def config_hash(self) -> str:
+        payload = json.dumps({"version": MATCH_VERSION, **asdict(self)}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def tournament_configs(strategies: Optional[Sequence[str]] = None, lineup_sizes: Iterable[int] = (2,),
+                       market_sizes: Iterable[int] = (200,), agent_counts: Iterable[int] = (2,),
+                       seeds: Iterable[int] = range(10), **overrides) -> List[MatchConfig]:
+    """所有策略組合 × 市場規模 × 每策略 Agent 數 × seed"""
+    names = sorted(strategies if strategies is not None else STRATEGIES)
+    lineups = [lineup for size in lineup_sizes for lineup in itertools.combinations(names, size)]
+    return [
+        MatchConfig(strategies=lineup, num_tasks=tasks, agents_per_strategy=agents, seed=seed, **overrides)
+        for lineup, tasks, agents, seed in itertools.product(lineups, market_sizes, agent_counts, seeds)
+    ]
+
+
+def play_match(config: MatchConfig) -> Dict[str, Dict[str, float]]:
+    """
+    執行一場比賽，回傳 {策略: {tasks, bids, wins, profit}}
+    Agent 依隨機順序逐一對全部任務批次出價 (後出價者看得到先前的投標)，最後每個任務選商
+    """
+    with quiet_logging():
+        return _play_match(config)
+
+
+def _play_match(config: MatchConfig) -> Dict[str, Dict[str, float]]:
+    seed_seq = np.random.SeedSequence(config.seed)
+    rng = np.random.default_rng(seed_seq)
+    agents = []
+    for name in config.strategies:
+        for i in range(config.agents_per_strategy):
+            cost = config.cost_per_token * rng.uniform(1 - config.cost_jitter, 1 + config.cost_jitter)
+            agents.append(SolverAgent(AgentConfig(f"{name}_{i}", name, cost, 0.9, ["general"], name)))
+    for agent, child in zip(agents, seed_seq.spawn(len(agents))):
+        agent.rng = np.random.default_rng(child)
+
+    market = HubMarket()
+    budgets = rng.uniform(config.min_budget, config.max_budget, config.num_tasks)
+    tokens = rng.integers(config.min_tokens, config.max_tokens, config.num_tasks, endpoint=True)
+    tasks = [market.create_task("Tournament task", "match", round(float(b), 4), int(t))
+             for b, t in zip(budgets, tokens)]
+
+    for index in rng.permutation(len(agents)):
+        agents[index].bid_on_tasks(market, tasks)
+
+    by_id = {agent.config.agent_id: agent for agent in agents}
+    stats = {name: {"tasks": config.num_tasks, "bids": 0, "wins": 0, "profit": 0.0} for name in config.strategies}
+    for bids in market.bids.values():
+        for bid in bids:
+            stats[by_id[bid.bidder_id].config.strategy_name]["bids"] += 1
+    for task in tasks:
+        winner = market.select_winner(task.task_id)
+        if winner is None:
+            continue
+        agent = by_id[winner.bidder_id]
+        entry = stats[agent.config.strategy_name]
+        entry["wins"] += 1
+        entry["profit"] += winner.bid_price - task.expected_tokens * agent.config.cost_per_token
+    return stats
+
+
+def confidence_interval(samples: Sequence[float], z: float = Z_95) -> Dict[str, float]:
+    """平均值與常態近似信賴區間 (樣本數 < 2 時區間退化為平均值)"""
+    n = len(samples)
+    mean = statistics.fmean(samples) if n else 0.0
+    half = z * statistics.stdev(samples) / math.sqrt(n) if n > 1 else 0.0
+    return {"mean": mean, "low": mean - half, "high": mean + half, "n": n}
+
+
+class Tournament:
+    """比賽排程與快取；cache_dir 為 None 時不快取"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_hits = 0
+        self.computed = 0
+
+    def _cache_path(self, config: MatchConfig) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{config.config_hash()}.json") if self.cache_dir else None
+
+    def _load(self, config: MatchConfig) -> Optional[Dict]:
+        path = self._cache_path(config)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["result"]
+        except (OSError, ValueError, KeyError):
+            return None  # 損毀的快取視同未命中
+
+    def _store(self, config: MatchConfig, result: Dict):
+        path = self._cache_path(config)
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"config": asdict(config), "result": result}, f)
+        os.replace(tmp, path)
+
+    def run(self, configs: Sequence[MatchConfig], workers: Optional[int] = None) -> List[Tuple[MatchConfig, Dict]]:
+        """執行 (或由快取取得) 所有比賽；workers=1 時在目前行程內依序執行"""
+        results: Dict[int, Dict] = {}
+        pending = []
+        for i, config in enumerate(configs):
+            cached = self._load(config)
+            if cached is None:
+                pending.append(i)
+            else:
+                results[i] = cached
+        self.cache_hits += len(results)
+
+        def collect(computed: Iterable[Dict]):
+            for i, result in zip(pending, computed):
+                self._store(configs[i], result)
+                results[i] = result
+                self.computed += 1
+
+        todo = [configs[i] for i in pending]
+        workers = workers or min(len(todo), os.cpu_count() or 1) or 1
+        if workers == 1:
+            collect(map(play_match, todo))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                collect(pool.map(play_match, todo, chunksize=max(1, len(todo) // (workers * 4))))
+        return [(config, results[i]) for i, config in enumerate(configs)]
+
+    @staticmethod
+    def summarize(matches: Sequence[Tuple[MatchConfig, Dict]]) -> Dict[str, Dict]:
+        """
+        各策略：勝率 (得標任務比例) 與每任務利潤的 95% 信賴區間，樣本單位為一場比賽；
+        head_to_head 為兩兩對戰 (兩策略組合) 時對各對手的勝率
+        """
+        win_rates: Dict[str, List[float]] = {}
+        profits: Dict[str, List[float]] = {}
+        head_to_head: Dict[str, Dict[str, List[float]]] = {}
+        for config, result in matches:
+            for name, entry in result.items():
+                win_rates.setdefault(name, []).append(entry["wins"] / entry["tasks"])
+                profits.setdefault(name, []).append(entry["profit"] / entry["tasks"])
+            if len(config.strategies) == 2:
+                a, b = config.strategies
+                head_to_head.setdefault(a, {}).setdefault(b, []).append(result[a]["wins"] / result[a]["tasks"])
+                head_to_head.setdefault(b, {}).setdefault(a, []).append(result[b]["wins"] / result[b]["tasks"])
+        return {
+            name: {
+                "matches": len(win_rates[name]),
+                "win_rate": confidence_interval(win_rates[name]),
+                "profit_per_task": confidence_interval(profits[name]),
+                "head_to_head": {
+                    opponent: confidence_interval(samples)["mean"]
+                    for opponent, samples in sorted(head_to_head.get(name, {}).items())
+                },
+            }
+            for name in sorted(win_rates)
+        }
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+📝 日誌模式效能基準
+比較 submit_bid 熱路徑在「全量日誌 / JSON / 取樣 / 關閉」下的 bids/sec
+用法：python scripts/bench_logging.py [num_bids]
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from marketplace.hub_market import HubMarket
+from marketplace.log_config import configure_logging
+
+MODES = [
+    # (名稱, configure_logging 參數)
+    ("on (sync text)", dict(level="INFO", enqueue=False, json_output=False, bid_sample_every=1)),
+    ("on (enqueue text)", dict(level="INFO", enqueue=True, json_output=False, bid_sample_every=1)),
+    ("on (enqueue json)", dict(level="INFO", enqueue=True, json_output=True, bid_sample_every=1)),
+    ("sampled 1/100", dict(level="INFO", enqueue=True, json_output=False, bid_sample_every=100)),
+    ("bids off", dict(level="INFO", enqueue=True, json_output=False, bid_sample_every=0)),
+    ("all off", dict(level="OFF", module_levels={}, bid_sample_every=0)),
+]
+
+
+def run_bids(num_bids: int, bids_per_task: int = 20) -> float:
+    """回傳 bids/sec (不含任務建立時間)"""
+    market = HubMarket()
+    task_ids = [
+        market.create_task(f"bench #{i}", "data", 10.0, 1000).task_id
+        for i in range(num_bids // bids_per_task + 1)
+    ]
+    start = time.perf_counter()
+    for i in range(num_bids):
+        market.submit_bid(task_ids[i // bids_per_task], f"agent_{i % 50}", 1.0 + (i % 7) * 0.01, 1000, "bench")
+    return num_bids / (time.perf_counter() - start)
+
+
+def main(num_bids: int = 50000):
+    print("=" * 60)
+    print(f"  📝 日誌模式基準：{num_bids} bids")
+    print("=" * 60)
+    results = []
+    with open(os.devnull, "w") as sink:
+        for name, kwargs in MODES:
+            configure_logging(sink=sink, **kwargs)
+            bps = run_bids(num_bids)
+            logger.complete()
+            results.append((name, bps))
+
+    configure_logging()
+    baseline = results[0][1]
+    for name, bps in results:
+        print(f"   {name:<20} {bps:>12,.0f} bids/sec   ({bps / baseline:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
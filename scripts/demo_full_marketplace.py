@@ -87,6 +87,7 @@ def demo_full_marketplace():
         # 8. 放款
         print_separator("步驟 8: 智能合約放款")
         solana_escrow.confirm_completion(escrow_id, approved=True)
+        market.mark_settled(task.task_id)
         print("✅ 資金已釋放給賣方")
         
         # 9. 市場統計
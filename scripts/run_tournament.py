@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+🏟️ 策略錦標賽
+STRATEGIES 的所有組合在多個 seed / 市場規模 / Agent 數下對戰，輸出勝率與利潤的 95% 信賴區間
+結果依設定雜湊快取，重跑只計算新增的比賽
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from marketplace.tournament import Tournament, tournament_configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略錦標賽")
+    parser.add_argument("--seeds", type=int, default=20, help="每個設定的 seed 數")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[200], help="市場規模 (任務數)")
+    parser.add_argument("--agents", type=int, nargs="+", default=[2], help="每個策略的 Agent 數")
+    parser.add_argument("--lineup", type=int, nargs="+", default=[2], help="每場參賽的策略數")
+    parser.add_argument("--workers", type=int, default=None, help="worker 行程數 (預設 CPU 數)")
+    parser.add_argument("--cache-dir", default=".tournament_cache", help="結果快取目錄 (空字串停用)")
+    args = parser.parse_args()
+
+    configs = tournament_configs(lineup_sizes=args.lineup, market_sizes=args.tasks,
+                                 agent_counts=args.agents, seeds=range(args.seeds))
+    tournament = Tournament(cache_dir=args.cache_dir or None)
+    start = time.perf_counter()
+    matches = tournament.run(configs, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"\n🏟️  {len(configs)} 場比賽 | 新計算 {tournament.computed} | 快取 {tournament.cache_hits} | {elapsed:.2f} s\n")
+
+    summary = Tournament.summarize(matches)
+    print(f"{'策略':<15}{'場數':>6}  {'勝率 (95% CI)':<26}{'每任務利潤 (95% CI)':<30}")
+    print("-" * 80)
+    for name, row in sorted(summary.items(), key=lambda item: -item[1]["win_rate"]["mean"]):
+        win, profit = row["win_rate"], row["profit_per_task"]
+        print(f"{name:<15}{row['matches']:>6}  "
+              f"{win['mean']:6.1%} [{win['low']:6.1%}, {win['high']:6.1%}]    "
+              f"{profit['mean']:+.4f} [{profit['low']:+.4f}, {profit['high']:+.4f}]")
+
+    print("\n⚔️  兩兩對戰勝率 (列 vs 欄)")
+    names = sorted(summary)
+    print(" " * 15 + "".join(f"{n[:12]:>14}" for n in names))
+    for name in names:
+        h2h = summary[name]["head_to_head"]
+        print(f"{name:<15}" + "".join(f"{h2h[o]:>14.1%}" if o in h2h else f"{'-':>14}" for o in names))
+
+
+if __name__ == "__main__":
+    main()
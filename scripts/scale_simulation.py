@@ -3,13 +3,18 @@
 📈 大規模市場模擬 (無 LLM 模式)
 展示純演算法在處理大量併發任務時的效能
 """
+import argparse
 import sys
 import os
 import time
+
+import numpy as np
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from marketplace.fleet import SolverFleet
 from marketplace.hub_market import HubMarket, TaskStatus
-from marketplace.solver_agents import create_diverse_solvers
+from marketplace.simulation import SimulationConfig, run_parallel_simulation
 from marketplace.strategies import STRATEGIES
 
 def print_separator(title):
@@ -17,41 +22,32 @@ def print_separator(title):
     print(f"  {title}")
     print("=" * 70)
 
-def run_scale_simulation(num_tasks=100, num_agents=20):
+def run_scale_simulation(num_tasks=100, num_agents=20, top_k=None, seed=0):
     print_separator("📈 大規模市場模擬 (純演算法)")
     
     # 1. 初始化
     print(f"\n⚙️  設定：{num_tasks} 個任務，{num_agents} 個 Agent")
     market = HubMarket()
     
-    # 2. 建立多樣化 Agent 集群
+    # 2. 建立多樣化 Agent 集群 (structure-of-arrays，策略共用單例，不逐一建立 SolverAgent)
     print("\n1️⃣  建立 Agent 集群...")
-    base_agents = create_diverse_solvers()
-    
-    # 擴展到指定數量
-    import copy
-    all_agents = []
-    for i in range(num_agents):
-        base_agent = base_agents[i % len(base_agents)]
-        # 深拷貝以避免共享配置
-        new_agent = copy.deepcopy(base_agent)
-        new_agent.config.agent_id = f"algo_agent_{i:03d}"
-        all_agents.append(new_agent)
-    
-    print(f"   ✅ 建立 {len(all_agents)} 個 Agent")
-    
+    fleet = SolverFleet.from_configs(num_agents, prefix="algo_agent", rng=np.random.default_rng(seed),
+                                     cost_jitter=0.1)
+    print(f"   ✅ 建立 {len(fleet)} 個 Agent ({fleet.memory_bytes() / 1024:.1f} KB)")
+
     # 3. 發布任務
     print(f"\n2️⃣  發布 {num_tasks} 個任務...")
     start_time = time.time()
     
+    tasks = []
     for i in range(num_tasks):
-        task = market.create_task(
+        tasks.append(market.create_task(
             description=f"任務 #{i}: 數據分析",
             input_data=f"data_{i}.csv",
             max_budget=3.0,
             expected_tokens=50000,
             requester_id=f"buyer_{i % 10}"
-        )
+        ))
     
     task_creation_time = time.time() - start_time
     print(f"   ⏱️  耗時：{task_creation_time*1000:.2f} ms")
@@ -60,8 +56,7 @@ def run_scale_simulation(num_tasks=100, num_agents=20):
     print(f"\n3️⃣  Agent 競標階段...")
     start_time = time.time()
     
-    for agent in all_agents:
-        agent.scan_and_bid(market)
+    fleet.bid_on_tasks(market, tasks, top_k=top_k)
     
     bidding_time = time.time() - start_time
     print(f"   ⏱️  競標耗時：{bidding_time*1000:.2f} ms")
@@ -77,7 +72,7 @@ def run_scale_simulation(num_tasks=100, num_agents=20):
     # 6. 效能分析
     print(f"\n5️⃣  效能分析")
     print(f"   - 任務發布速率：{num_tasks / task_creation_time:.0f} tasks/sec")
-    print(f"   - 競標處理速率：{num_tasks * len(all_agents) / bidding_time:.0f} bids/sec")
+    print(f"   - 報價處理速率：{num_tasks * len(fleet) / bidding_time:.0f} quotes/sec")
     print(f"   - 平均每個任務投標數：{stats['total_bids'] / num_tasks:.1f}")
     
     print_separator("模擬完成")
@@ -86,6 +81,34 @@ def run_scale_simulation(num_tasks=100, num_agents=20):
     print("   - 可預測，無隨機性")
     print("   - 適合高頻交易與標準化任務")
 
+def run_parallel(num_tasks, num_agents, shards, workers, seed):
+    """多核心版本：任務切分到 process pool，各 shard 獨立 HubMarket，結果可由 seed 重現"""
+    print_separator("🚀 平行市場模擬")
+    config = SimulationConfig(num_tasks=num_tasks, num_agents=num_agents, shards=shards, seed=seed)
+    result = run_parallel_simulation(config, workers=workers)
+    totals = result.totals
+    print(f"\n⚙️  {num_tasks} 個任務 / {num_agents} 個 Agent / {shards} shards / {result.workers} workers / seed={seed}")
+    print(f"   📊 任務：{totals['tasks']}  投標：{totals['bids']}  成交：{totals['assigned']}")
+    print(f"   🏆 平均得標價格：{totals['avg_winning_bid']:.6f}")
+    print(f"   🎯 各策略得標數：{totals['wins_by_strategy']}")
+    print(f"\n⏱️  總耗時：{result.wall_seconds:.2f} s  ({totals['tasks'] / result.wall_seconds:.0f} tasks/sec)")
+    for phase, seconds in result.phase_seconds.items():
+        print(f"   - {phase:<13} 合計 {seconds['total']:.2f} s | 最慢 shard {seconds['max']:.2f} s")
+
+
 if __name__ == "__main__":
-    # 預設模擬 100 個任務，20 個 Agent
-    run_scale_simulation(num_tasks=100, num_agents=20)
+    parser = argparse.ArgumentParser(description="大規模市場模擬")
+    parser.add_argument("--tasks", type=int, default=100, help="任務數")
+    parser.add_argument("--agents", type=int, default=20, help="Agent 數 (平行模式下每個 shard 各一組)")
+    parser.add_argument("--parallel", action="store_true", help="以 process pool 平行執行")
+    parser.add_argument("--shards", type=int, default=SimulationConfig.shards,
+                        help="任務 shard 數 (決定各 shard 的種子，固定預設值讓同一 seed 在不同機器上結果相同)")
+    parser.add_argument("--workers", type=int, default=None, help="worker 行程數 (預設 min(shards, CPU 數))")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--top-k", type=int, default=None, help="每個任務只送出最低的 k 筆報價 (大型集群用)")
+    args = parser.parse_args()
+
+    if args.parallel:
+        run_parallel(args.tasks, args.agents, args.shards, args.workers, args.seed)
+    else:
+        run_scale_simulation(num_tasks=args.tasks, num_agents=args.agents, top_k=args.top_k, seed=args.seed)
@@ -223,3 +223,883 @@ class TestMetricsEndpoint:
         text = response.text
         # At least one of the counters defined in metrics.py should appear
         assert "market_tasks_created_total" in text or "market_active_tasks" in text
+
+
+# ---------------------------------------------------------------------------
+# WebSocket fan-out — ConnectionManager
+# ---------------------------------------------------------------------------
+
+import asyncio
+import json
+
+from marketplace.realtime import ConnectionManager
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket; `delay` simulates a slow reader."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class TestConnectionManager:
+    """Per-client bounded queues and slow consumer policies"""
+
+    def test_slow_client_does_not_stall_fast_client(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=100)
+            fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+            await manager.connect(fast)
+            await manager.connect(slow)
+            for i in range(5):
+                manager.broadcast({"type": "event", "n": i})
+            await asyncio.sleep(0.01)
+            manager.disconnect(slow)
+            return fast, slow
+
+        fast, slow = asyncio.run(scenario())
+        assert [m["n"] for m in fast.sent] == [0, 1, 2, 3, 4]
+        assert slow.sent == []
+
+    def test_disconnect_removes_client(self):
+        async def scenario():
+            manager = ConnectionManager()
+            ws = FakeWebSocket()
+            await manager.connect(ws)
+            assert manager.connection_count() == 1
+            manager.disconnect(ws)
+            manager.disconnect(ws)  # idempotent
+            return manager
+
+        manager = asyncio.run(scenario())
+        assert manager.connection_count() == 0
+        assert manager.broadcast({"type": "event"}) == 0
+
+    def test_drop_oldest_policy_keeps_latest_frames(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=2, slow_policy="drop_oldest")
+            ws = FakeWebSocket(delay=10)
+            client = await manager.connect(ws)
+            await asyncio.sleep(0)  # writer picks up nothing yet
+            for i in range(5):
+                manager.broadcast({"type": "event", "n": i})
+            pending = [json.loads(client.queue.get_nowait())["n"] for _ in range(client.queue.qsize())]
+            manager.disconnect(ws)
+            return client, pending
+
+        client, pending = asyncio.run(scenario())
+        assert client.dropped >= 2
+        assert pending[-1] == 4
+
+    def test_disconnect_policy_closes_slow_client(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=1, slow_policy="disconnect")
+            ws = FakeWebSocket()
+            await manager.connect(ws)
+            for i in range(3):
+                manager.broadcast({"type": "event", "n": i})
+            await asyncio.sleep(0.01)
+            return manager, ws
+
+        manager, ws = asyncio.run(scenario())
+        assert manager.connection_count() == 0
+        assert ws.closed_with == 1013
+
+    def test_downgrade_policy_only_forwards_snapshots(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=2, slow_policy="downgrade")
+            ws = FakeWebSocket()
+            client = await manager.connect(ws)
+            for i in range(3):
+                manager.broadcast({"type": "event", "n": i})
+            manager.broadcast({"type": "event", "n": 99})
+            manager.broadcast_text(json.dumps({"type": "market_update"}), snapshot=True)
+            await asyncio.sleep(0.01)
+            manager.disconnect(ws)
+            return client, ws
+
+        client, ws = asyncio.run(scenario())
+        assert client.downgraded is True
+        types = [m["type"] for m in ws.sent]
+        assert "downgraded" in types
+        assert types[-1] == "market_update"
+        assert all(m.get("n") != 99 for m in ws.sent)
+
+    def test_ws_market_endpoint_sends_snapshot(self, client):
+        with client.websocket_connect("/ws/market") as ws:
+            frame = ws.receive_json()
+        assert frame["type"] == "market_update"
+        assert "stats" in frame
+
+
+# ---------------------------------------------------------------------------
+# Shared market snapshot — SnapshotPublisher
+# ---------------------------------------------------------------------------
+
+from marketplace.hub_market import HubMarket
+from marketplace.realtime import SnapshotPublisher
+
+
+class TestSnapshotPublisher:
+    """One snapshot build + encode per market version, shared by all clients"""
+
+    def _publisher(self, market, manager):
+        return SnapshotPublisher(
+            manager,
+            build_snapshot=lambda: {"type": "market_update", "total": len(market.tasks)},
+            get_version=lambda: market.version,
+        )
+
+    def test_rebuilds_only_when_market_version_changes(self):
+        market = HubMarket()
+        publisher = self._publisher(market, ConnectionManager())
+        first = publisher.latest_frame()
+        assert publisher.latest_frame() is first
+        assert publisher.builds == 1
+
+        market.create_task("Snapshot task", "data", 1.0, 100)
+        assert json.loads(publisher.latest_frame())["total"] == 1
+        assert publisher.builds == 2
+
+    def test_publish_once_skips_unchanged_market(self):
+        market = HubMarket()
+        publisher = self._publisher(market, ConnectionManager())
+        assert publisher.publish_once() is True
+        assert publisher.publish_once() is False
+        market.create_task("Snapshot task", "data", 1.0, 100)
+        assert publisher.publish_once() is True
+
+    def test_all_clients_receive_the_same_encoded_frame(self):
+        async def scenario():
+            market = HubMarket()
+            manager = ConnectionManager()
+            publisher = self._publisher(market, manager)
+            clients = [await manager.connect(FakeWebSocket()) for _ in range(3)]
+            market.create_task("Snapshot task", "data", 1.0, 100)
+            publisher.publish_once()
+            frames = [c.queue.get_nowait() for c in clients]
+            for c in clients:
+                manager.disconnect(c.websocket)
+            return publisher, frames
+
+        publisher, frames = asyncio.run(scenario())
+        assert publisher.builds == 1
+        assert all(f is frames[0] for f in frames)
+
+    def test_market_version_increments_on_mutations(self):
+        market = HubMarket()
+        task = market.create_task("Versioned task", "data", 1.0, 100)
+        v1 = market.version
+        market.submit_bid(task.task_id, "agent_01", 0.5, 100, "model")
+        market.select_winner(task.task_id)
+        market.submit_result(task.task_id, "done")
+        market.verify_result(task.task_id, approved=True)
+        assert market.version == v1 + 4
+
+
+# ---------------------------------------------------------------------------
+# Subscription protocol — filtered deltas with sequence numbers
+# ---------------------------------------------------------------------------
+
+from marketplace.realtime import SNAPSHOT_META, EventMeta, Subscription
+
+
+def _drain(client):
+    frames = []
+    while not client.queue.empty():
+        frames.append(json.loads(client.queue.get_nowait()))
+    return frames
+
+
+class TestSubscriptionProtocol:
+    """Subscribe / unsubscribe / resume over the WebSocket feed"""
+
+    def test_subscription_event_types_and_scope(self):
+        sub = Subscription(domains={"code"}, event_types={"task_created"})
+        assert sub.matches(EventMeta("task_created", "t1", "code", "r1"))
+        assert not sub.matches(EventMeta("task_created", "t2", "research", "r1"))
+        assert not sub.matches(EventMeta("proposal_submitted", "t1", "code", "r1"))
+        assert Subscription().matches(EventMeta("market_update"))
+        assert Subscription(task_ids={"t1"}).matches(SNAPSHOT_META)
+        assert not Subscription(task_ids={"t1"}, event_types={"task_created"}).matches(SNAPSHOT_META)
+
+    def test_subscription_rejects_non_list_filters(self):
+        with pytest.raises(ValueError):
+            Subscription.from_message({"task_ids": "abc"})
+
+    def test_publish_only_reaches_matching_clients(self):
+        async def scenario():
+            manager = ConnectionManager()
+            everyone = await manager.connect(FakeWebSocket())
+            code_only = await manager.connect(FakeWebSocket())
+            manager.handle_client_message(code_only, json.dumps({"action": "subscribe", "domains": ["code"]}))
+            _drain(code_only)
+            manager.publish("task_created", {"task_id": "t1"}, task_id="t1", domain="code")
+            manager.publish("task_created", {"task_id": "t2"}, task_id="t2", domain="research")
+            return _drain(everyone), _drain(code_only)
+
+        everyone, code_only = asyncio.run(scenario())
+        assert [f["seq"] for f in everyone] == [1, 2]
+        assert [f["task_id"] for f in code_only] == ["t1"]
+
+    def test_broadcast_respects_subscription_filters(self):
+        async def scenario():
+            manager = ConnectionManager()
+            everyone = await manager.connect(FakeWebSocket())
+            code_only = await manager.connect(FakeWebSocket())
+            manager.handle_client_message(code_only, json.dumps({"action": "subscribe", "domains": ["code"]}))
+            _drain(code_only)
+            manager.broadcast({"type": "task_created", "task_id": "t1", "required_domain": "code"})
+            manager.broadcast({"type": "task_created", "task_id": "t2", "required_domain": "research"})
+            manager.broadcast({"type": "notice"}, meta=EventMeta("notice", domain="code"))
+            return _drain(everyone), _drain(code_only)
+
+        everyone, code_only = asyncio.run(scenario())
+        assert len(everyone) == 3
+        assert [f.get("task_id") for f in code_only] == ["t1", None]
+
+    def test_resume_replays_missed_matching_events(self):
+        async def scenario():
+            manager = ConnectionManager()
+            for i in range(5):
+                manager.publish("proposal_submitted", {"task_id": f"t{i % 2}"}, task_id=f"t{i % 2}")
+            client = await manager.connect(FakeWebSocket())
+            resync = manager.handle_client_message(client, json.dumps(
+                {"action": "subscribe", "task_ids": ["t0"], "resume_from": 1}))
+            return resync, _drain(client)
+
+        resync, frames = asyncio.run(scenario())
+        assert resync is False
+        assert frames[0]["type"] == "subscribed" and frames[0]["resumed"] is True
+        assert [f["seq"] for f in frames[1:]] == [3, 5]
+
+    def test_resume_outside_replay_window_requires_resync(self):
+        async def scenario():
+            manager = ConnectionManager(replay_size=2)
+            for i in range(5):
+                manager.publish("task_created", {"task_id": f"t{i}"}, task_id=f"t{i}")
+            client = await manager.connect(FakeWebSocket())
+            resync = manager.handle_client_message(client, json.dumps({"action": "resume", "resume_from": 1}))
+            return resync, _drain(client)
+
+        resync, frames = asyncio.run(scenario())
+        assert resync is True
+        assert [f["type"] for f in frames] == ["subscribed", "resync_required"]
+
+    def test_invalid_control_message_returns_error_frame(self):
+        async def scenario():
+            manager = ConnectionManager()
+            client = await manager.connect(FakeWebSocket())
+            manager.handle_client_message(client, "not json")
+            manager.handle_client_message(client, json.dumps({"action": "explode"}))
+            return _drain(client)
+
+        frames = asyncio.run(scenario())
+        assert [f["type"] for f in frames] == ["error", "error"]
+
+    def test_ws_subscription_receives_filtered_task_events(self, client):
+        with client.websocket_connect("/ws/market") as ws:
+            assert ws.receive_json()["type"] == "market_update"
+            ws.send_json({"action": "subscribe", "requesters": ["ws_sub_user"], "event_types": ["task_created"]})
+            assert ws.receive_json()["type"] == "subscribed"
+
+            client.post("/tasks", json={**VALID_TASK_PAYLOAD, "requester_id": "someone_else"})
+            created = client.post("/tasks", json={**VALID_TASK_PAYLOAD, "requester_id": "ws_sub_user"}).json()
+
+            frame = ws.receive_json()
+            assert frame["type"] == "task_created"
+            assert frame["task_id"] == created["task_id"]
+            assert isinstance(frame["seq"], int)
+
+
+# ---------------------------------------------------------------------------
+# Broadcast coalescing window
+# ---------------------------------------------------------------------------
+
+class TestBroadcastCoalescing:
+    """Events inside the window go out as one frame per client"""
+
+    def _bid_storm(self, manager):
+        manager.publish("task_created", {"task_id": "t1"}, task_id="t1")
+        for cost in (0.9, 0.4, 0.7):
+            manager.publish("proposal_submitted", {"task_id": "t1", "estimated_cost": cost}, task_id="t1")
+        manager.publish("proposal_submitted", {"task_id": "t2", "estimated_cost": 1.0}, task_id="t2")
+
+    def test_window_batches_events_into_one_frame(self):
+        async def scenario():
+            manager = ConnectionManager(coalesce_ms=50)
+            client = await manager.connect(FakeWebSocket())
+            self._bid_storm(manager)
+            before = client.queue.qsize()
+            await asyncio.sleep(0.08)
+            manager.disconnect(client.websocket)
+            return before, client.websocket.sent
+
+        before, sent = asyncio.run(scenario())
+        assert before == 0
+        assert len(sent) == 1
+        assert sent[0]["type"] == "batch"
+        assert sent[0]["seq"] == 5
+        assert [e["seq"] for e in sent[0]["events"]] == [1, 2, 3, 4, 5]
+
+    def test_collapse_summarises_proposals_per_task(self):
+        async def scenario():
+            manager = ConnectionManager(coalesce_ms=50)
+            client = await manager.connect(FakeWebSocket())
+            manager.handle_client_message(client, json.dumps({"action": "subscribe", "collapse": True}))
+            _drain(client)
+            self._bid_storm(manager)
+            manager.flush()
+            return _drain(client)
+
+        frames = asyncio.run(scenario())
+        assert len(frames) == 1
+        events = frames[0]["events"]
+        assert [e["type"] for e in events] == ["task_created", "proposals_summary", "proposal_submitted"]
+        summary = events[1]
+        assert summary["task_id"] == "t1"
+        assert summary["count"] == 3
+        assert summary["best_cost"] == 0.4
+        assert (summary["first_seq"], summary["seq"]) == (2, 4)
+
+    def test_single_event_window_sends_plain_frame(self):
+        async def scenario():
+            manager = ConnectionManager(coalesce_ms=50)
+            client = await manager.connect(FakeWebSocket())
+            manager.publish("task_created", {"task_id": "t1"}, task_id="t1")
+            manager.flush()
+            return _drain(client)
+
+        frames = asyncio.run(scenario())
+        assert frames == [{"type": "task_created", "seq": 1, "task_id": "t1"}]
+
+    def test_identical_views_share_one_encoded_frame(self):
+        async def scenario():
+            manager = ConnectionManager(coalesce_ms=50)
+            clients = [await manager.connect(FakeWebSocket()) for _ in range(3)]
+            self._bid_storm(manager)
+            manager.flush()
+            return [c.queue.get_nowait() for c in clients]
+
+        frames = asyncio.run(scenario())
+        assert all(f is frames[0] for f in frames)
+
+
+# ---------------------------------------------------------------------------
+# Versioned response cache
+# ---------------------------------------------------------------------------
+
+from marketplace.response_cache import VersionedResponseCache
+from marketplace.api import market as api_market, response_cache
+
+
+class TestVersionedResponseCache:
+    """Pre-serialized responses keyed on the market mutation version"""
+
+    def test_same_version_is_a_hit(self):
+        cache = VersionedResponseCache()
+        builds = []
+        build = lambda: builds.append(1) or b"payload"
+        assert cache.get_or_build("stats", 1, build) == b"payload"
+        assert cache.get_or_build("stats", 1, build) == b"payload"
+        assert len(builds) == 1
+        assert cache.hit_rate("stats") == 0.5
+
+    def test_version_change_rebuilds(self):
+        cache = VersionedResponseCache()
+        assert cache.get_or_build("stats", 1, lambda: b"v1") == b"v1"
+        assert cache.get_or_build("stats", 2, lambda: b"v2") == b"v2"
+        assert cache.stats()["stats"] == {"hits": 0, "misses": 2, "hit_rate": 0.0}
+
+    def test_ttl_mode_serves_stale_within_window(self):
+        now = [100.0]
+        cache = VersionedResponseCache(clock=lambda: now[0])
+        cache.get_or_build("dashboard", 1, lambda: b"v1")
+        now[0] += 1.0
+        assert cache.get_or_build("dashboard", 2, lambda: b"v2", max_stale=2.0) == b"v1"
+        now[0] += 2.0
+        assert cache.get_or_build("dashboard", 2, lambda: b"v2", max_stale=2.0) == b"v2"
+
+    def test_stats_endpoint_reuses_bytes_until_market_changes(self, client):
+        first = client.get("/api/stats")
+        hits_before = response_cache.hits.get("stats", 0)
+        second = client.get("/api/stats")
+        assert second.content == first.content
+        assert response_cache.hits.get("stats", 0) == hits_before + 1
+
+        api_market.create_task("Cache busting task", "data", 1.0, 100)
+        third = client.get("/api/stats").json()
+        assert third["market"]["total_tasks"] == first.json()["market"]["total_tasks"] + 1
+
+    def test_dashboard_max_stale_tolerates_recent_changes(self, client):
+        client.get("/api/dashboard-data")
+        before = client.get("/api/dashboard-data").json()["stats"]["total_tasks"]
+        api_market.create_task("Stale-tolerant task", "data", 1.0, 100)
+        stale = client.get("/api/dashboard-data?max_stale=5").json()
+        fresh = client.get("/api/dashboard-data").json()
+        assert stale["stats"]["total_tasks"] == before
+        assert fresh["stats"]["total_tasks"] == before + 1
+
+    def test_health_timestamp_stays_fresh_when_cached(self, client):
+        first = client.get("/health").json()
+        second = client.get("/health").json()
+        assert second["market"] == first["market"]
+        assert "timestamp" in second
+
+    def test_hit_ratio_exported_to_metrics(self, client):
+        client.get("/api/stats")
+        client.get("/api/stats")
+        text = client.get("/metrics").text
+        assert 'response_cache_hit_ratio{endpoint="stats"}' in text
+        assert "response_cache_requests_total" in text
+
+
+# ---------------------------------------------------------------------------
+# Event-driven market collector
+# ---------------------------------------------------------------------------
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from marketplace.metrics import register_market_collector
+from marketplace.solana_escrow import SolanaEscrowSimulator
+
+
+class TestMarketCollector:
+    """Scrape reads incremental counters; output keeps the old metric names"""
+
+    def setup_method(self):
+        self.market = HubMarket()
+        self.escrow = SolanaEscrowSimulator()
+        self.registry = CollectorRegistry()
+        register_market_collector(self.market, self.escrow, registry=self.registry)
+
+    def scrape(self) -> str:
+        return generate_latest(self.registry).decode()
+
+    def test_exports_labelled_task_and_trust_series(self):
+        task = self.market.create_task("Task", "data", 1.0, 100, required_domain="python")
+        self.market.submit_bid(task.task_id, "agent_a", 0.5, 100, "model", trust_level="verified")
+        self.market.select_winner(task.task_id)
+
+        text = self.scrape()
+        assert "market_active_tasks 0.0" in text
+        assert "market_avg_bid_price 0.5" in text
+        assert 'market_tasks{domain="python",routing_mode="internal",status="in_progress"} 1.0' in text
+        assert 'market_bids_by_trust_total{trust_level="verified"} 1.0' in text
+        assert 'market_wins_by_trust_total{trust_level="verified"} 1.0' in text
+        assert 'market_winning_cost_by_trust_total{trust_level="verified"} 0.5' in text
+        assert "solana_total_value_locked_sol 0.0" in text
+
+    def test_scrape_does_not_iterate_tasks(self):
+        for i in range(50):
+            self.market.create_task(f"Task {i}", "data", 1.0, 100)
+        self.market.tasks = {}  # a scan would now report zero open tasks
+        assert "market_active_tasks 50.0" in self.scrape()
+
+    def test_app_metrics_endpoint_uses_collector(self, client):
+        api_market.create_task("Collector task", "data", 1.0, 100)
+        text = client.get("/metrics").text
+        assert "market_active_tasks" in text
+        assert "market_tasks{" in text
+
+
+# ---------------------------------------------------------------------------
+# Hot-path instrumentation export
+# ---------------------------------------------------------------------------
+
+from marketplace.instrumentation import Instrumentation
+from marketplace.metrics import register_instrumentation_collector
+
+
+class TestInstrumentationMetrics:
+    """Latency histograms are exported through /metrics"""
+
+    def test_collector_emits_cumulative_buckets(self):
+        inst = Instrumentation(bounds=(1_000, 1_000_000))
+        inst.observe("market.submit_bid", 500)
+        inst.observe("market.submit_bid", 2_000)
+        registry = CollectorRegistry()
+        register_instrumentation_collector(inst, registry=registry)
+        text = generate_latest(registry).decode()
+        assert 'market_operation_duration_seconds_bucket{le="1e-06",operation="market.submit_bid"} 1.0' in text
+        assert 'market_operation_duration_seconds_bucket{le="+Inf",operation="market.submit_bid"} 2.0' in text
+        assert 'market_operation_calls_total{operation="market.submit_bid"} 2.0' in text
+
+    def test_metrics_endpoint_includes_market_operations(self, client):
+        response = client.post("/tasks", json={
+            "description": "Instrumented task", "input_data": "data",
+            "max_budget": 1.0, "expected_tokens": 100,
+        })
+        assert response.status_code in (200, 201)
+        text = client.get("/metrics").text
+        assert 'operation="market.create_task"' in text
+
+
+# ---------------------------------------------------------------------------
+# Request timing middleware and event-loop lag monitor
+# ---------------------------------------------------------------------------
+
+import time
+
+from marketplace.diagnostics import LoopLagMonitor
+
+
+class TestRequestTimingMiddleware:
+    """Per-route latency histograms keyed by the route template"""
+
+    def test_route_template_is_used_as_label(self, client):
+        client.get("/tasks/does-not-exist")
+        text = client.get("/metrics").text
+        assert 'http_request_duration_seconds_count{method="GET",route="/tasks/{task_id}",status="404"}' in text
+        assert "does-not-exist" not in text
+
+    def test_unmatched_paths_share_one_label(self, client):
+        client.get("/no/such/route")
+        text = client.get("/metrics").text
+        assert 'route="unmatched",status="404"' in text
+        assert 'http_requests_in_flight{method="GET"}' in text
+
+
+def _block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+class TestLoopLagMonitor:
+    """Scheduling delay probe with a watchdog that captures the blocking stack"""
+
+    def test_blocking_call_is_measured_and_stack_captured(self):
+        monitor = LoopLagMonitor(interval=0.02, threshold=0.05)
+
+        async def scenario():
+            monitor.ensure_running()
+            await asyncio.sleep(0.05)
+            _block_the_loop(0.3)
+            await asyncio.sleep(0.05)
+            monitor.stop()
+
+        asyncio.run(scenario())
+        snapshot = monitor.snapshot()
+        assert snapshot["samples"] >= 2
+        assert snapshot["max_lag"] >= 0.2
+        assert snapshot["stalls"]
+        assert "_block_the_loop" in snapshot["stalls"][0]["stack"]
+        assert snapshot["stalls"][0]["lag"] >= 0.2
+
+    def test_idle_loop_reports_no_stalls(self):
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.2)
+
+        async def scenario():
+            monitor.ensure_running()
+            await asyncio.sleep(0.1)
+            monitor.stop()
+
+        asyncio.run(scenario())
+        assert monitor.snapshot()["stalls"] == []
+        assert monitor.samples > 0
+
+    def test_debug_loop_endpoint(self, client, monkeypatch):
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        assert client.get("/debug/loop").status_code == 403
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        body = client.get("/debug/loop", headers={"X-Admin-Token": "secret"}).json()
+        assert body["running"] is True
+        assert {"interval", "threshold", "last_lag", "max_lag", "stalls"} <= set(body)
+        assert "event_loop_lag_seconds_bucket" in client.get("/metrics").text
+
+
+# ---------------------------------------------------------------------------
+# Sampling profiler
+# ---------------------------------------------------------------------------
+
+import threading
+from collections import Counter
+
+from marketplace.diagnostics import ProfilerBusyError, SamplingProfiler
+
+
+class TestSamplingProfiler:
+    """Collapsed stacks and marketplace hotspots from sys._current_frames sampling"""
+
+    def test_samples_worker_threads(self):
+        stop = threading.Event()
+
+        def spin():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=spin, name="spinner")
+        worker.start()
+        try:
+            result = SamplingProfiler(interval=0.001).run(0.05)
+        finally:
+            stop.set()
+            worker.join()
+        assert result["samples"] > 0
+        assert any(stack[0] == "spinner" and stack[-1].endswith(":spin") for stack in result["stacks"])
+
+    def test_collapsed_format_and_hotspots(self):
+        profiler = SamplingProfiler()
+        stacks = Counter({
+            ("MainThread", "asyncio:run", "marketplace.api:submit_bid", "marketplace.hub_market:submit_bid"): 3,
+            ("MainThread", "asyncio:run", "marketplace.api:submit_bid"): 1,
+            ("worker", "threading:run"): 5,
+        })
+        collapsed = profiler.collapsed(stacks).splitlines()
+        assert collapsed[0] == "worker;threading:run 5"
+        assert "MainThread;asyncio:run;marketplace.api:submit_bid;marketplace.hub_market:submit_bid 3" in collapsed
+
+        hotspots = profiler.hotspots(stacks, top=5)
+        assert hotspots[0]["function"] == "marketplace.hub_market:submit_bid"
+        assert hotspots[0]["self_samples"] == 3
+        api_entry = next(h for h in hotspots if h["function"] == "marketplace.api:submit_bid")
+        assert api_entry["inclusive_samples"] == 4
+        assert api_entry["inclusive_pct"] == 100.0
+
+    def test_only_one_profile_at_a_time(self):
+        profiler = SamplingProfiler()
+        profiler._lock.acquire()
+        try:
+            with pytest.raises(ProfilerBusyError):
+                profiler.run(0.01)
+        finally:
+            profiler._lock.release()
+
+
+class TestProfileEndpoint:
+    """GET /debug/profile is admin-only"""
+
+    def test_disabled_without_admin_token(self, client, monkeypatch):
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        assert client.get("/debug/profile?seconds=0.01").status_code == 403
+
+    def test_rejects_wrong_token(self, client, monkeypatch):
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        response = client.get("/debug/profile?seconds=0.01", headers={"X-Admin-Token": "nope"})
+        assert response.status_code == 401
+
+    def test_returns_profile_for_admin(self, client, monkeypatch):
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        headers = {"X-Admin-Token": "secret"}
+        body = client.get("/debug/profile?seconds=0.05", headers=headers).json()
+        assert body["samples"] > 0
+        assert isinstance(body["hotspots"], list)
+        assert body["collapsed"]
+
+        text = client.get("/debug/profile?seconds=0.02&format=collapsed", headers=headers)
+        assert text.headers["content-type"].startswith("text/plain")
+        assert client.get("/debug/profile?seconds=600", headers=headers).status_code == 400
+
+
+class TestMemoryEndpoint:
+    """GET /debug/memory and memory gauges"""
+
+    def test_requires_admin(self, client, monkeypatch):
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        assert client.get("/debug/memory").status_code == 403
+
+    def test_reports_subsystems_and_snapshot(self, client, monkeypatch):
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        headers = {"X-Admin-Token": "secret"}
+        api_market.create_task("Memory task", "data", 1.0, 100)
+
+        body = client.get("/debug/memory", headers=headers).json()
+        assert {"tasks", "bids", "reputation", "escrow", "ws_buffers"} <= set(body["subsystems"])
+        assert body["subsystems"]["tasks"]["objects"] >= 1
+        assert "tracemalloc" not in body
+
+        body = client.get("/debug/memory?snapshot=true&seconds=0.01&top=3", headers=headers).json()
+        assert len(body["tracemalloc"]["top_sites"]) <= 3
+
+    def test_window_requires_seconds_and_is_exclusive(self, client, monkeypatch):
+        from marketplace import memory
+
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        headers = {"X-Admin-Token": "secret"}
+        assert client.get("/debug/memory?snapshot=true", headers=headers).status_code == 400
+
+        with memory._window_lock:
+            response = client.get("/debug/memory?snapshot=true&seconds=0.01", headers=headers)
+        assert response.status_code == 409
+
+    def test_gauges_exported(self, client):
+        text = client.get("/metrics").text
+        assert 'memory_estimated_bytes{subsystem="tasks"}' in text
+        assert 'memory_objects{subsystem="bids"}' in text
+
+
+# ---------------------------------------------------------------------------
+# Task lifecycle timeline
+# ---------------------------------------------------------------------------
+
+class TestTaskTimelineEndpoint:
+    """GET /tasks/{id}/timeline and lifecycle histograms"""
+
+    def test_timeline_after_assignment(self, client):
+        task = api_market.create_task("Timeline task", "data", 1.0, 100, required_domain="timeline")
+        api_market.submit_bid(task.task_id, "timeline_solver", 0.5, 100, "model")
+        api_market.select_winner(task.task_id)
+        api_market.submit_result(task.task_id, "done")
+
+        body = client.get(f"/tasks/{task.task_id}/timeline").json()
+        assert body["assigned_to"] == "timeline_solver"
+        durations = {p["phase"]: p["duration_seconds"] for p in body["phases"]}
+        assert durations["first_bid"] is not None and durations["submitted"] is not None
+        assert durations["verified"] is None
+
+        text = client.get("/metrics").text
+        assert 'task_phase_duration_seconds_count{domain="timeline",phase="first_bid",routing_mode="internal"} 1.0' in text
+        assert 'task_solver_phase_duration_seconds_count{phase="submitted",solver="timeline_solver"} 1.0' in text
+
+    def test_timeline_unknown_task(self, client):
+        assert client.get("/tasks/missing/timeline").status_code == 404
+
+
+class TestPriceDistributionEndpoint:
+    """GET /api/price-distribution"""
+
+    def test_distribution_by_domain(self, client):
+        task = api_market.create_task("Priced task", "data", 10.0, 100, required_domain="pricing")
+        for price in (1.0, 2.0, 3.0):
+            api_market.submit_bid(task.task_id, "agent", price, 100, "model")
+
+        body = client.get("/api/price-distribution?domain=pricing").json()
+        pricing = body["domains"]["pricing"]
+        assert pricing["count"] == 3
+        assert pricing["mean"] == pytest.approx(2.0)
+        assert pricing["quantiles"]["p50"] == 2.0
+
+    def test_unknown_domain(self, client):
+        assert client.get("/api/price-distribution?domain=nobody-bids-here").status_code == 404
+
+
+class TestTimeSeriesEndpoint:
+    """GET /api/timeseries"""
+
+    def test_returns_requested_points(self, client):
+        api_market.create_task("Series task", "data", 1.0, 100)
+        body = client.get("/api/timeseries?metric=tasks_per_sec&resolution=minute&points=5").json()
+        assert body["metric"] == "tasks_per_sec"
+        assert len(body["points"]) == 5
+        assert body["points"][-1]["value"] > 0
+
+    def test_rejects_unknown_metric(self, client):
+        assert client.get("/api/timeseries?metric=bogus").status_code == 400
+        assert client.get("/api/timeseries?resolution=week").status_code == 400
+
+
+class TestSolverInboxEndpoints:
+    """POST /solvers/register, GET /solvers/{id}/inbox, DELETE /solvers/{id}"""
+
+    def test_register_and_pull_matching_tasks(self, client):
+        response = client.post("/solvers/register", json={
+            "solver_id": "inbox_solver", "domains": ["inbox-domain"], "tools": ["sql"],
+        })
+        assert response.status_code == 200
+        assert response.json()["domains"] == ["inbox-domain"]
+        client.get("/solvers/inbox_solver/inbox?max_items=100000")  # drain backfilled open tasks
+
+        client.post("/tasks", json={
+            "description": "Needs SQL", "input_data": "db", "max_budget": 1.0, "expected_tokens": 100,
+            "required_domain": "inbox-domain", "required_tools": ["sql"],
+        })
+        client.post("/tasks", json={
+            "description": "Other domain", "input_data": "db", "max_budget": 1.0, "expected_tokens": 100,
+            "required_domain": "elsewhere",
+        })
+        inbox = client.get("/solvers/inbox_solver/inbox").json()
+        assert [t["description"] for t in inbox["tasks"]] == ["Needs SQL"]
+        assert inbox["tasks"][0]["required_tools"] == ["sql"]
+        assert client.get("/solvers/inbox_solver/inbox").json()["tasks"] == []
+
+        assert client.delete("/solvers/inbox_solver").status_code == 200
+        assert client.get("/solvers/inbox_solver/inbox").status_code == 404
+
+
+class TestStandingBidRuleEndpoints:
+    """PUT / DELETE /solvers/{id}/bid-rule"""
+
+    def test_rule_bids_on_new_tasks(self, client):
+        response = client.put("/solvers/rule_solver/bid-rule", json={
+            "strategy": "aggressive", "cost_per_token": 0.0001, "domains": ["rule-domain"],
+        })
+        assert response.status_code == 200
+        assert response.json()["domains"] == ["rule-domain"]
+        try:
+            created = client.post("/tasks", json={
+                "description": "Rule task", "input_data": "x", "max_budget": 1.0, "expected_tokens": 1000,
+                "required_domain": "rule-domain",
+            }).json()
+            assert created["standing_bids"] == 1
+            assert api_market.bids[created["task_id"]][0].bidder_id == "rule_solver"
+        finally:
+            assert client.delete("/solvers/rule_solver/bid-rule").status_code == 200
+        assert client.delete("/solvers/rule_solver/bid-rule").status_code == 404
+
+    def test_unknown_strategy_rejected(self, client):
+        response = client.put("/solvers/bad_rule/bid-rule", json={"strategy": "nope", "cost_per_token": 0.001})
+        assert response.status_code == 422
+
+
+class TestBacktestEndpoint:
+    """POST /debug/backtest replays the live market for admins"""
+
+    def test_requires_admin(self, client, monkeypatch):
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        response = client.post("/debug/backtest", json={"strategies": ["aggressive"], "cost_per_token": 0.00001})
+        assert response.status_code == 403
+
+    def test_compares_strategies(self, client, monkeypatch):
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        task = api_market.create_task("Backtest task", "data", 2.0, 100_000)
+        api_market.submit_bid(task.task_id, "bt_subject", 1.05, 100, "model")
+        api_market.submit_bid(task.task_id, "bt_rival", 1.2, 100, "model")
+        response = client.post("/debug/backtest", headers={"X-Admin-Token": "secret"}, json={
+            "strategies": ["aggressive", "conservative"], "cost_per_token": 0.00001, "subject": "bt_subject",
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["events"] >= body["tasks"] + body["bids"]
+        assert [r["strategy"] for r in body["results"]] == ["aggressive", "conservative"]
+        assert set(body["results"][0]["deltas"]) >= {"win_rate", "margin", "fill_rate"}
+
+        bad = client.post("/debug/backtest", headers={"X-Admin-Token": "secret"},
+                          json={"strategies": ["nope"], "cost_per_token": 0.001})
+        assert bad.status_code == 400
+
+
+class TestAllocateEndpoint:
+    """POST /tasks/allocate assigns open tasks in one batch under capacities"""
+
+    def test_allocates_with_capacities(self, client):
+        tasks = [api_market.create_task(f"Allocate task {i}", "data", 2.0, 1000) for i in range(2)]
+        for task in tasks:
+            api_market.submit_bid(task.task_id, "alloc_cheap", 1.0, 1000, "model")
+            api_market.submit_bid(task.task_id, "alloc_backup", 1.5, 1000, "model")
+        response = client.post("/tasks/allocate", json={
+            "task_ids": [t.task_id for t in tasks], "capacities": {"alloc_cheap": 1},
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["assigned"] == 2 and body["unassigned"] == []
+        assert sorted(a["bidder_id"] for a in body["assignments"]) == ["alloc_backup", "alloc_cheap"]
+        assert all(t.status.value == "in_progress" for t in tasks)
+
+    def test_rejects_invalid_requests(self, client):
+        assert client.post("/tasks/allocate", json={"task_ids": ["no-such-task"]}).status_code == 422
+        assert client.post("/tasks/allocate", json={"default_capacity": -1}).status_code == 422
+        negative = client.post("/tasks/allocate", json={"capacities": {"x": -1}})
+        assert negative.status_code == 422
+        assert negative.json()["detail"][0]["loc"][:2] == ["body", "capacities"]  # rejected by the schema